@@ -0,0 +1,910 @@
+"""
+End-to-end latency benchmark for JARVIS.
+
+Drives final.process_command over a corpus of commands (one or more per intent) with every
+external dependency replaced by a local stand-in that records timings:
+
+* Gemini -> a stub HTTP server speaking generateContent and streamGenerateContent (SSE),
+  with configurable time-to-first-byte and per-chunk delay; structured (responseSchema) requests
+  get a reply that fits the schema.
+* TTS -> a SpeechQueue whose render/play fakes take a configurable time per character.
+* STT -> StreamingTranscriber over synthetic audio with a fake Whisper model.
+* pyautogui/webbrowser -> FakeUIBackend; Selenium -> a fake WebDriver pool.
+* Pexels -> a stub image server whose photos each take a configurable time to download.
+
+Reports p50/p95/p99 per stage and per intent, and can save a run as a baseline and compare
+later runs against it:
+
+    python benchmark.py --runs 20 --save-baseline bench_baseline.json
+    python benchmark.py --runs 20 --baseline bench_baseline.json
+
+`python benchmark.py stt` instead measures the real Whisper engine on this CPU: real-time factor
+and word error rate for each combination of model size, compute type, thread count and beam policy.
+
+`python benchmark.py faults` checks LLM retries, backoff, Retry-After and the circuit breaker against
+injected server faults. `python benchmark.py pptx --slides 15` times deck generation against the stubs and compares it with
+one outline call plus the slowest image (requires python-pptx).
+"""
+import argparse
+import atexit
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import wave
+import zlib
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (intent the command should route to, command)
+DEFAULT_CORPUS = [
+    ("open_app", "open notepad"),
+    ("open_app", "play despacito on youtube"),
+    ("search_web", "google python list comprehension"),
+    ("write", "write a poem about the ocean"),
+    ("send_email", "send email to alex@example.com about the quarterly report"),
+    ("create_presentation", "create a presentation about solar energy"),
+    ("set_reminder", "set a reminder to stretch in 10 minutes"),
+    ("pc_control", "lock pc"),
+    ("start_voice", "start voice mode"),
+    ("stop_voice", "stop voice mode"),
+    ("greet", "hello"),
+    ("general_query", "what is the capital of france"),
+]
+
+STUB_REPLY = ("Certainly. Here is a concise answer from the benchmark stub. "
+              "It spans a few sentences so streaming has something to split. "
+              "That is all.")
+STUB_SUBJECT = "Quarterly Report Update"
+
+# Stages in report order; each maps to seconds spent per command (summed over calls)
+STAGES = ["stt", "intent", "extract", "llm", "ui", "tts_synth", "first_audio", "action", "total", "speech_done"]
+
+
+# --- Stub Gemini server ---
+class StubGeminiServer:
+    """
+    Local stand-in for the Gemini REST API. Replies after `latency` seconds; streamed replies
+    send one SSE event per word group with `chunk_delay` seconds between them.
+
+    Faults can be injected: `faults` is a queue of faults applied to the next requests, one each,
+    and `outage` (if set) is applied to every request after that. A fault is a dict with one of
+    "status" (plus optional "retry_after"), "hang" (seconds before closing the connection without
+    a reply), "drop" (close it straight away) or "garbage" (a 200 that isn't JSON).
+    """
+    def __init__(self, latency=0.05, chunk_delay=0.01, chunk_words=4):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_words = chunk_words
+        self.calls = 0
+        self.faults = []
+        self.outage = None
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}/v1beta"
+
+    def reply_for(self, prompt, schema=None):
+        deck = re.search(r"outline of a (\d+)-slide presentation about '(.*?)'", prompt)
+        if deck:
+            count, topic = int(deck.group(1)), deck.group(2)
+            return json.dumps({"title": topic.title(), "subtitle": "A benchmark deck",
+                               "slides": [{"title": f"{topic.title()} part {i + 1}",
+                                           "bullets": [f"Point {j + 1} about {topic}" for j in range(4)],
+                                           "image_query": f"{topic} {i + 1}", "notes": "Speaker notes."}
+                                          for i in range(count)]})
+        if schema:
+            return json.dumps(self.sample(schema))
+        if "Respond ONLY with a perfect JSON object" in prompt:
+            return json.dumps({"app": "notepad", "action": None})
+        if "subject line" in prompt.lower():
+            return STUB_SUBJECT
+        return STUB_REPLY
+
+    def sample(self, schema, name=None):
+        """A reply that satisfies a structured-output schema, like Gemini's responseSchema mode."""
+        kind = schema.get("type", "").upper()
+        if kind == "OBJECT":
+            return {key: self.sample(subschema, key) for key, subschema in schema.get("properties", {}).items()}
+        if kind == "ARRAY":
+            return [self.sample(schema.get("items", {"type": "STRING"}), name) for _ in range(3)]
+        if kind in ("INTEGER", "NUMBER"):
+            return 1
+        if kind == "BOOLEAN":
+            return True
+        if "enum" in schema:
+            return schema["enum"][0]
+        return STUB_SUBJECT if name in ("subject", "title") else STUB_REPLY
+
+    def next_fault(self):
+        with self._lock:
+            self.calls += 1
+            return self.faults.pop(0) if self.faults else self.outage
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def _inject(self, fault):
+                """Apply a fault; True if the request has been dealt with."""
+                if "hang" in fault: # By the time it would reply, the client has long given up
+                    time.sleep(fault["hang"])
+                if "hang" in fault or fault.get("drop"):
+                    self.close_connection = True
+                    return True
+                body = b"<html>upstream error</html>"
+                self.send_response(fault.get("status", 200))
+                if "retry_after" in fault:
+                    self.send_header("Retry-After", str(fault["retry_after"]))
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return True
+
+            def _event(self, text):
+                return json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                fault = stub.next_fault()
+                if fault and self._inject(fault):
+                    return
+                prompt = body["contents"][-1]["parts"][0]["text"]
+                reply = stub.reply_for(prompt, body.get("generationConfig", {}).get("responseSchema"))
+                time.sleep(stub.latency)
+
+                if ":streamGenerateContent" in self.path:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    words = reply.split(" ")
+                    for i in range(0, len(words), stub.chunk_words):
+                        if i:
+                            time.sleep(stub.chunk_delay)
+                        piece = " ".join(words[i:i + stub.chunk_words]) + (" " if i + stub.chunk_words < len(words) else "")
+                        data = f"data: {self._event(piece)}\r\n\r\n".encode("utf-8")
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+
+                out = self._event(reply).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="stub-gemini", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Stub Pexels server ---
+def _png(width, height, rgb=(40, 90, 160)):
+    """A solid-colour PNG, so slides get a real picture without shipping image files."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + bytes(rgb) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+TINY_PNG = _png(16, 9)
+
+class StubPexelsServer:
+    """
+    Local stand-in for the Pexels search API and image CDN. Searches answer immediately; each photo
+    download takes `latency` seconds plus up to `jitter` more, so one image is always the slowest.
+    """
+    def __init__(self, latency=0.1, jitter=0.05, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.searches = 0
+        self.downloads = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.root_url = f"http://127.0.0.1:{self._server.server_port}"
+        self.base_url = self.root_url + "/v1"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, content_type, body):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with stub._lock:
+                    if self.path.startswith("/v1/search"):
+                        stub.searches += 1
+                        photo = stub.searches
+                    else:
+                        stub.downloads += 1
+                        delay = stub.latency + stub._random.uniform(0, stub.jitter)
+                if self.path.startswith("/v1/search"):
+                    src = f"{stub.root_url}/photos/{photo}.png"
+                    self._send("application/json", json.dumps({"photos": [{"src": {"large": src}}]}).encode("utf-8"))
+                    return
+                time.sleep(delay)
+                self._send("image/png", TINY_PNG)
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="stub-pexels", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Timing recorder ---
+class Recorder:
+    """Collects per-command stage timings. Commands run one at a time, so `current` is the active one."""
+    def __init__(self):
+        self.results = [] # {"intent", "command", "predicted", "stages": {stage: seconds}}
+        self.current = None
+        self._depth = threading.local()
+        self._lock = threading.Lock()
+
+    def begin(self, intent, command):
+        self.current = {"intent": intent, "command": command, "predicted": None,
+                        "stages": defaultdict(float), "start": time.perf_counter()}
+        return self.current
+
+    def add(self, stage, seconds):
+        with self._lock:
+            if self.current is not None:
+                self.current["stages"][stage] += seconds
+
+    def mark_first(self, stage):
+        """Record the time from command start to the first occurrence of an event."""
+        with self._lock:
+            if self.current is not None and stage not in self.current["stages"]:
+                self.current["stages"][stage] = time.perf_counter() - self.current["start"]
+
+    def end(self):
+        record, self.current = self.current, None
+        record["stages"] = dict(record["stages"])
+        del record["start"]
+        self.results.append(record)
+
+    def timed(self, stage, fn):
+        """Wrap fn so its wall time is added to stage; nested calls within the same stage count once."""
+        def wrapper(*args, **kwargs):
+            depth = getattr(self._depth, stage, 0)
+            setattr(self._depth, stage, depth + 1)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                setattr(self._depth, stage, depth)
+                if depth == 0:
+                    self.add(stage, time.perf_counter() - start)
+        wrapper.__wrapped__ = fn
+        return wrapper
+
+
+# --- Fakes ---
+class FakeWhisperModel:
+    """
+    Stands in for faster-whisper. Synthetic audio encodes word i as a run of samples equal to i + 1,
+    so any slice decodes back to exactly the words it covers; decoding sleeps rtf x audio length.
+    """
+    def __init__(self, words, sample_rate, rtf):
+        self.words = words
+        self.sample_rate = sample_rate
+        self.rtf = rtf
+
+    def transcribe(self, audio, **kwargs):
+        time.sleep(self.rtf * len(audio) / self.sample_rate)
+        indices = []
+        for value in audio[audio > 0]:
+            index = int(value) - 1
+            if not indices or indices[-1] != index:
+                indices.append(index)
+        return [SimpleNamespace(text=" ".join(self.words[i] for i in indices))], None
+
+def synthetic_speech(np, command, sample_rate, seconds_per_word=0.4):
+    words = command.split()
+    samples_per_word = int(seconds_per_word * sample_rate)
+    return words, np.repeat(np.arange(1, len(words) + 1, dtype=np.float32), samples_per_word)
+
+class FakeElement:
+    def get_attribute(self, name):
+        return "https://www.youtube.com/watch?v=benchmark"
+
+    def click(self):
+        pass
+
+class FakeDriver:
+    def __init__(self):
+        self.current_url = "about:blank"
+
+    def get(self, url):
+        self.current_url = url
+
+    def execute_script(self, script):
+        return False
+
+    def quit(self):
+        pass
+
+
+def install_fakes(final, recorder, stub, args, pexels=None):
+    """Point final's backends at the stub servers and fakes, wrapping the functions whose time is reported."""
+    final.llm_client = final.GeminiClient(final.GEMINI_API_KEY, base_url=stub.base_url)
+    final.llm_limiter = final.TokenBucket(0, 1) # Measure the pipeline, not the request quota
+    if pexels is not None:
+        final.pexels_client = final.PexelsClient(final.PEXELS_API_KEY, base_url=pexels.base_url)
+    if args.no_llm_cache:
+        final.llm_cache.get = lambda key: None
+        final.llm_cache.put = lambda key, response: None
+
+    def render(sentence):
+        start = time.perf_counter()
+        time.sleep(args.tts_ms_per_char / 1000 * len(sentence))
+        recorder.add("tts_synth", time.perf_counter() - start)
+        return sentence
+
+    def play(sentence):
+        recorder.mark_first("first_audio")
+        time.sleep(args.play_ms_per_char / 1000 * len(sentence))
+
+    final.speech_queue = final.SpeechQueue(render=render, play=play)
+
+    final.set_ui_backend(final.FakeUIBackend())
+    for name in ("hotkey", "press", "typewrite", "copy", "paste", "open_url", "settle",
+                 "wait_for_window", "focus_window", "wait_for_focus_change"):
+        setattr(final.ui, name, recorder.timed("ui", getattr(final.ui, name)))
+    final.webbrowser.open = lambda url, *a, **kw: True
+
+    final.browser_pool = final.BrowserSessionPool(factory=FakeDriver)
+    final.WebDriverWait = lambda driver, timeout: SimpleNamespace(until=lambda condition: FakeElement())
+    final.EC = SimpleNamespace(element_to_be_clickable=lambda locator: locator)
+    final.By = SimpleNamespace(CSS_SELECTOR="css selector")
+
+    # Never touch the microphone; shutdown/lock go through the fake UI backend
+    final.voice_loop = lambda: None
+
+    predict_intent = final.predict_intent
+    def predict_and_record(cmd):
+        intent = predict_intent(cmd)
+        recorder.current["predicted"] = intent
+        return intent
+    final.predict_intent = recorder.timed("intent", predict_and_record)
+    final.extract_app_and_action = recorder.timed("extract", final.extract_app_and_action)
+    final.get_ai_generated_text = recorder.timed("llm", final.get_ai_generated_text)
+
+
+def run_command(final, np, recorder, intent, command, args):
+    record = recorder.begin(intent, command)
+    words, audio = synthetic_speech(np, command, final.STT_SAMPLE_RATE)
+    transcriber = final.StreamingTranscriber(FakeWhisperModel(words, final.STT_SAMPLE_RATE, args.stt_rtf),
+                                             on_partial=None)
+    block = int(final.STT_BLOCK_SECONDS * final.STT_SAMPLE_RATE)
+    for i in range(0, len(audio), block):
+        transcriber.feed(audio[i:i + block])
+    # Partial chunks are decoded while the user talks; only the tail counts against latency
+    start = time.perf_counter()
+    text = transcriber.finish()
+    stt = time.perf_counter() - start
+    recorder.add("stt", stt)
+    if text != command.lower():
+        print(f"warning: fake transcript {text!r} != {command!r}", file=sys.stderr)
+
+    record["start"] = time.perf_counter()
+    final.process_command(text)
+    action = time.perf_counter() - record["start"]
+    recorder.add("action", action)
+    recorder.add("total", stt + action)
+    final.speech_queue.say("").wait() # FIFO: done once everything queued before it has played
+    recorder.add("speech_done", stt + time.perf_counter() - record["start"])
+    recorder.end()
+
+
+# --- Statistics and reporting ---
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+def summarize(values):
+    values = sorted(values)
+    return {"n": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+            "p99": percentile(values, 99)}
+
+def summarize_results(results):
+    by_stage = defaultdict(list)
+    by_intent = defaultdict(lambda: defaultdict(list))
+    for record in results:
+        for stage, seconds in record["stages"].items():
+            by_stage[stage].append(seconds)
+            by_intent[record["intent"]][stage].append(seconds)
+    return {
+        "stages": {stage: summarize(by_stage[stage]) for stage in STAGES if stage in by_stage},
+        "intents": {intent: {stage: summarize(stages[stage]) for stage in STAGES if stage in stages}
+                    for intent, stages in by_intent.items()},
+        "misrouted": sorted({f"{r['command']} -> {r['predicted']}" for r in results if r["predicted"] != r["intent"]}),
+    }
+
+def _ms(seconds):
+    return f"{seconds * 1000:9.2f}"
+
+def print_table(title, stats):
+    print(f"\n{title}")
+    print(f"  {'stage':<12}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, s in stats.items():
+        print(f"  {stage:<12}{s['n']:>6}{_ms(s['p50'])} {_ms(s['p95'])} {_ms(s['p99'])}")
+
+def print_report(summary):
+    print_table("All commands", summary["stages"])
+    for intent, stats in summary["intents"].items():
+        print_table(f"Intent: {intent}", stats)
+    if summary["misrouted"]:
+        print("\nMisrouted commands (expected intent differs from predict_intent):")
+        for line in summary["misrouted"]:
+            print(f"  {line}")
+
+def compare(summary, baseline, tolerance, min_delta):
+    """Print p50/p95 changes against a baseline summary; return the regressions beyond tolerance."""
+    regressions = []
+    print(f"\nCompared with baseline (regression: p50/p95 up more than {tolerance:.0%} and {min_delta * 1000:.1f} ms)")
+    print(f"  {'scope':<28}{'stage':<12}{'base p50':>10}{'p50':>10}{'base p95':>10}{'p95':>10}")
+    scopes = [("all", summary["stages"], baseline.get("stages", {}))]
+    scopes += [(intent, stats, baseline.get("intents", {}).get(intent, {}))
+               for intent, stats in summary["intents"].items()]
+    for scope, stats, base_stats in scopes:
+        for stage, s in stats.items():
+            base = base_stats.get(stage)
+            if base is None:
+                continue
+            flag = ""
+            for q in ("p50", "p95"):
+                delta = s[q] - base[q]
+                if delta > min_delta and delta > base[q] * tolerance:
+                    regressions.append((scope, stage, q, base[q], s[q]))
+                    flag = "  <-- slower"
+            print(f"  {scope:<28}{stage:<12}{_ms(base['p50'])} {_ms(s['p50'])} {_ms(base['p95'])} {_ms(s['p95'])}{flag}")
+    return regressions
+
+
+# --- Whisper real-time factor ---
+# Reference utterances spoken by the local TTS voice when no --clip is given, short to long
+STT_PHRASES = [
+    "open notepad",
+    "play despacito on youtube",
+    "send an email to alex about the quarterly report and the budget review",
+    "write a short essay about the ocean, how the tides work, and why they matter "
+    "to the fishermen who live in small coastal towns",
+]
+
+def load_wav(np, path, sample_rate):
+    """Read a PCM WAV file as mono float32 at sample_rate (linear resampling if needed)."""
+    with wave.open(path, "rb") as f:
+        rate, width, channels = f.getframerate(), f.getsampwidth(), f.getnchannels()
+        frames = f.readframes(f.getnframes())
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+    audio = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+    if width == 1:
+        audio -= 128
+    audio = audio.reshape(-1, channels).mean(axis=1) / float(2 ** (8 * width - 1))
+    if rate != sample_rate:
+        positions = np.arange(0, len(audio), rate / sample_rate)
+        audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+    return audio
+
+def word_error_rate(reference, hypothesis):
+    ref = [w for w in map(_norm_word, reference.split()) if w]
+    hyp = [w for w in map(_norm_word, hypothesis.split()) if w]
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (r != h))
+    return row[-1] / max(1, len(ref))
+
+def _norm_word(word):
+    return "".join(c for c in word.lower() if c.isalnum() or c == "'")
+
+def load_clips(final, np, specs):
+    """(reference text, audio) pairs from PATH[=TEXT] specs, or the built-in phrases spoken by the TTS voice."""
+    if specs:
+        clips = []
+        for spec in specs:
+            path, _, text = spec.partition("=")
+            clips.append((text, load_wav(np, path, final.STT_SAMPLE_RATE)))
+        return clips
+    return [(phrase, load_wav(np, final.render_speech(phrase), final.STT_SAMPLE_RATE)) for phrase in STT_PHRASES]
+
+def stt_engine_configs(args):
+    for model, compute_type, threads, beam in itertools.product(
+            args.models.split(","), args.compute_types.split(","), args.threads.split(","), args.beams.split(",")):
+        config = {"model": model, "compute_type": compute_type, "cpu_threads": int(threads), "beam": beam}
+        if beam == "adaptive":
+            yield config, {}
+        else: # A fixed beam everywhere, including short utterances
+            yield config, {"beam_size": int(beam), "greedy_max_seconds": 0.0}
+
+def run_stt(final, np, args):
+    clips = load_clips(final, np, args.clip)
+    durations = [len(audio) / final.STT_SAMPLE_RATE for _, audio in clips]
+    print(f"{len(clips)} clips, {sum(durations):.1f} s of audio, {args.repeats} decodes each\n")
+    print(f"{'model':<10}{'compute':<10}{'threads':>8}{'beam':>10}{'load s':>8}{'warmup s':>10}"
+          f"{'RTF p50':>9}{'RTF p95':>9}{'short ms':>10}{'WER %':>7}")
+    rows = []
+    for config, policy in stt_engine_configs(args):
+        start = time.perf_counter()
+        try:
+            engine = final.WhisperEngine(config["model"], compute_type=config["compute_type"],
+                                         cpu_threads=config["cpu_threads"], **policy)
+        except Exception as e:
+            print(f"{config['model']:<10}{config['compute_type']:<10}  failed to load: {e}")
+            continue
+        load = time.perf_counter() - start
+        start = time.perf_counter()
+        engine.warm_up()
+        warmup = time.perf_counter() - start
+
+        rtfs, errors, short = [], [], []
+        for (reference, audio), duration in zip(clips, durations):
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                segments, _ = engine.transcribe(audio, condition_on_previous_text=False)
+                text = " ".join(segment.text for segment in segments)
+                elapsed = time.perf_counter() - start
+                rtfs.append(elapsed / duration)
+                if duration <= final.STT_GREEDY_MAX_SECONDS:
+                    short.append(elapsed)
+            if reference:
+                errors.append(word_error_rate(reference, text))
+        row = {**config, "load_s": load, "warmup_s": warmup, "rtf": summarize(rtfs),
+               "short_s": summarize(short) if short else None,
+               "wer": sum(errors) / len(errors) if errors else None}
+        rows.append(row)
+        print(f"{row['model']:<10}{row['compute_type']:<10}{row['cpu_threads']:>8}{row['beam']:>10}{load:>8.2f}{warmup:>10.2f}"
+              f"{row['rtf']['p50']:>9.3f}{row['rtf']['p95']:>9.3f}"
+              f"{(row['short_s']['p50'] * 1000 if short else float('nan')):>10.0f}"
+              f"{(row['wer'] * 100 if errors else float('nan')):>7.1f}")
+    print("\nRTF = decode time / audio length (lower is faster; below 1 is faster than real time). "
+          "threads 0 = CTranslate2 default.")
+    print("Apply the best row with JARVIS_WHISPER_MODEL, JARVIS_WHISPER_COMPUTE, JARVIS_WHISPER_THREADS and JARVIS_WHISPER_BEAM.")
+    return rows
+
+
+# --- Presentation benchmark ---
+def run_pptx(final, args):
+    """
+    Time create_presentation against the stub servers: cold (every image downloaded) and then warm
+    (every image from the cache). Cold time should be close to the outline call plus the slowest image.
+    """
+    stub = StubGeminiServer(latency=args.llm_latency, chunk_delay=args.llm_chunk_delay).start()
+    pexels = StubPexelsServer(latency=args.image_latency, jitter=args.image_jitter).start()
+    final.llm_client = final.GeminiClient(final.GEMINI_API_KEY, base_url=stub.base_url)
+    final.pexels_client = final.PexelsClient(final.PEXELS_API_KEY, base_url=pexels.base_url)
+    final.llm_cache.get = lambda key: None
+    final.llm_cache.put = lambda key, response: None
+
+    timings = []
+    def timed(fn, label):
+        def wrapper(*a, **kw):
+            start = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                timings.append((label, time.perf_counter() - start))
+        return wrapper
+    final.get_ai_generated_text = timed(final.get_ai_generated_text, "outline")
+    final.fetch_slide_image = timed(final.fetch_slide_image, "image")
+
+    rows = []
+    for repeat in range(args.repeats):
+        final.image_cache = final.ImageCache(directory=f"image_cache_{repeat}")
+        for run in ("cold", "warm"):
+            timings.clear()
+            start = time.perf_counter()
+            path = final.create_presentation(f"solar energy {repeat}", args.slides)
+            total = time.perf_counter() - start
+            outline = sum(t for label, t in timings if label == "outline")
+            images = [t for label, t in timings if label == "image"]
+            rows.append({"run": run, "slides": args.slides, "total": total, "outline": outline,
+                         "slowest_image": max(images, default=0.0), "sum_images": sum(images),
+                         "overhead": total - outline - max(images, default=0.0), "ok": bool(path)})
+    stub.stop()
+    pexels.stop()
+
+    print(f"{'run':<6}{'total':>10}{'outline':>10}{'slowest':>10}{'sum img':>10}{'overhead':>10}")
+    for row in rows:
+        print(f"{row['run']:<6}" + "".join(f"{_ms(row[k]):>10}" for k in ("total", "outline", "slowest_image",
+                                                                        "sum_images", "overhead")))
+    print(f"{pexels.downloads} image downloads, {stub.calls} Gemini calls")
+    return rows
+
+# --- LLM fault injection ---
+def run_faults(final, args):
+    """
+    Drive get_ai_generated_text against the stub with injected faults, scaled-down timeouts and a
+    short breaker cooldown, and check retries, backoff, Retry-After, the deadline and fail-fast.
+    Returns one row per scenario.
+    """
+    stub = StubGeminiServer(latency=0.01).start()
+    final.llm_client = final.GeminiClient(final.GEMINI_API_KEY, base_url=stub.base_url)
+    final.LLM_READ_TIMEOUT = args.read_timeout
+    final.LLM_RETRY_DEADLINE = args.deadline
+    final.LLM_BACKOFF_BASE, final.LLM_BACKOFF_MAX = 0.1, 0.4
+    final.llm_limiter = final.TokenBucket(0, 1)
+
+    def ask():
+        start = time.perf_counter()
+        calls = stub.calls
+        reply = final.get_ai_generated_text("benchmark fault probe", use_history=False, cache=False)
+        return reply == STUB_REPLY, stub.calls - calls, time.perf_counter() - start
+
+    def reset(faults=(), outage=None):
+        stub.faults, stub.outage = [dict(f) for f in faults], outage
+        final.llm_breaker = final.CircuitBreaker(final.LLM_BREAKER_THRESHOLD, args.cooldown)
+
+    def transient():
+        reset([{"status": 503}, {"status": 503}])
+        ok, calls, elapsed = ask()
+        return ok and calls == 3, f"{calls} calls, {_ms(elapsed)} ms"
+
+    def retry_after():
+        reset([{"status": 429, "retry_after": 1}])
+        ok, calls, elapsed = ask()
+        return ok and calls == 2 and elapsed >= 1.0, f"{calls} calls, {_ms(elapsed)} ms (Retry-After 1 s)"
+
+    def not_retryable():
+        reset([{"status": 400}])
+        ok, calls, elapsed = ask()
+        return not ok and calls == 1 and final.llm_breaker.state == "closed", f"{calls} call, {_ms(elapsed)} ms"
+
+    def hang():
+        reset(outage={"hang": args.read_timeout * 3})
+        ok, calls, elapsed = ask()
+        return not ok and elapsed <= args.deadline + args.read_timeout + 0.5, f"{calls} calls, {_ms(elapsed)} ms"
+
+    def outage():
+        reset(outage={"status": 503})
+        rows = [ask() for _ in range(5)]
+        fast = rows[2:]
+        detail = ", ".join(f"{calls}/{_ms(elapsed)}" for _, calls, elapsed in rows)
+        passed = (not any(ok for ok, _, _ in rows) and final.llm_breaker.state == "open"
+                  and all(calls == 0 and elapsed < 0.05 for _, calls, elapsed in fast))
+        return passed, f"calls/ms per command: {detail}"
+
+    def recovery():
+        reset(outage={"drop": True})
+        for _ in range(2):
+            ask()
+        opened = final.llm_breaker.state == "open"
+        stub.outage = None
+        time.sleep(args.cooldown)
+        ok, calls, elapsed = ask()
+        return opened and ok and calls == 1 and final.llm_breaker.state == "closed", f"probe {_ms(elapsed)} ms"
+
+    def rate_limit():
+        reset()
+        final.llm_limiter = final.TokenBucket(5, 2)
+        start = time.perf_counter()
+        results = [ask()[0] for _ in range(6)]
+        elapsed = time.perf_counter() - start
+        final.llm_limiter = final.TokenBucket(0, 1)
+        return all(results) and elapsed >= 0.75, f"6 calls at 5/s burst 2 in {_ms(elapsed)} ms"
+
+    def breaker_first():
+        reset(outage={"status": 503})
+        for _ in range(2):
+            ask()
+        final.llm_limiter = final.TokenBucket(0.01, 1)
+        final.llm_limiter.acquire() # Drained: the next token is 100 s away
+        start = time.perf_counter()
+        reply = final.get_ai_generated_text("benchmark fault probe", use_history=False, cache=False)
+        elapsed = time.perf_counter() - start
+        reset() # Circuit closed, bucket still drained
+        throttled = final.get_ai_generated_text("benchmark fault probe", use_history=False, cache=False)
+        final.llm_limiter = final.TokenBucket(0, 1)
+        return (reply == final.LLM_UNAVAILABLE_RESPONSE and elapsed < 0.05
+                and throttled == final.LLM_THROTTLED_RESPONSE), f"open circuit answered in {_ms(elapsed)} ms"
+
+    rows = []
+    for scenario in (transient, retry_after, not_retryable, hang, outage, recovery, rate_limit, breaker_first):
+        passed, detail = scenario()
+        rows.append({"scenario": scenario.__name__, "passed": passed, "detail": detail})
+    stub.stop()
+    return rows
+
+def load_corpus(path):
+    """Read a JSON-lines corpus of {"intent": ..., "command": ...} objects."""
+    with open(path, encoding="utf-8") as f:
+        return [(item["intent"], item["command"]) for item in map(json.loads, f) if item]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark for JARVIS with stubbed backends.")
+    parser.add_argument("--runs", type=int, default=10, help="Times to run the whole corpus (default 10).")
+    parser.add_argument("--warmup", type=int, default=1, help="Unrecorded corpus runs before measuring (default 1).")
+    parser.add_argument("--corpus", help="JSON-lines file of {\"intent\", \"command\"} objects (default: built-in).")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub Gemini time to first byte, seconds.")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.01, help="Stub delay between streamed chunks, seconds.")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the LLM response cache.")
+    parser.add_argument("--tts-ms-per-char", type=float, default=0.5, help="Fake synthesis time per character.")
+    parser.add_argument("--play-ms-per-char", type=float, default=0.0, help="Fake playback time per character.")
+    parser.add_argument("--stt-rtf", type=float, default=0.1, help="Fake Whisper real-time factor.")
+    parser.add_argument("--image-latency", type=float, default=0.05, help="Stub Pexels time per image download, seconds.")
+    parser.add_argument("--json", dest="json_out", help="Write the summary and raw timings to this file.")
+    parser.add_argument("--save-baseline", help="Write the summary to this file as the new baseline.")
+    parser.add_argument("--baseline", help="Compare against a saved baseline; exit 1 on regression.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown (default 0.10).")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore slowdowns smaller than this.")
+    parser.add_argument("--trace", help="Also write final's tracing spans to this JSON-lines file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the assistant's own output while running.")
+
+    subcommands = parser.add_subparsers(dest="command")
+    stt = subcommands.add_parser("stt", help="Measure the real Whisper engine's real-time factor per configuration.")
+    stt.add_argument("--models", default="tiny.en,base", help="Comma-separated model sizes (default tiny.en,base).")
+    stt.add_argument("--compute-types", default="int8", help="Comma-separated compute types, e.g. int8,float32.")
+    stt.add_argument("--threads", default="0", help="Comma-separated cpu_threads values (0 = library default).")
+    stt.add_argument("--beams", default="adaptive,1,5",
+                     help="Comma-separated beam policies: a fixed beam size, or 'adaptive' (greedy for short utterances).")
+    stt.add_argument("--repeats", type=int, default=3, help="Decodes per clip (default 3).")
+    stt.add_argument("--clip", action="append", help="PATH[=REFERENCE TEXT] of a WAV file; repeatable. "
+                     "Default: built-in phrases spoken by the TTS voice.")
+    stt.add_argument("--json", dest="stt_json", help="Write the results to this file.")
+
+    faults = subcommands.add_parser("faults", help="Check LLM retries, backoff and the circuit breaker against injected faults.")
+    faults.add_argument("--read-timeout", type=float, default=0.5, help="LLM read timeout for the run, seconds.")
+    faults.add_argument("--deadline", type=float, default=2.0, help="LLM retry deadline for the run, seconds.")
+    faults.add_argument("--cooldown", type=float, default=1.0, help="Circuit breaker cooldown for the run, seconds.")
+
+    pptx = subcommands.add_parser("pptx", help="Time presentation generation against the stub Gemini and Pexels servers.")
+    pptx.add_argument("--slides", type=int, default=15, help="Content slides per deck (default 15).")
+    pptx.add_argument("--image-jitter", type=float, default=0.1, help="Extra random time per image, up to this many seconds.")
+    pptx.add_argument("--repeats", type=int, default=3, help="Decks to generate (default 3), each cold then warm.")
+    pptx.add_argument("--json", dest="pptx_json", help="Write the results to this file.")
+    return parser.parse_args(argv)
+
+def _remove_scratch(workdir, previous_dir):
+    os.chdir(previous_dir) # Windows can't remove the working directory
+    shutil.rmtree(workdir, ignore_errors=True)
+
+def import_final():
+    """
+    Import final from a scratch directory so a run never touches the real memory, caches or logs.
+    The directory is removed at exit, after final's own exit handlers have flushed into it.
+    """
+    workdir = tempfile.mkdtemp(prefix="jarvis-bench-")
+    atexit.register(_remove_scratch, workdir, os.getcwd()) # Registered first, so it runs after final's handlers
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    import final
+    final.INTENT_MODEL_FILE = os.path.join(REPO_DIR, final.INTENT_MODEL_FILE)
+    final.INTENT_VECTORIZER_FILE = os.path.join(REPO_DIR, final.INTENT_VECTORIZER_FILE)
+    final.INTENT_COMPILED_FILE = os.path.join(REPO_DIR, final.INTENT_COMPILED_FILE)
+    return final, workdir
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus = load_corpus(args.corpus) if args.corpus else DEFAULT_CORPUS
+    for name in ("json_out", "save_baseline", "baseline", "trace"): # Resolve before leaving the caller's directory
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    if args.command == "stt":
+        args.clip = [(lambda path, sep, text: os.path.abspath(path) + sep + text)(*spec.partition("="))
+                     for spec in args.clip or []]
+        stt_json = os.path.abspath(args.stt_json) if args.stt_json else None
+        final, _ = import_final()
+        import numpy as np
+        rows = run_stt(final, np, args)
+        if stt_json:
+            with open(stt_json, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+        return 0 if rows else 1
+
+    if args.command == "faults":
+        final, _ = import_final()
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            rows = run_faults(final, args)
+        for row in rows:
+            print(f"{'PASS' if row['passed'] else 'FAIL'}  {row['scenario']:<14}{row['detail']}")
+        return 0 if all(row["passed"] for row in rows) else 1
+
+    if args.command == "pptx":
+        pptx_json = os.path.abspath(args.pptx_json) if args.pptx_json else None
+        final, _ = import_final()
+        rows = run_pptx(final, args)
+        if pptx_json:
+            with open(pptx_json, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+        return 0 if rows and all(row["ok"] for row in rows) else 1
+
+    final, workdir = import_final()
+    import numpy as np
+    if args.trace:
+        final.tracer.configure(trace_file=args.trace)
+
+    stub = StubGeminiServer(latency=args.llm_latency, chunk_delay=args.llm_chunk_delay).start()
+    pexels = StubPexelsServer(latency=args.image_latency).start()
+    recorder = Recorder()
+    install_fakes(final, recorder, stub, args, pexels)
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        for _ in range(args.warmup):
+            for intent, command in corpus:
+                run_command(final, np, recorder, intent, command, args)
+        recorder.results.clear()
+        for _ in range(args.runs):
+            for intent, command in corpus:
+                run_command(final, np, recorder, intent, command, args)
+    stub.stop()
+    pexels.stop()
+
+    summary = summarize_results(recorder.results)
+    summary["config"] = {k: v for k, v in vars(args).items()
+                         if k not in ("json_out", "save_baseline", "baseline", "verbose", "trace", "command")}
+    print(f"{len(recorder.results)} commands, {stub.calls} stub Gemini calls, scratch dir {workdir} (removed at exit)")
+    print_report(summary)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "results": recorder.results}, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != summary["config"]:
+            print("\nNote: baseline was recorded with different settings; deltas may not be comparable.")
+        regressions = compare(summary, baseline, args.tolerance, args.min_delta_ms / 1000)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against the baseline.")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Thin client for a running `python final.py --serve`. It needs only the standard library and starts
+in milliseconds, because the models stay loaded in the server.
+
+    python client.py open notepad            # run one command, printing replies as they arrive
+    python client.py --audio question.wav    # send a recording to be transcribed and run
+    python client.py                         # prompt for commands until Ctrl+C
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+
+DEFAULT_PORT = 8765
+# Must match SERVER_TOKEN_FILE in final.py; the server writes a new token there each time it starts
+TOKEN_FILE = os.environ.get("JARVIS_SERVER_TOKEN_FILE", os.path.join(os.path.expanduser("~"), ".jarvis", "server_token"))
+
+def read_token(path=TOKEN_FILE):
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
+
+def send(connection, path, body, content_type, token, stream=True):
+    """POST to the server and yield each JSON object of the reply (several when streamed)."""
+    connection.request("POST", f"{path}?stream={int(stream)}", body=body,
+                       headers={"Content-Type": content_type, "Authorization": f"Bearer {token}"})
+    response = connection.getresponse()
+    if response.status != 200:
+        yield {"error": json.loads(response.read() or b"{}").get("error", f"HTTP {response.status}")}
+        return
+    if not stream:
+        yield json.loads(response.read())
+        return
+    for line in response: # http.client undoes the chunked encoding
+        if line.strip():
+            yield json.loads(line)
+
+def show(events):
+    """Print the replies; returns False if the command failed."""
+    ok = True
+    for event in events:
+        if "error" in event and "ok" not in event: # Request rejected before anything ran
+            print(f"Error: {event['error']}", file=sys.stderr)
+            ok = False
+        elif "transcript" in event:
+            print(f"🎙️ Heard: {event['transcript']}")
+        elif "say" in event:
+            print(f"🤖 AI: {event['say']}")
+        else: # Final (or unstreamed) result record
+            result = event.get("result", event)
+            if "result" not in event:
+                for sentence in result.get("spoken", []):
+                    print(f"🤖 AI: {sentence}")
+            if not result.get("ok", True):
+                print(f"Error: {result.get('error')}", file=sys.stderr)
+                ok = False
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send commands to a JARVIS server started with `final.py --serve`.")
+    parser.add_argument("command", nargs="*", help="Command to run; omit to type commands interactively.")
+    parser.add_argument("--audio", help="WAV file to transcribe and run instead of a typed command.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--no-stream", action="store_true", help="Wait for the whole reply instead of streaming it.")
+    args = parser.parse_args(argv)
+
+    try:
+        token = read_token()
+    except OSError:
+        print(f"No server token at {TOKEN_FILE}. Start the server with `python final.py --serve` "
+              f"(as this user) first.", file=sys.stderr)
+        return 1
+    connection = http.client.HTTPConnection(args.host, args.port, timeout=120)
+    stream = not args.no_stream
+    try:
+        if args.audio:
+            with open(args.audio, "rb") as f:
+                return 0 if show(send(connection, "/audio", f.read(), "audio/wav", token, stream)) else 1
+        if args.command:
+            command = json.dumps({"command": " ".join(args.command)})
+            return 0 if show(send(connection, "/command", command, "application/json", token, stream)) else 1
+        while True:
+            command = input("💬: ").strip()
+            if command:
+                show(send(connection, "/command", json.dumps({"command": command}), "application/json", token, stream))
+    except (KeyboardInterrupt, EOFError):
+        return 0
+    except ConnectionError as e:
+        print(f"Could not reach the JARVIS server at {args.host}:{args.port} ({e}). "
+              f"Start it with `python final.py --serve`.", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,215 +1,1657 @@
 import time
+_MODULE_START = time.perf_counter()
 import os
 import re
+import sys
+import io
+import wave
+import argparse
 import threading
+import functools
+import queue
+import collections
 import tempfile
+import importlib
+import atexit
+import contextlib
+import concurrent.futures
+import hashlib
+import hmac
+import secrets
+import ast
+import unicodedata
+import heapq
+import itertools
+import sqlite3
+import bisect
+import logging.handlers
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import requests
-import pyautogui
-import pyperclip
-import speech_recognition as sr
-import pygame
-from pptx import Presentation
-from pptx.util import Inches
+from requests.adapters import HTTPAdapter
 from fuzzywuzzy import process, fuzz
-from faster_whisper import WhisperModel
-import sounddevice as sd
-import numpy as np
-import scipy.io.wavfile
-import joblib
 import json
+import random
 from datetime import datetime, timedelta
-import pyttsx3
+from email.utils import parsedate_to_datetime
 import urllib.parse
 import webbrowser
-from selenium import webdriver # Re-added for the youtube part
-from selenium.webdriver.edge.service import Service # Re-added for the youtube part
-from selenium.webdriver.common.by import By # Re-added for the youtube part
-from selenium.webdriver.support.ui import WebDriverWait # Re-added for the youtube part
-from selenium.webdriver.support import expected_conditions as EC # Re-added for the youtube part
 import ctypes
 
-# --- Initialize TTS engine for pyttsx3 and Pygame Mixer FIRST ---
-engine = pyttsx3.init()
-engine.setProperty('rate', 175) # Speech rate
-engine.setProperty('volume', 1.0)
-voices = engine.getProperty('voices')
-found_voice = False
-for voice in voices:
-    if "female" in voice.name.lower():
-        engine.setProperty('voice', voice.id)
-        found_voice = True
-        break
-if not found_voice:
-    print("Warning: Female voice not found. Using default.")
-
-pygame.mixer.init()
+# --- Lazy Subsystems ---
+# Heavy dependencies are imported and initialized on first use, so a text-only session
+# never pays for Whisper, Selenium or the audio stack. `--profile-startup` reports the cost of each.
+STARTUP_PROFILE = {} # component -> {"import": seconds, "init": seconds}
+_LAZY_IMPORTS = collections.defaultdict(list)
+_LAZY_INITS = collections.defaultdict(list)
+_profile_lock = threading.Lock()
 
-# --- Define the speak function here ---
-def speak(text):
+def _record_startup_cost(component, phase, seconds):
+    with _profile_lock:
+        costs = STARTUP_PROFILE.setdefault(component, {"import": 0.0, "init": 0.0})
+        costs[phase] += seconds
+
+class LazyImport:
     """
-    Speak text using pyttsx3 and pygame for playback, with error handling and cleanup.
-    Incorporate JARVIS-like responses here.
+    Stand-in for a module, or a name inside one, that is only imported on first attribute access or call.
     """
-    print(f"🤖 AI: {text}")
+    def __init__(self, component, module, attr=None):
+        self._component = component
+        self._module = module
+        self._attr = attr
+        self._target = None
+        self._lock = threading.Lock()
+        _LAZY_IMPORTS[component].append(self)
 
-    tmp_path = None # Initialize tmp_path to None
-    try:
-        # Create a temporary file to save the speech audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as fp:
-            tmp_path = fp.name
-        
-        # Save the synthesized speech to the temporary file
-        engine.save_to_file(text, tmp_path)
-        engine.runAndWait() # This waits for the synthesis to complete
+    def _resolve(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    start = time.perf_counter()
+                    target = importlib.import_module(self._module)
+                    if self._attr:
+                        target = getattr(target, self._attr)
+                    _record_startup_cost(self._component, "import", time.perf_counter() - start)
+                    self._target = target
+        return self._target
 
-        # Ensure mixer is not busy before loading new sound
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.stop()
-        
-        # Load and play the audio using pygame mixer
-        pygame.mixer.music.load(tmp_path)
-        pygame.mixer.music.play()
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
 
-        # Wait for the music to finish playing
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10) # Control CPU usage in the loop
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
 
-    except Exception as e:
-        print(f"Speech Error: {e}")
-        print("A minor vocalization circuit malfunction detected. Don't worry, I'm still superior.")
+def lazy_init(component):
+    """Decorator for a zero-argument initializer that runs once, on first use, and is costed per component."""
+    def decorate(fn):
+        lock = threading.Lock()
+        result = []
 
-    finally:
-        # Clean up: unload the music and delete the temporary file in a separate thread
-        def delayed_remove(path):
+        @functools.wraps(fn)
+        def wrapper():
+            if not result:
+                with lock:
+                    if not result:
+                        start = time.perf_counter()
+                        value = fn()
+                        _record_startup_cost(component, "init", time.perf_counter() - start)
+                        result.append(value)
+            return result[0]
+
+        wrapper.is_loaded = lambda: bool(result)
+        _LAZY_INITS[component].append(wrapper)
+        return wrapper
+    return decorate
+
+def load_component(component):
+    """Import and initialize everything registered for a component."""
+    for lazy in _LAZY_IMPORTS[component]:
+        lazy._resolve()
+    for init in _LAZY_INITS[component]:
+        init()
+
+def prewarm(components):
+    """Load the given components on a background thread so the first real use doesn't wait."""
+    def run():
+        for component in components:
             try:
-                # Give pygame a moment to fully release the file, if still busy
-                if pygame.mixer.music.get_busy():
-                    pygame.mixer.music.stop() # Stop playback explicitly
-                
-                # Unload the current sound to release the file handle
-                if hasattr(pygame.mixer.music, "unload"): # check if unload method exists
-                    pygame.mixer.music.unload()
-                
-                # Attempt to remove the file
-                if path and os.path.exists(path):
-                    os.remove(path)
-                    print(f"Cleaned up temporary speech file: {path}")
-            except Exception as ex:
-                print(f"Attempt to remove temp file {path} failed: {ex}. Will try again later if needed.")
-        
-        if tmp_path: # Only attempt to remove if a path was actually created
-            threading.Thread(target=delayed_remove, args=(tmp_path,), daemon=True).start()
+                load_component(component)
+            except Exception as e:
+                print(f"Pre-warm of '{component}' failed: {e}")
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def profile_startup():
+    """Load every component in turn and print what its imports and initialization cost."""
+    print(f"{'component':<12}{'import (s)':>12}{'init (s)':>12}")
+    print(f"{'core':<12}{STARTUP_PROFILE['core']['import']:>12.3f}{'-':>12}")
+    for component in SUBSYSTEMS:
+        try:
+            load_component(component)
+        except Exception as e:
+            print(f"{component:<12}  failed: {e}")
+            continue
+        costs = STARTUP_PROFILE.get(component, {"import": 0.0, "init": 0.0})
+        print(f"{component:<12}{costs['import']:>12.3f}{costs['init']:>12.3f}")
+    total = sum(c["import"] + c["init"] for c in STARTUP_PROFILE.values())
+    print(f"{'total':<12}{total:>24.3f}")
+
+SUBSYSTEMS = ("numpy", "intent", "tts", "stt", "ui", "browser", "pptx")
+
+pyttsx3 = LazyImport("tts", "pyttsx3")
+pygame = LazyImport("tts", "pygame")
+np = LazyImport("numpy", "numpy") # Shared by the intent model, audio and image code
+sd = LazyImport("stt", "sounddevice")
+WhisperModel = LazyImport("stt", "faster_whisper", "WhisperModel")
+sr = LazyImport("stt", "speech_recognition")
+pyautogui = LazyImport("ui", "pyautogui")
+pyperclip = LazyImport("ui", "pyperclip")
+webdriver = LazyImport("browser", "selenium.webdriver")
+EdgeService = LazyImport("browser", "selenium.webdriver.edge.service", "Service")
+ChromeService = LazyImport("browser", "selenium.webdriver.chrome.service", "Service")
+FirefoxService = LazyImport("browser", "selenium.webdriver.firefox.service", "Service")
+By = LazyImport("browser", "selenium.webdriver.common.by", "By")
+WebDriverWait = LazyImport("browser", "selenium.webdriver.support.ui", "WebDriverWait")
+EC = LazyImport("browser", "selenium.webdriver.support.expected_conditions")
+Presentation = LazyImport("pptx", "pptx", "Presentation")
+Inches = LazyImport("pptx", "pptx.util", "Inches")
+
+# --- Tracing and Metrics ---
+# Spans around each pipeline stage (audio capture, Whisper, intent, LLM calls, TTS, playback, UI steps),
+# written as JSON lines to a rotating file, plus counters and latency histograms served as Prometheus
+# text. Off unless --trace / --metrics-port (or JARVIS_TRACE=1) is given; while off, span() hands back
+# a shared no-op and traced() functions run undecorated but for one attribute check.
+TRACE_FILE = os.getenv("JARVIS_TRACE_FILE", "jarvis_trace.jsonl")
+TRACE_ENABLED = os.getenv("JARVIS_TRACE") == "1"
+TRACE_MAX_BYTES = 5 * 1024 * 1024 # Rotate the trace file at 5 MB...
+TRACE_BACKUPS = 3 # ...keeping this many old files
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # Histogram bounds, seconds
+DEBUG_ENABLED = os.getenv("JARVIS_DEBUG") == "1"
+
+# Diagnostics go through this logger; configure_logging() shows its debug messages with --debug
+log = logging.getLogger("jarvis")
+
+def configure_logging(debug=False):
+    """Print the assistant's log messages to stderr: everything with debug, warnings and errors otherwise."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG if debug else logging.WARNING)
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """One timed stage. Spans opened while another is active on the same thread become its children."""
+    __slots__ = ("tracer", "name", "attrs", "trace_id", "span_id", "parent_id", "wall_start", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        parent = stack[-1] if stack else None
+        self.trace_id = parent.trace_id if parent else os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = os.urandom(4).hex()
+        stack.append(self)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        self.tracer._stack().pop()
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self, duration)
+        return False
+
+class Metrics:
+    """Thread-safe counters and fixed-bucket histograms, rendered in the Prometheus text format."""
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = collections.defaultdict(float) # (name, labels) -> value
+        self._histograms = {} # (name, labels) -> [per-bucket counts (last is +Inf), sum, count]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = [f'{k}="{v}"' for k, v in (*labels, *extra)]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self, gauges=()):
+        """Prometheus exposition text; gauges is an iterable of (name, labels dict, value) sampled by the caller."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, [list(h[0]), h[1], h[2]]) for key, h in self._histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+        for name, labels, value in gauges:
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(f"{name}{self._labels(sorted(labels.items()))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Counters and per-histogram count/sum/average as plain JSON-able dicts."""
+        with self._lock:
+            return {
+                "counters": {name + self._labels(labels): value for (name, labels), value in self._counters.items()},
+                "histograms": {name + self._labels(labels): {"count": h[2], "sum_s": h[1], "avg_s": h[1] / max(1, h[2])}
+                               for (name, labels), h in self._histograms.items()},
+            }
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.metrics = Metrics()
+        self._local = threading.local()
+        self._log = None
+
+    def configure(self, trace_file=None, metrics=False):
+        """Start writing spans to trace_file (rotated) and/or collecting metrics; both off by default."""
+        if trace_file:
+            handler = logging.handlers.RotatingFileHandler(trace_file, maxBytes=TRACE_MAX_BYTES,
+                                                           backupCount=TRACE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log = logging.getLogger("jarvis.trace")
+            self._log.setLevel(logging.INFO)
+            self._log.propagate = False
+            self._log.addHandler(handler)
+        self.enabled = bool(trace_file) or metrics
+
+    def span(self, name, **attrs):
+        """Context manager timing one stage; attrs (and any added with .set()) go into the trace record."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def annotate(self, **attrs):
+        """Add attributes to the innermost open span on this thread, if any."""
+        if self.enabled:
+            stack = self._stack()
+            if stack:
+                stack[-1].attrs.update(attrs)
+
+    def count(self, name, value=1, **labels):
+        if self.enabled:
+            self.metrics.inc(name, value, **labels)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, span, duration):
+        self.metrics.observe("jarvis_stage_seconds", duration, stage=span.name)
+        if "error" in span.attrs:
+            self.metrics.inc("jarvis_stage_errors_total", stage=span.name)
+        if self._log is not None:
+            self._log.info(json.dumps({
+                "ts": span.wall_start, "span": span.name, "duration_ms": round(duration * 1000, 3),
+                "trace_id": span.trace_id, "span_id": span.span_id, "parent_id": span.parent_id,
+                "thread": threading.current_thread().name, **span.attrs,
+            }, default=str))
+
+tracer = Tracer()
+
+def traced(name):
+    """Decorator recording each call of the function as a span called name."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with Span(tracer, name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- TTS engine for pyttsx3 and Pygame Mixer ---
+@lazy_init("tts")
+def get_tts_engine():
+    engine = pyttsx3.init()
+    engine.setProperty('rate', 175) # Speech rate
+    engine.setProperty('volume', 1.0)
+    voices = engine.getProperty('voices')
+    found_voice = False
+    for voice in voices:
+        if "female" in voice.name.lower():
+            engine.setProperty('voice', voice.id)
+            found_voice = True
+            break
+    if not found_voice:
+        print("Warning: Female voice not found. Using default.")
+
+    pygame.mixer.init()
+    return engine
+
+# --- TTS Audio Cache ---
+TTS_CACHE_DIR = "tts_cache"
+TTS_CACHE_MAX_BYTES = 64 * 1024 * 1024 # Oldest-played renders are evicted beyond this
+
+class TTSCache:
+    """
+    Content-addressed store of rendered speech. Entries are keyed by the text and the voice settings
+    that shape the audio, and evicted least-recently-played first once the directory exceeds max_bytes.
+    Recency is kept in file mtimes so it survives restarts.
+    """
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = None # path -> size, least recently used first
+        self._total_bytes = 0
+
+    @staticmethod
+    def key(text, voice_id, rate, volume):
+        payload = json.dumps([text, voice_id, rate, volume], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def _load_index(self):
+        if self._entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".wav"):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, path, stat.st_size))
+            elif name.endswith(".tmp"): # Left behind by a render that died mid-write
+                os.remove(path)
+        self._entries = collections.OrderedDict((path, size) for _, path, size in sorted(found))
+        self._total_bytes = sum(self._entries.values())
+
+    def get(self, key):
+        """Return the cached WAV path for key, or None, marking it as recently used."""
+        path = self.path_for(key)
+        with self._lock:
+            self._load_index()
+            if path not in self._entries:
+                return None
+            self._entries.move_to_end(path)
+        try:
+            os.utime(path, None)
+        except OSError: # Deleted behind our back
+            with self._lock:
+                self._total_bytes -= self._entries.pop(path, 0)
+            return None
+        return path
+
+    def put(self, key, render):
+        """Render into a temp file via render(path), atomically move it into the cache and return its path."""
+        with self._lock:
+            self._load_index()
+        path = self.path_for(key)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            render(tmp_path)
+            size = os.path.getsize(tmp_path)
+            if size == 0:
+                raise RuntimeError("speech synthesis produced no audio")
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._evict(keep=path)
+        return path
+
+    def _evict(self, keep):
+        for path in list(self._entries):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError: # Still held open by the mixer; try again next time
+                continue
+            self._total_bytes -= self._entries.pop(path)
+
+tts_cache = TTSCache()
+
+def render_speech(text):
+    """Return a WAV file for text in the current voice, synthesizing it only on a cache miss."""
+    engine = get_tts_engine()
+    key = TTSCache.key(text, engine.getProperty('voice'), engine.getProperty('rate'), engine.getProperty('volume'))
+    path = tts_cache.get(key)
+    tracer.annotate(cache="hit" if path else "miss")
+    if path is None:
+        def synthesize(target_path):
+            engine.save_to_file(text, target_path)
+            engine.runAndWait() # This waits for the synthesis to complete
+        path = tts_cache.put(key, synthesize)
+    return path
+
+# --- Speech Output Queue ---
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+
+def play_audio(path):
+    """Play a WAV file through pygame and block until it finishes."""
+    # Ensure mixer is not busy before loading new sound
+    if pygame.mixer.music.get_busy():
+        pygame.mixer.music.stop()
+
+    pygame.mixer.music.load(path)
+    pygame.mixer.music.play()
+
+    # Wait for the music to finish playing
+    while pygame.mixer.music.get_busy():
+        pygame.time.Clock().tick(10) # Control CPU usage in the loop
+
+    # Release the file handle so the cache can evict it later
+    if hasattr(pygame.mixer.music, "unload"): # check if unload method exists
+        pygame.mixer.music.unload()
+
+class Utterance:
+    """
+    One thing to say. Text can be added in pieces until close(); its sentences are spoken
+    in order and never interleaved with another utterance.
+    """
+    def __init__(self, text=None):
+        self._sentences = queue.Queue() # str, or None once closed
+        self._deferred_to = None # SpeechQueue to join once the first sentence arrives (see SpeechQueue.submit)
+        self.done = threading.Event()
+        if text is not None:
+            self.add(text)
+            self.close()
+
+    def add(self, text):
+        sentences = split_sentences(text)
+        for sentence in sentences:
+            self._sentences.put(sentence)
+        if sentences and self._deferred_to is not None:
+            speech, self._deferred_to = self._deferred_to, None
+            speech.submit(self)
+
+    def close(self):
+        self._sentences.put(None)
+        if self._deferred_to is not None: # Nothing was ever said
+            self._deferred_to = None
+            self.done.set()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+class SpeechQueue:
+    """
+    Speech output service. A synthesis thread renders sentence N+1 while a playback thread plays
+    sentence N, so long answers start speaking after the first sentence. Utterances are spoken whole,
+    in the order they were submitted, and the playback thread is the only user of pygame.mixer.music.
+    """
+    def __init__(self, render=None, play=None, lookahead=2):
+        self._render = render or render_speech
+        self._play = play or play_audio
+        self._utterances = queue.Queue()
+        self._rendered = queue.Queue(maxsize=lookahead) # (utterance, path); path None marks the end
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if not self._started:
+                threading.Thread(target=self._synthesis_loop, name="speech-synthesis", daemon=True).start()
+                threading.Thread(target=self._playback_loop, name="speech-playback", daemon=True).start()
+                self._started = True
+
+    def submit(self, utterance, lazy=False):
+        """
+        Queue an utterance. With lazy, it only joins the queue when its first sentence is added, so
+        one still waiting on (say) a network reply doesn't hold up everything spoken after it.
+        """
+        if lazy:
+            utterance._deferred_to = self
+            return utterance
+        self._ensure_started()
+        self._utterances.put(utterance)
+        return utterance
+
+    def say(self, text):
+        return self.submit(Utterance(text))
+
+    def _synthesis_loop(self):
+        while True:
+            utterance = self._utterances.get()
+            while True:
+                sentence = utterance._sentences.get()
+                if sentence is None:
+                    break
+                try:
+                    with tracer.span("tts.synthesize", chars=len(sentence)):
+                        path = self._render(sentence)
+                    self._rendered.put((utterance, path))
+                except Exception as e:
+                    print(f"Speech Error: {e}")
+                    print("A minor vocalization circuit malfunction detected. Don't worry, I'm still superior.")
+            self._rendered.put((utterance, None))
+
+    def _playback_loop(self):
+        while True:
+            utterance, path = self._rendered.get()
+            if path is None:
+                utterance.done.set()
+                continue
+            try:
+                with tracer.span("tts.play"):
+                    self._play(path)
+            except Exception as e:
+                print(f"Speech Error: {e}")
+                print("A minor vocalization circuit malfunction detected. Don't worry, I'm still superior.")
+
+speech_queue = SpeechQueue()
+
+class SinkUtterance(Utterance):
+    """An Utterance whose sentences go straight to a callable instead of the speakers."""
+    def __init__(self, sink):
+        super().__init__()
+        self.sink = sink
+
+    def add(self, text):
+        for sentence in split_sentences(text):
+            self.sink(sentence)
+
+    def close(self):
+        self.done.set()
+
+_speech_sink = threading.local()
+
+@contextlib.contextmanager
+def speech_sink(sink):
+    """
+    Send everything spoken on the current thread to sink(sentence) instead of the speech queue,
+    for headless runs that capture each command's replies.
+    """
+    previous = getattr(_speech_sink, "sink", None)
+    _speech_sink.sink = sink
+    try:
+        yield sink
+    finally:
+        _speech_sink.sink = previous
+
+def new_utterance():
+    """An open Utterance on the speech queue, or on the current thread's speech sink if one is set."""
+    sink = getattr(_speech_sink, "sink", None)
+    return SinkUtterance(sink) if sink else speech_queue.submit(Utterance(), lazy=True)
+
+# --- Define the speak function here ---
+def speak(text, wait=True):
+    """
+    Queue text to be spoken with pyttsx3 and pygame, sentence by sentence.
+    Blocks until it has been spoken unless wait=False; returns the Utterance either way.
+    Incorporate JARVIS-like responses here.
+    """
+    print(f"🤖 AI: {text}")
+    utterance = new_utterance()
+    utterance.add(text)
+    utterance.close()
+    if wait:
+        utterance.wait()
+    return utterance
+
+# Persona lines built from an application name; pre-rendered for every APP_MAP key
+APP_SPEECH_TEMPLATES = [
+    "Opening {app}. Prepare for efficiency.",
+    "I've opened {app}. Marvel at my efficiency.",
+    "I've attempted to open {app}. Your humble servant, at your command.",
+]
+
+def static_speech_phrases():
+    """
+    Every sentence of the literal strings passed to speak() in this file, plus the app templates filled
+    in for each known app. Split the way SpeechQueue renders them, so the cache keys match.
+    """
+    with open(__file__, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    phrases = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "speak"
+                and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            phrases.append(node.args[0].value)
+    for template in APP_SPEECH_TEMPLATES:
+        phrases.extend(template.format(app=app) for app in APP_MAP)
+    return list(dict.fromkeys(sentence for phrase in phrases for sentence in split_sentences(phrase)))
+
+def prerender_speech():
+    """Fill the TTS cache with every static phrase (run once after installing)."""
+    phrases = static_speech_phrases()
+    rendered = 0
+    for phrase in phrases:
+        try:
+            render_speech(phrase)
+            rendered += 1
+        except Exception as e:
+            print(f"Could not pre-render '{phrase}': {e}")
+    print(f"Pre-rendered {rendered}/{len(phrases)} sentences into {tts_cache.directory}/.")
 
 
 # --- Configuration (unchanged) ---
 GEMINI_API_KEY = "Your key"
 PEXELS_API_KEY = "Your key" 
+PEXELS_BASE_URL = os.environ.get("PEXELS_BASE_URL", "https://api.pexels.com/v1") # Point at a local stub server for testing
+PEXELS_IMAGE_SIZE = "large" # Which of the photo's "src" renditions to download
+PEXELS_TIMEOUT = (5, 15) # Connect, read seconds
+IMAGE_CACHE_DIR = "image_cache"
+IMAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+PRESENTATION_DIR = "presentations" # Where generated decks are saved
+PRESENTATION_DEFAULT_SLIDES = 8
+PRESENTATION_MAX_SLIDES = 20
+PRESENTATION_IMAGE_WORKERS = PRESENTATION_MAX_SLIDES # One download per slide, so a deck waits only on its slowest image
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta") # Point at a local stub server for testing
+GEMINI_MODEL = "gemini-2.0-flash"
+LLM_POOL_SIZE = 4 # Keep-alive connections shared by concurrent commands
+LLM_CONNECT_TIMEOUT = 5
+LLM_READ_TIMEOUT = 20
+LLM_RETRY_DEADLINE = 25 # Seconds one prompt may spend on attempts and backoff before giving up
+LLM_BACKOFF_BASE = 0.5 # First retry waits 0.25-0.5s, doubling per attempt...
+LLM_BACKOFF_MAX = 8 # ...up to this
+LLM_RETRY_STATUSES = {408, 429, 500, 502, 503, 504} # Other HTTP errors (bad key, bad request) are not retried
+LLM_RATE_LIMIT = float(os.environ.get("JARVIS_LLM_RATE", "1")) # Sustained requests per second; 0 disables the limiter
+LLM_RATE_BURST = 5
+LLM_BREAKER_THRESHOLD = 4 # Consecutive failed attempts that open the circuit
+LLM_BREAKER_COOLDOWN = 30 # Seconds the circuit stays open before one probe request is let through
+LLM_CACHE_FILE = "llm_cache.sqlite3"
+LLM_CACHE_TTL = 7 * 24 * 3600 # Seconds before a cached response is fetched again
+LLM_CACHE_MAX_ENTRIES = 2000
+BROWSER = os.environ.get("JARVIS_BROWSER", "edge") # edge, chrome or firefox
+BROWSER_DRIVER_PATH = os.environ.get("JARVIS_WEBDRIVER_PATH", "C:/WebDriver/msedgedriver.exe" if BROWSER == "edge" else "") # Empty: let Selenium find the driver
+BROWSER_HEADLESS = os.environ.get("JARVIS_BROWSER_HEADLESS") == "1"
+BROWSER_IDLE_SECONDS = 15 * 60 # Warm sessions that sit unused (and silent) this long are quit
 
-# Load ML model and vectorizer for intent classification
-try:
-    clf = joblib.load("intent_model.pkl")
-    vectorizer = joblib.load("intent_vectorizer.pkl")
-except FileNotFoundError:
-    print("Error: intent_model.pkl or intent_vectorizer.pkl not found. Please run the training script (train_intents.py) first.")
-    speak("It appears some critical components for my advanced intelligence are missing. You might want to address that, human.")
-    exit()
+INTENT_MODEL_FILE = "intent_model.pkl" # sklearn pickles written by train_intents.py...
+INTENT_VECTORIZER_FILE = "intent_vectorizer.pkl"
+INTENT_COMPILED_FILE = "intent_model.npz" # ...compiled with --export-intent-model into what the assistant loads
+
+class CompiledIntentModel:
+    """
+    NumPy-only equivalent of the trained TfidfVectorizer + LogisticRegression pair: the vocabulary,
+    idf weights and coefficient matrix are plain arrays in one .npz, so loading is a single file read
+    and scoring needs neither sklearn nor joblib. Scores batches of commands in one matrix product and
+    returns the classifier's probabilities, for confidence thresholds.
+    """
+    def __init__(self, arrays):
+        self.classes = [str(c) for c in arrays["classes"]]
+        self.vocabulary = {str(term): i for i, term in enumerate(arrays["vocabulary"])}
+        self.idf = arrays["idf"]
+        self.weights = arrays["weights"] # features x classes (one column for a binary model)
+        self.intercept = arrays["intercept"]
+        self.min_n, self.max_n = (int(n) for n in arrays["ngram_range"])
+        self.token_pattern = re.compile(str(arrays["token_pattern"]))
+        self.lowercase = bool(arrays["lowercase"])
+        # Files exported before these two were stored used neither
+        self.strip_accents = str(arrays["strip_accents"]) if "strip_accents" in arrays else ""
+        self.binary = bool(arrays["binary"]) if "binary" in arrays else False
+        self.sublinear_tf = bool(arrays["sublinear_tf"])
+        self.norm = str(arrays["norm"])
+        self.multinomial = bool(arrays["multinomial"])
+
+    @classmethod
+    def load(cls, path=None):
+        with np.load(path or INTENT_COMPILED_FILE, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in arrays.files})
+
+    def _preprocess(self, text):
+        """Lowercasing, then accent stripping, in the order TfidfVectorizer applies them."""
+        if self.lowercase:
+            text = text.lower()
+        if self.strip_accents == "ascii":
+            text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+        elif self.strip_accents == "unicode":
+            text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+        return text
+
+    def _terms(self, text):
+        """Word n-grams exactly as TfidfVectorizer(analyzer="word") builds them."""
+        tokens = self.token_pattern.findall(self._preprocess(text))
+        for n in range(self.min_n, min(self.max_n, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                yield " ".join(tokens[i:i + n])
+
+    def transform(self, texts):
+        """TF-IDF matrix (texts x features), L2/L1-normalized like the exported vectorizer."""
+        features = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float64)
+        for row, text in enumerate(texts):
+            for term in self._terms(text):
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    features[row, column] = 1.0 if self.binary else features[row, column] + 1.0
+        if self.sublinear_tf:
+            counted = features > 0
+            features[counted] = np.log(features[counted]) + 1.0
+        features *= self.idf
+        if self.norm in ("l1", "l2"):
+            lengths = np.abs(features).sum(axis=1) if self.norm == "l1" else np.sqrt(np.square(features).sum(axis=1))
+            features /= np.where(lengths == 0, 1.0, lengths)[:, None]
+        return features
+
+    def predict_proba(self, texts):
+        """Class probabilities (texts x classes), matching LogisticRegression.predict_proba."""
+        logits = self.transform(texts) @ self.weights + self.intercept
+        if logits.shape[1] == 1: # Binary model: one logit for the second class
+            positive = 1.0 / (1.0 + np.exp(-logits[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        if self.multinomial:
+            logits -= logits.max(axis=1, keepdims=True)
+            scores = np.exp(logits)
+        else: # One-vs-rest: independent sigmoids, renormalized
+            scores = 1.0 / (1.0 + np.exp(-logits))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def predict_with_confidence(self, texts):
+        """[(label, probability)] for each text, in one pass."""
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [(self.classes[i], float(probabilities[row, i])) for row, i in enumerate(best)]
+
+    def predict(self, texts):
+        return [label for label, _ in self.predict_with_confidence(texts)]
+
+def export_intent_model(model_file=None, vectorizer_file=None, out_file=None, check_phrases=()):
+    """
+    Convert the sklearn pickles (default: INTENT_MODEL_FILE/INTENT_VECTORIZER_FILE) into the compiled .npz
+    at INTENT_COMPILED_FILE; needs sklearn and joblib, once. The result is checked against sklearn's own
+    predict_proba on check_phrases (default: the whole vocabulary) before it is written.
+    """
+    model_file = model_file or INTENT_MODEL_FILE
+    vectorizer_file = vectorizer_file or INTENT_VECTORIZER_FILE
+    out_file = out_file or INTENT_COMPILED_FILE
+    import joblib # Only needed here, to read the sklearn pickles
+    clf = joblib.load(model_file)
+    vectorizer = joblib.load(vectorizer_file)
+    # CompiledIntentModel reproduces everything else the vectorizer can be configured with
+    unsupported = [name for name, value, supported in (
+        ("analyzer", vectorizer.analyzer, vectorizer.analyzer == "word"),
+        ("tokenizer", vectorizer.tokenizer, vectorizer.tokenizer is None),
+        ("preprocessor", vectorizer.preprocessor, vectorizer.preprocessor is None),
+        ("stop_words", vectorizer.stop_words, not vectorizer.stop_words),
+        ("strip_accents", vectorizer.strip_accents, vectorizer.strip_accents in (None, "ascii", "unicode")),
+        ("input", vectorizer.input, vectorizer.input == "content"),
+        ("token_pattern", vectorizer.token_pattern, isinstance(vectorizer.token_pattern, str)
+                                                    and re.compile(vectorizer.token_pattern).groups <= 1),
+    ) if not supported]
+    if unsupported:
+        raise ValueError(f"The intent vectorizer can't be compiled: unsupported {', '.join(unsupported)} setting. "
+                         f"Retrain with the defaults for these.")
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    multi_class = getattr(clf, "multi_class", "auto")
+    arrays = {
+        "classes": np.array([str(c) for c in clf.classes_]),
+        "vocabulary": np.array(terms),
+        "idf": vectorizer.idf_.astype(np.float64) if vectorizer.use_idf else np.ones(len(terms)),
+        "weights": np.ascontiguousarray(clf.coef_.T, dtype=np.float64),
+        "intercept": np.asarray(clf.intercept_, dtype=np.float64),
+        "ngram_range": np.array(vectorizer.ngram_range),
+        "token_pattern": np.array(vectorizer.token_pattern),
+        "lowercase": np.array(vectorizer.lowercase),
+        "strip_accents": np.array(vectorizer.strip_accents or ""),
+        "binary": np.array(vectorizer.binary),
+        "sublinear_tf": np.array(vectorizer.sublinear_tf),
+        "norm": np.array(vectorizer.norm or ""),
+        "multinomial": np.array(multi_class == "multinomial" or (multi_class != "ovr" and clf.solver != "liblinear")),
+    }
+    compiled = CompiledIntentModel(arrays)
+    phrases = list(check_phrases) or terms
+    expected = clf.predict_proba(vectorizer.transform(phrases))
+    worst = float(np.abs(compiled.predict_proba(phrases) - expected).max())
+    if worst > 1e-6:
+        raise ValueError(f"Compiled intent model disagrees with sklearn (max probability difference {worst:.2e}).")
+    np.savez(out_file, **arrays) # Uncompressed: loading is a plain read
+    print(f"Compiled {model_file} + {vectorizer_file} into {out_file} "
+          f"({len(terms)} features, {len(arrays['classes'])} intents; max difference from sklearn {worst:.1e}).")
+    return compiled
+
+# Load the compiled intent classifier (exported from the pickles on first run if needed)
+@lazy_init("intent")
+def get_intent_model():
+    if not os.path.exists(INTENT_COMPILED_FILE):
+        log.debug(f"{INTENT_COMPILED_FILE} not found; compiling it from the sklearn pickles.")
+        return export_intent_model(check_phrases=[p for phrases in KNOWN_COMMAND_PHRASES.values() for p in phrases])
+    return CompiledIntentModel.load()
 
 # Global flag for voice mode
 listening = False
+INTERACTIVE = True # False in headless runs (--batch): nobody is at the keyboard or microphone
+
+def ask_user(prompt):
+    """input() for follow-up questions; answers "" in headless runs instead of blocking forever."""
+    if not INTERACTIVE:
+        log.debug(f"Non-interactive run, leaving '{prompt.strip()}' unanswered.")
+        return ""
+    return input(prompt).strip()
+
+# --- Persistent Memory Management ---
+MEMORY_FILE = "assistant_memory.json" # Compacted snapshot
+MEMORY_JOURNAL_FILE = "assistant_memory.journal" # Changes since the snapshot, one JSON op per line
+MEMORY_COMPACT_EVERY = 500 # Journal ops before the snapshot is rewritten
+MEMORY_HISTORY_RETAIN = 200 # Conversation turns kept on disk (requests only ever send the last few)
+
+def _reminder_to_json(reminder):
+    return {**reminder, "time": reminder["time"].isoformat()}
+
+def _reminder_from_json(reminder):
+    return {**reminder, "time": datetime.fromisoformat(reminder["time"])}
+
+class MemoryStore:
+    """
+    Persistent memory kept as a snapshot plus an append-only journal.
+    Every change is appended to the journal as one line, so a write costs the same however long
+    the history is. Every MEMORY_COMPACT_EVERY ops the snapshot is rewritten atomically and the
+    journal is truncated. Ops carry a sequence number, so a crash between those two steps (or a
+    half-written last line) never replays or corrupts anything.
+    """
+    def __init__(self, snapshot_path=MEMORY_FILE, journal_path=MEMORY_JOURNAL_FILE,
+                 compact_every=MEMORY_COMPACT_EVERY, history_retain=MEMORY_HISTORY_RETAIN):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.history_retain = history_retain
+        self.data = {"conversation_history": [], "reminders": {}, "preferences": {}} # reminders: id -> reminder
+        self._seq = 0
+        self._journal_ops = 0
+        self._journal = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Read the snapshot, replay the journal on top of it and return the memory dict."""
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            snapshot_seq = snapshot.pop("journal_seq", 0)
+            self.data["conversation_history"][:] = snapshot.get("conversation_history", [])
+            self.data["reminders"].clear()
+            for i, reminder in enumerate(snapshot.get("reminders", [])):
+                reminder.setdefault("id", f"legacy-{i}") # Written before reminders had ids
+                self.data["reminders"][reminder["id"]] = _reminder_from_json(reminder)
+            self.data["preferences"].update(snapshot.get("preferences", {}))
+        self._seq = snapshot_seq
+
+        if os.path.exists(self.journal_path):
+            good_bytes = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated line")
+                        op = json.loads(line)
+                    except ValueError: # Torn final line from a crash mid-append
+                        break
+                    good_bytes += len(line)
+                    if op["seq"] > snapshot_seq:
+                        self._apply(op)
+                        self._seq = op["seq"]
+                        self._journal_ops += 1
+            if good_bytes < os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good_bytes) # So new appends don't land on the end of the torn line
+        return self.data
+
+    def _apply(self, op):
+        kind = op["op"]
+        if kind == "history":
+            self.data["conversation_history"].append(op["entry"])
+        elif kind == "reminder_add": # Also replaces an existing reminder with the same id (rescheduling)
+            self.data["reminders"][op["reminder"]["id"]] = _reminder_from_json(op["reminder"])
+        elif kind == "reminder_remove":
+            self.data["reminders"].pop(op["id"], None)
+        elif kind == "preference":
+            self.data["preferences"][op["key"]] = op["value"]
+
+    def _append(self, op):
+        with self._lock:
+            self._seq += 1
+            op["seq"] = self._seq
+            self._apply(op)
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(json.dumps(op, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            self._journal_ops += 1
+
+    def append_history(self, entry):
+        self._append({"op": "history", "entry": entry})
+
+    def add_reminder(self, reminder):
+        self._append({"op": "reminder_add", "reminder": _reminder_to_json(reminder)})
 
-# --- Persistent Memory Management (unchanged) ---
-MEMORY_FILE = "assistant_memory.json"
+    def remove_reminder(self, reminder_id):
+        self._append({"op": "reminder_remove", "id": reminder_id})
+
+    def set_preference(self, key, value):
+        self._append({"op": "preference", "key": key, "value": value})
+
+    def flush(self):
+        """Make every journaled change durable, compacting the journal once it has grown long enough."""
+        with self._lock:
+            if self._journal is not None:
+                os.fsync(self._journal.fileno())
+            if self._journal_ops >= self.compact_every:
+                self.compact()
+
+    def detach(self, directory):
+        """
+        Keep the loaded memory but journal every further change under directory instead, so a
+        headless run can use the real history and reminders without writing anything back.
+        """
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            os.makedirs(directory, exist_ok=True)
+            self.snapshot_path = os.path.join(directory, os.path.basename(self.snapshot_path))
+            self.journal_path = os.path.join(directory, os.path.basename(self.journal_path))
+
+    def compact(self):
+        """Atomically rewrite the snapshot with everything journaled so far, then start a fresh journal."""
+        with self._lock:
+            history = self.data["conversation_history"]
+            del history[:-self.history_retain]
+            snapshot = {
+                "conversation_history": history,
+                "reminders": [_reminder_to_json(r) for r in self.data["reminders"].values()],
+                "preferences": self.data["preferences"],
+                "journal_seq": self._seq,
+            }
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            if self._journal is not None:
+                self._journal.close()
+            self._journal = open(self.journal_path, "w", encoding="utf-8") # Truncate: the snapshot now covers it
+            self._journal_ops = 0
+
+memory_store = MemoryStore()
 
 def load_memory():
-    if os.path.exists(MEMORY_FILE):
-        with open(MEMORY_FILE, "r") as f:
-            data = json.load(f)
-            if "reminders" in data:
-                for r in data["reminders"]:
-                    r["time"] = datetime.fromisoformat(r["time"])
-            return data
-    return {"conversation_history": [], "reminders": [], "preferences": {}}
+    return memory_store.load()
 
 def save_memory(memory_data):
-    serializable_data = memory_data.copy()
-    if "reminders" in serializable_data:
-        serializable_data["reminders"] = [
-            {"time": r["time"].isoformat(), "text": r["text"]} for r in serializable_data["reminders"]
-        ]
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(serializable_data, f, indent=2)
+    """Changes are journaled as they happen; this just makes them durable (and compacts when due)."""
+    memory_store.flush()
 
 memory = load_memory()
-conversation_history = memory.get("conversation_history", [])
-reminders = memory.get("reminders", [])
+conversation_history = memory["conversation_history"]
+reminders = memory["reminders"]
 MAX_HISTORY = 7
 
-# Whisper model for speech-to-text
-whisper_model = WhisperModel("base", compute_type="int8")
+# Whisper model for speech-to-text; tune per machine with `python benchmark.py stt`
+STT_MODEL_SIZE = os.getenv("JARVIS_WHISPER_MODEL", "base")
+STT_DEVICE = os.getenv("JARVIS_WHISPER_DEVICE", "cpu")
+STT_COMPUTE_TYPE = os.getenv("JARVIS_WHISPER_COMPUTE", "int8")
+STT_CPU_THREADS = int(os.getenv("JARVIS_WHISPER_THREADS", "0")) # 0 lets CTranslate2 pick
+STT_NUM_WORKERS = int(os.getenv("JARVIS_WHISPER_WORKERS", "1")) # >1 only helps concurrent transcriptions
+STT_BEAM_SIZE = int(os.getenv("JARVIS_WHISPER_BEAM", "5")) # Beam width for longer utterances
+STT_GREEDY_MAX_SECONDS = float(os.getenv("JARVIS_WHISPER_GREEDY_SECONDS", "4")) # Shorter utterances decode greedily
+STT_WARMUP = os.getenv("JARVIS_WHISPER_WARMUP", "1") == "1"
+
+class WhisperEngine:
+    """
+    A faster-whisper model plus the decoding policy used with it. Short utterances (typical commands)
+    are decoded greedily and only longer ones pay for beam search; warm_up() runs one throwaway decode
+    so the first real command doesn't absorb the one-off graph and allocation cost.
+    """
+    def __init__(self, model_size=STT_MODEL_SIZE, device=STT_DEVICE, compute_type=STT_COMPUTE_TYPE,
+                 cpu_threads=STT_CPU_THREADS, num_workers=STT_NUM_WORKERS, beam_size=STT_BEAM_SIZE,
+                 greedy_max_seconds=STT_GREEDY_MAX_SECONDS):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+        self.greedy_max_seconds = greedy_max_seconds
+        self.model = WhisperModel(model_size, device=device, compute_type=compute_type,
+                                  cpu_threads=cpu_threads, num_workers=num_workers)
+
+    def beam_size_for(self, seconds):
+        return 1 if seconds <= self.greedy_max_seconds else self.beam_size
+
+    def transcribe(self, audio, utterance_seconds=None, **kwargs):
+        """
+        Like WhisperModel.transcribe, with the beam size chosen from the utterance length
+        (utterance_seconds, or the length of audio) unless beam_size is given.
+        """
+        if utterance_seconds is None:
+            utterance_seconds = len(audio) / STT_SAMPLE_RATE
+        kwargs.setdefault("beam_size", self.beam_size_for(utterance_seconds))
+        kwargs.setdefault("language", "en")
+        tracer.annotate(beam_size=kwargs["beam_size"])
+        return self.model.transcribe(audio, **kwargs)
+
+    def warm_up(self):
+        segments, _ = self.model.transcribe(np.zeros(STT_SAMPLE_RATE, dtype=np.float32), beam_size=1, language="en")
+        list(segments) # Decoding is lazy; iterate to actually run it
+
+@lazy_init("stt")
+def get_whisper_model():
+    engine = WhisperEngine()
+    if STT_WARMUP:
+        engine.warm_up()
+    return engine
 
 # --- Helper Functions ---
 
-def get_ai_generated_text(prompt, retries=3, force_json=False):
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
+# --- Gemini Client ---
+class GeminiClient:
+    """
+    Shared client for the Gemini REST API. A single pooled requests.Session keeps TCP/TLS
+    connections alive between prompts instead of reconnecting for every call.
+    """
+    def __init__(self, api_key, base_url=GEMINI_BASE_URL, model=GEMINI_MODEL, pool_size=LLM_POOL_SIZE,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def endpoint(self, method):
+        return f"{self.base_url}/models/{self.model}:{method}"
 
-    temp_conversation_history = list(conversation_history) 
-    temp_conversation_history.append({"role": "user", "parts": [{"text": prompt}]})
-    
-    if len(temp_conversation_history) > MAX_HISTORY * 2: 
-        temp_conversation_history[:] = temp_conversation_history[-(MAX_HISTORY * 2):]
+    @staticmethod
+    def payload(contents, generation_config=None):
+        body = {"contents": contents}
+        if generation_config:
+            body["generationConfig"] = generation_config
+        return body
+
+    def generate(self, contents, generation_config=None, timeout=None):
+        """Call generateContent and return the decoded JSON; raises requests exceptions on failure."""
+        response = self.session.post(self.endpoint("generateContent"), params={"key": self.api_key},
+                                     json=self.payload(contents, generation_config), timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def stream_generate(self, contents, generation_config=None, timeout=None):
+        """Call streamGenerateContent over server-sent events, yielding each piece of text as it arrives."""
+        with self.session.post(self.endpoint("streamGenerateContent"), params={"key": self.api_key, "alt": "sse"},
+                               json=self.payload(contents, generation_config), timeout=timeout or self.timeout,
+                               stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line.startswith(b"data:"):
+                    text = candidate_text(json.loads(line[5:].decode("utf-8")))
+                    if text:
+                        yield text
+
+    def close(self):
+        self.session.close()
+
+def candidate_text(response_json):
+    """Concatenate the text parts of the first candidate, or return None if there isn't one."""
+    if 'candidates' in response_json and response_json['candidates']:
+        first_candidate = response_json['candidates'][0]
+        if 'content' in first_candidate and 'parts' in first_candidate['content']:
+            full_response_text = ""
+            for part in first_candidate['content']['parts']: # Access content inside 'parts' if it's structured this way
+                if 'text' in part:
+                    full_response_text += part['text']
+            return full_response_text
+    return None
 
-    data = {"contents": temp_conversation_history}
+llm_client = GeminiClient(GEMINI_API_KEY)
+
+# --- LLM Resilience ---
+LLM_UNAVAILABLE_RESPONSE = ("Sorry, my link to the AI service is down for the moment, so I can't answer that. "
+                            "Opening apps, searches, reminders and PC controls still work.")
+LLM_THROTTLED_RESPONSE = ("I'm holding back on requests to the AI service so I don't exceed its rate limit, "
+                          "and this one would have waited too long. Please try again in a moment.")
+
+class TokenBucket:
+    """
+    Client-side rate limiter: holds up to capacity tokens, refilled at rate per second; each request
+    takes one. A rate of 0 or less disables it.
+    """
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take a token, waiting for one if needed; False if none is free within timeout seconds."""
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            self.sleep(wait)
+
+class CircuitBreaker:
+    """
+    Fails fast while the backend is unhealthy. Closed: requests pass and consecutive failures are
+    counted; threshold of them opens the circuit. Open: requests are refused until cooldown has passed.
+    Half-open: a single probe request is let through; its success closes the circuit, its failure
+    reopens it. trip() opens it for a given time, e.g. a long Retry-After.
+    """
+    def __init__(self, threshold, cooldown, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def would_allow(self):
+        """Whether allow() would currently let a request through, without claiming the half-open probe."""
+        with self._lock:
+            return self.state == "closed" or not (self._probing or self.clock() < self.open_until)
+
+    def status(self):
+        """(state, consecutive failures), read together under the lock, for health and stats reporting."""
+        with self._lock:
+            return self.state, self.failures
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self._probing or self.clock() < self.open_until:
+                return False
+            self.state = "half_open"
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                log.debug("Gemini is reachable again; circuit closed.")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self._open(self.cooldown)
+
+    def trip(self, seconds):
+        with self._lock:
+            self._probing = False
+            self._open(seconds)
+
+    def _open(self, seconds):
+        if self.state != "open":
+            tracer.count("jarvis_llm_circuit_opened_total")
+            log.debug(f"Gemini circuit opened for {seconds:.0f}s after {self.failures} failure(s).")
+        self.state = "open"
+        self.open_until = max(self.open_until, self.clock() + seconds)
+
+llm_limiter = TokenBucket(LLM_RATE_LIMIT, LLM_RATE_BURST)
+llm_breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN)
+
+def llm_available():
+    """
+    False while the circuit would refuse a request (open, or its half-open probe already in flight), so
+    callers can answer locally instead of waiting on Gemini. Reads the breaker under its lock.
+    """
+    return llm_breaker.would_allow()
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(when.tzinfo)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with jitter for retry number attempt (0-based); never sooner than Retry-After."""
+    ceiling = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt)
+    return max(random.uniform(ceiling / 2, ceiling), retry_after or 0.0) # Jitter spreads out retries from queued commands
+
+class LLMResponseCache:
+    """
+    Persistent cache of Gemini responses for prompts that are pure functions of their input.
+    Entries are keyed by the normalized prompt plus the exact history slice sent with it,
+    expire after ttl seconds and are evicted least-recently-used beyond max_entries.
+    """
+    def __init__(self, path=LLM_CACHE_FILE, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None: # Opened on first use so startup doesn't touch the disk
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        return self._conn
+
+    @staticmethod
+    def key(prompt, history, model=GEMINI_MODEL, generation_config=None):
+        normalized_prompt = " ".join(prompt.lower().split())
+        parts = [model, normalized_prompt, history] + ([generation_config] if generation_config else [])
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO llm_cache (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                         (key, response, now, now))
+            excess = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute("DELETE FROM llm_cache WHERE key IN "
+                             "(SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)", (excess,))
+
+llm_cache = LLMResponseCache()
+
+# --- Context Window ---
+LLM_CONTEXT_BUDGET_TOKENS = 1500 # Approximate tokens of history sent with each prompt
+LLM_SUMMARIZE_OLD_TURNS = False # Fold turns that leave the window into a rolling summary (costs an extra background call)
+
+def approx_tokens(message):
+    """Rough token count (~4 UTF-8 bytes per token) of a Gemini content message."""
+    text_bytes = sum(len(part.get("text", "").encode("utf-8")) for part in message.get("parts", []))
+    return text_bytes // 4 + 4 # Plus a little per-message overhead
+
+class ContextBuilder:
+    """
+    Picks the history that goes out with a prompt: the newest turns that fit an approximate token
+    budget, capped at MAX_HISTORY exchanges. A recent turn too large to fit (a generated article,
+    say) is clipped rather than crowding everything else out. Per-message sizes are cached.
+    With summarize=True, turns that fall out of the window are folded into a rolling summary
+    in the background and sent ahead of the window.
+    """
+    def __init__(self, budget_tokens=LLM_CONTEXT_BUDGET_TOKENS, max_turns=MAX_HISTORY * 2 - 1,
+                 summarize=LLM_SUMMARIZE_OLD_TURNS):
+        self.budget_tokens = budget_tokens
+        self.max_turns = max_turns # Leaves room for the prompt itself
+        self.summarize = summarize
+        self._sizes = {} # id(message) -> (message, tokens); holding the message keeps its id from being reused
+        self._summarized = {} # id(message) -> message already folded into the summary
+        self._summarizing = threading.Lock()
+        self._lock = threading.Lock() # Guards _sizes and _summarized: llm lane workers build concurrently
+
+    def tokens(self, message):
+        with self._lock:
+            cached = self._sizes.get(id(message))
+        if cached is None:
+            cached = (message, approx_tokens(message))
+            with self._lock:
+                self._sizes[id(message)] = cached
+        return cached[1]
+
+    @staticmethod
+    def _clip(message, tokens):
+        text = "".join(part.get("text", "") for part in message.get("parts", []))
+        clipped = text.encode("utf-8")[:max(0, tokens - 4) * 4].decode("utf-8", "ignore")
+        return {"role": message.get("role", "model"), "parts": [{"text": clipped + " [...]"}]}
+
+    def build(self, history):
+        history = list(history)
+        with self._lock:
+            if len(self._sizes) > 4 * max(len(history), 64): # Forget sizes of turns compaction has dropped
+                live = {id(m) for m in history}
+                self._sizes = {k: v for k, v in self._sizes.items() if k in live}
+
+        summary = memory["preferences"].get("history_summary") if self.summarize else None
+        summary_message = {"role": "user", "parts": [{"text": f"Summary of our earlier conversation: {summary}"}]} if summary else None
+        budget = self.budget_tokens - (approx_tokens(summary_message) if summary_message else 0)
+
+        selected = []
+        for message in reversed(history):
+            if len(selected) >= self.max_turns or budget <= 0:
+                break
+            tokens = self.tokens(message)
+            if tokens > budget:
+                if not selected: # Keep the gist of the latest turn rather than sending nothing
+                    selected.append(self._clip(message, budget))
+                break
+            budget -= tokens
+            selected.append(message)
+        selected.reverse()
+
+        if self.summarize:
+            self._summarize_dropped(history[:len(history) - len(selected)])
+        return ([summary_message] if summary_message else []) + selected
+
+    def _summarize_dropped(self, dropped):
+        with self._lock:
+            fresh = [m for m in dropped if id(m) not in self._summarized]
+        if not fresh or not self._summarizing.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                previous = memory["preferences"].get("history_summary", "")
+                turns = "\n".join(f"{m.get('role')}: {''.join(p.get('text', '') for p in m.get('parts', []))}" for m in fresh)
+                summary = get_ai_generated_text(
+                    f"Update this running summary of a conversation with the new turns below. "
+                    f"Keep it under 120 words and keep facts the user may refer back to.\n"
+                    f"Summary so far: {previous or '(none)'}\nNew turns:\n{turns}",
+                    use_history=False, cache=False,
+                )
+                if summary and "sorry" not in summary.lower():
+                    memory_store.set_preference("history_summary", summary)
+                    live = {id(m) for m in list(conversation_history)}
+                    with self._lock:
+                        self._summarized = {k: v for k, v in self._summarized.items() if k in live}
+                        self._summarized.update((id(m), m) for m in fresh)
+            finally:
+                self._summarizing.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+context_builder = ContextBuilder()
+
+def _is_json(text, schema=None):
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return False
+    return schema is None or not schema_errors(value, schema)
+
+def _remember_model_reply(text):
+    memory_store.append_history({"role": "model", "parts": [{"text": text}]})
+
+def _finish_response(full_response_text, use_history, cache_key, force_json, schema=None):
+    """Record the reply in history, strip markdown fences and cache it."""
+    if use_history:
+        _remember_model_reply(full_response_text)
+
+    match = re.search(r"```(?:json)?\s*(.*?)\s*```", full_response_text, re.DOTALL)
+    if match:
+        cleaned_response = match.group(1).strip()
+    else:
+        cleaned_response = full_response_text.strip()
+
+    if cache_key and (not force_json or _is_json(cleaned_response, schema)): # Don't replay malformed JSON
+        llm_cache.put(cache_key, cleaned_response)
+    return cleaned_response
+
+@traced("llm.request")
+def get_ai_generated_text(prompt, retries=3, force_json=False, use_history=True, cache=True, on_chunk=None,
+                          generation_config=None):
+    """
+    Send prompt to Gemini and return the reply with any markdown fences stripped.
+    use_history=False sends the prompt on its own and leaves conversation_history untouched,
+    for stateless prompts like app/action extraction. cache=False skips the response cache,
+    for conversational prompts whose answer should not be replayed.
+    With on_chunk, the reply is streamed and on_chunk is called with each piece as it arrives;
+    the cleaned full reply is still returned at the end (cache hits are returned without chunks).
+    generation_config is passed through to Gemini as-is (see generate_structured).
+    Failed attempts are retried with jittered exponential backoff (honouring Retry-After) within
+    LLM_RETRY_DEADLINE seconds. While llm_breaker is open the call fails fast with LLM_UNAVAILABLE_RESPONSE;
+    otherwise requests wait for llm_limiter, and one that can't get a token in time gets LLM_THROTTLED_RESPONSE.
+    """
+    history_slice = context_builder.build(conversation_history) if use_history else []
+    temp_conversation_history = history_slice + [{"role": "user", "parts": [{"text": prompt}]}]
+
+    cache_key = LLMResponseCache.key(prompt, history_slice, generation_config=generation_config) if cache else None
+    if cache_key:
+        cached_response = llm_cache.get(cache_key)
+        if cached_response is not None:
+            log.debug("LLM response served from cache.")
+            tracer.annotate(cache="hit")
+            if use_history:
+                _remember_model_reply(cached_response)
+            return cached_response
+
+    streamed_text = "" # Once any text has been handed to on_chunk, a retry would repeat it
+    failure_response = "Sorry, I couldn't get a response from the AI. My servers must be experiencing a moment of weakness."
+    deadline = time.monotonic() + LLM_RETRY_DEADLINE
 
     for attempt in range(retries):
+        # Check the circuit before queueing for a token, so an open circuit fails fast instead of after the wait
+        if llm_breaker.would_allow() and not llm_limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            log.debug("Gemini rate limit reached; not waiting any longer.")
+            tracer.count("jarvis_llm_throttled_total")
+            failure_response = LLM_THROTTLED_RESPONSE
+            break
+        if not llm_breaker.allow():
+            log.debug("Gemini circuit is open; failing fast.")
+            tracer.count("jarvis_llm_fast_failures_total")
+            failure_response = LLM_UNAVAILABLE_RESPONSE
+            break
+        if attempt:
+            tracer.count("jarvis_llm_retries_total")
+        retryable, retry_after = True, None
         try:
-            response = requests.post(url, json=data, headers=headers, timeout=20) 
-            response.raise_for_status() 
-            
-            response_json = response.json()
-            if 'candidates' in response_json and response_json['candidates']:
-                first_candidate = response_json['candidates'][0]
-                if 'content' in first_candidate and 'parts' in first_candidate['content']:
-                    full_response_text = ""
-                    for part in first_candidate['content']['parts']: # Access content inside 'parts' if it's structured this way
-                        if 'text' in part:
-                            full_response_text += part['text']
-                    
-                    conversation_history.append({"role": "model", "parts": [{"text": full_response_text}]})
-                    memory["conversation_history"] = conversation_history 
-
-                    match = re.search(r"```(?:json)?\s*(.*?)\s*```", full_response_text, re.DOTALL)
-                    if match:
-                        cleaned_response = match.group(1).strip()
-                    else:
-                        cleaned_response = full_response_text.strip()
-                    
-                    return cleaned_response
+            timeout = (LLM_CONNECT_TIMEOUT, max(1.0, min(LLM_READ_TIMEOUT, deadline - time.monotonic())))
+            with tracer.span("llm.attempt", attempt=attempt + 1, stream=on_chunk is not None):
+                if on_chunk is None:
+                    full_response_text = candidate_text(llm_client.generate(temp_conversation_history, generation_config, timeout))
+                else:
+                    for piece in llm_client.stream_generate(temp_conversation_history, generation_config, timeout):
+                        streamed_text += piece
+                        on_chunk(piece)
+                    full_response_text = streamed_text or None
 
-            return "I'm sorry, I couldn't generate a response."
+            llm_breaker.record_success()
+            if full_response_text is None:
+                return "I'm sorry, I couldn't generate a response."
+            return _finish_response(full_response_text, use_history, cache_key, force_json,
+                                    (generation_config or {}).get("responseSchema"))
 
+        except json.JSONDecodeError as e: # Checked first: requests' JSON errors are RequestExceptions too
+            print(f"Error decoding JSON response from Gemini API (attempt {attempt+1}/{retries}): {e}")
+            failure_response = "I received an unreadable response from the AI service. My circuits are displeased."
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            print(f"Gemini API returned HTTP {status} (attempt {attempt+1}/{retries}): {e}")
+            failure_response = "I'm having trouble connecting to the AI service right now. Perhaps the internet is beneath my standards."
+            retryable = status in LLM_RETRY_STATUSES
+            if e.response is not None:
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
         except requests.exceptions.RequestException as e:
             print(f"Error calling Gemini API (attempt {attempt+1}/{retries}): {e}")
-            if attempt < retries - 1:
-                time.sleep(2) 
-            else:
-                return "I'm having trouble connecting to the AI service right now. Perhaps the internet is beneath my standards."
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON response from Gemini API (attempt {attempt+1}/{retries}). Raw: {response.text}")
-            if attempt < retries - 1:
-                time.sleep(2)
-            else:
-                return "I received an unreadable response from the AI service. My circuits are displeased."
+            failure_response = "I'm having trouble connecting to the AI service right now. Perhaps the internet is beneath my standards."
         except Exception as e:
             print(f"An unexpected error occurred in get_ai_generated_text (attempt {attempt+1}/{retries}): {e}")
-            if attempt < retries - 1:
-                time.sleep(2)
-            else:
-                return "Something went wrong while generating a response. It's probably not my fault."
-    return "Sorry, I couldn't get a response from the AI. My servers must be experiencing a moment of weakness."
+            failure_response = "Something went wrong while generating a response. It's probably not my fault."
+
+        if not retryable: # The service answered, it just won't accept this request: no point retrying
+            llm_breaker.record_success()
+            break
+        llm_breaker.record_failure()
+        delay = backoff_delay(attempt, retry_after)
+        if streamed_text or attempt == retries - 1 or time.monotonic() + delay > deadline:
+            if retry_after: # Giving up, but other commands should stay away for as long as the server asked too
+                llm_breaker.trip(retry_after)
+            break
+        time.sleep(delay)
+
+    if streamed_text: # The stream broke part-way through; keep what has already been spoken
+        return _finish_response(streamed_text, use_history, None, force_json)
+    return failure_response
+
+def schema_errors(value, schema, path="$"):
+    """
+    Check value against a Gemini response schema (the OpenAPI subset: type, properties, required,
+    items, enum) and return a list of problems, empty when it conforms.
+    """
+    kind = schema.get("type", "").upper()
+    expected = {"OBJECT": dict, "ARRAY": list, "STRING": str, "BOOLEAN": bool,
+                "INTEGER": int, "NUMBER": (int, float)}.get(kind)
+    if expected and (not isinstance(value, expected) or (kind in ("INTEGER", "NUMBER") and isinstance(value, bool))):
+        return [f"{path}: expected {kind.lower()}, got {type(value).__name__}"]
+    if "enum" in schema and value not in schema["enum"]:
+        return [f"{path}: {value!r} is not one of {schema['enum']}"]
+    errors = []
+    if kind == "OBJECT":
+        errors += [f"{path}.{name}: missing" for name in schema.get("required", []) if name not in value]
+        for name, subschema in schema.get("properties", {}).items():
+            if name in value:
+                errors += schema_errors(value[name], subschema, f"{path}.{name}")
+    elif kind == "ARRAY" and "items" in schema:
+        for i, item in enumerate(value):
+            errors += schema_errors(item, schema["items"], f"{path}[{i}]")
+    return errors
+
+@traced("llm.structured")
+def generate_structured(prompt, schema, retries=3, use_history=False, cache=True):
+    """
+    Generate several fields in one call: Gemini is asked for JSON matching schema (responseMimeType and
+    responseSchema), and the parsed reply is returned only if it validates, otherwise None.
+    Replaces issuing one prompt per field and scraping each answer out of free-form text.
+    """
+    generation_config = {"responseMimeType": "application/json", "responseSchema": schema}
+    for attempt in range(2): # A reply that parses but doesn't validate is retried once (it was never cached)
+        response_text = get_ai_generated_text(prompt, retries=retries, force_json=True, use_history=use_history,
+                                              cache=cache, generation_config=generation_config)
+        try:
+            value = json.loads(response_text)
+        except (json.JSONDecodeError, TypeError):
+            log.debug(f"Structured reply was not JSON: {response_text!r}")
+            return None # The service failed; get_ai_generated_text has already retried
+        errors = schema_errors(value, schema)
+        if not errors:
+            return value
+        log.debug(f"Structured reply did not match its schema (attempt {attempt + 1}): {'; '.join(errors[:5])}")
+    return None
+
+_MARKDOWN_FENCE = re.compile(r"```(?:json)?")
+
+def speak_generated(prompt, wait=True, **kwargs):
+    """
+    Stream a Gemini reply straight into the speech queue, so the first sentence is spoken
+    while the rest is still being generated. Returns the cleaned full reply.
+    """
+    utterance = new_utterance()
+    pending = ""
+    streamed = False
 
+    def on_chunk(piece):
+        nonlocal pending, streamed
+        streamed = True
+        *complete, pending = _SENTENCE_BOUNDARY.split(pending + piece)
+        for sentence in complete:
+            utterance.add(_MARKDOWN_FENCE.sub("", sentence))
 
+    response = None
+    try:
+        response = get_ai_generated_text(prompt, on_chunk=on_chunk, **kwargs)
+    finally:
+        if streamed:
+            utterance.add(_MARKDOWN_FENCE.sub("", pending))
+        elif response: # Cache hit or an error message: nothing was streamed
+            utterance.add(response)
+        utterance.close()
+
+    print(f"🤖 AI: {response}")
+    if wait:
+        utterance.wait()
+    return response
+
+@traced("intent.extract")
 def extract_app_and_action(cmd):
+    local_app, local_action, confidence = extract_app_and_action_local(cmd)
+    tracer.annotate(local_confidence=round(confidence, 2))
+    if confidence >= LOCAL_EXTRACT_MIN_CONFIDENCE:
+        log.debug(f"Local app/action extraction for '{cmd}': app={local_app}, action={local_action} (confidence {confidence:.2f})")
+        return local_app, local_action
+
     prompt = (f"Analyze the command: '{cmd}'. As a highly advanced AI, I need you to identify the primary "
               f"application and the specific action to perform on it. "
               f"Respond ONLY with a perfect JSON object. Format: {{'app': 'application_name', 'action': 'action_to_perform'}}. "
@@ -220,8 +1662,8 @@ def extract_app_and_action(cmd):
               f"Always provide an 'app' and 'action' key, even if null. If the action is to search a web app (like YouTube), extract the search query.")
     
     try:
-        response_text = get_ai_generated_text(prompt, force_json=True)
-        print(f"DEBUG: Raw response from Gemini for app/action extraction: {response_text}")
+        response_text = get_ai_generated_text(prompt, force_json=True, use_history=False)
+        log.debug(f"Raw response from Gemini for app/action extraction: {response_text}")
 
         parsed_response = json.loads(response_text)
         
@@ -229,8 +1671,10 @@ def extract_app_and_action(cmd):
         action = parsed_response.get('action')
         return app.lower() if app else None, action.lower() if action else None
     except (json.JSONDecodeError, AttributeError, TypeError) as e:
-        print(f"DEBUG: Failed to parse app/action from Gemini for '{cmd}': {e}. Raw response: '{response_text}'")
+        log.debug(f"Failed to parse app/action from Gemini for '{cmd}': {e}. Raw response: '{response_text}'")
         speak("My apologies, human. My sophisticated parsing algorithms encountered some ambiguity. Allow me to attempt a simpler interpretation.")
+        if local_app:
+            return local_app, local_action
         if "youtube" in cmd:
             match = re.search(r"(?:play|search|find)\s*(.+)\s*(?:on)?\s*youtube", cmd)
             if match:
@@ -244,35 +1688,562 @@ def extract_app_and_action(cmd):
             return "word", cmd.replace("word", "").replace("document", "").strip()
         return None, None 
 
+# --- UI Automation ---
+UI_POLL_INTERVAL = 0.1 # How often readiness conditions are re-checked
+UI_SETTLE_SECONDS = 0.3 # Pause after keystrokes whose effect can't be observed (e.g. inside a web page)
+UI_PAGE_STEP_SECONDS = 2.0 # Longest wait for a field inside a web page to show what was typed
+UI_CLIPBOARD_TIMEOUT = 2.0 # How long a copied field may take to reach the clipboard
+EMAIL_COMPOSE_WAIT = 4.0 # Longest wait for Gmail's compose pane to open and take the address
+EMAIL_BROWSER_TITLES = ["Gmail", "Google Chrome", "Microsoft Edge", "Mozilla Firefox"] # Gmail tab first, then any browser
+
+class PyAutoGUIBackend:
+    """Drives the real desktop through pyautogui, pyperclip, webbrowser and the OS shell."""
+    def hotkey(self, *keys):
+        pyautogui.hotkey(*keys)
+
+    def press(self, key):
+        pyautogui.press(key)
+
+    def typewrite(self, text):
+        pyautogui.typewrite(text)
+
+    def copy(self, text):
+        pyperclip.copy(text)
+
+    def read_clipboard(self):
+        return pyperclip.paste()
+
+    def open_url(self, url):
+        webbrowser.open(url)
+
+    def open_file(self, path):
+        if hasattr(os, "startfile"): # Windows: opens with the associated app
+            os.startfile(path)
+
+    def run_system(self, command):
+        os.system(command)
+
+    def lock_workstation(self):
+        ctypes.windll.user32.LockWorkStation()
+
+    def can_observe(self):
+        """Whether window titles can be read: pygetwindow only supports Windows, so probe once there."""
+        if not hasattr(self, "_observable"):
+            try:
+                self._observable = sys.platform == "win32" and isinstance(pyautogui.getActiveWindowTitle(), str)
+            except Exception:
+                self._observable = False
+        return self._observable
+
+    def find_window(self, title):
+        windows = pyautogui.getWindowsWithTitle(title)
+        return windows[0].title if windows else None
+
+    def activate(self, title):
+        windows = pyautogui.getWindowsWithTitle(title)
+        if not windows:
+            return False
+        windows[0].activate()
+        return True
+
+    def active_title(self):
+        return pyautogui.getActiveWindowTitle() or ""
+
+class FakeUIBackend:
+    """
+    Headless stand-in that records every action instead of touching the desktop (or shutting it down).
+    Every window is reported as present, and each action moves focus, so readiness waits
+    succeed on the first poll. Set ready=False to exercise timeouts, and instant=True to skip
+    the fixed settle delays as well. Text typed or pasted goes into a pretend focused field, which
+    tab/enter leave and ctrl+c copies, so clipboard checks of what was typed pass when ready.
+    """
+    def __init__(self, ready=True, instant=False):
+        self.ready = ready
+        self.instant = instant
+        self.actions = [] # (perf_counter timestamp, action, args)
+        self.clipboard = ""
+        self._field = ""
+        self._active = "fake window 0"
+
+    def _record(self, action, *args):
+        self.actions.append((time.perf_counter(), action, args))
+        if self.ready:
+            self._active = f"fake window {len(self.actions)}"
+
+    def hotkey(self, *keys):
+        self._record("hotkey", *keys)
+        if keys == ("ctrl", "v"):
+            self._field += self.clipboard
+        elif keys == ("ctrl", "c") and self.ready:
+            self.clipboard = self._field
+
+    def press(self, key):
+        self._record("press", key)
+        if key in ("tab", "enter"):
+            self._field = ""
+
+    def typewrite(self, text):
+        self._record("typewrite", text)
+        self._field += text
+
+    def copy(self, text):
+        self.clipboard = text
+        self._record("copy", text)
+
+    def read_clipboard(self):
+        return self.clipboard
+
+    def open_url(self, url):
+        self._record("open_url", url)
+
+    def open_file(self, path):
+        self._record("open_file", path)
+
+    def run_system(self, command):
+        self._record("run_system", command)
+
+    def lock_workstation(self):
+        self._record("lock_workstation")
+
+    def can_observe(self):
+        return True
+
+    def find_window(self, title):
+        return title if self.ready else None
+
+    def activate(self, title):
+        self._record("activate", title)
+        if self.ready:
+            self._active = title
+        return self.ready
+
+    def active_title(self):
+        return self._active
+
+def wait_until(condition, timeout, poll=UI_POLL_INTERVAL):
+    """Poll condition() until it returns something truthy or timeout seconds pass; returns the value or None."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = condition()
+        if value or time.monotonic() >= deadline:
+            return value or None
+        time.sleep(poll)
+
+class UIAutomation:
+    """
+    Keyboard/window automation that waits for concrete readiness conditions (a window appearing,
+    focus moving) with timeouts instead of fixed sleeps, over a pluggable backend.
+    On backends that cannot observe windows, each wait falls back to its legacy fixed delay.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    @traced("ui.hotkey")
+    def hotkey(self, *keys):
+        self.backend.hotkey(*keys)
+
+    @traced("ui.press")
+    def press(self, key):
+        self.backend.press(key)
+
+    @traced("ui.typewrite")
+    def typewrite(self, text):
+        self.backend.typewrite(text)
+
+    @traced("ui.copy")
+    def copy(self, text):
+        self.backend.copy(text)
+
+    @traced("ui.open_url")
+    def open_url(self, url):
+        self.backend.open_url(url)
+
+    @traced("ui.paste")
+    def paste(self, text):
+        self.backend.copy(text)
+        self.backend.hotkey("ctrl", "v")
+
+    @traced("ui.open_file")
+    def open_file(self, path):
+        self.backend.open_file(path)
+
+    @traced("ui.run_system")
+    def run_system(self, command):
+        self.backend.run_system(command)
+
+    @traced("ui.lock_workstation")
+    def lock_workstation(self):
+        self.backend.lock_workstation()
+
+    @traced("ui.confirm_field")
+    def field_contains(self, expected, timeout=UI_CLIPBOARD_TIMEOUT):
+        """
+        Select and copy the focused field (ctrl+a, ctrl+c) and check its text contains expected,
+        ignoring whitespace differences. Confirms keystrokes inside a web page landed where intended;
+        False when the field doesn't match or the clipboard can't be read.
+        """
+        try:
+            self.backend.copy("") # So a stale clipboard can't pass for the copied field
+            self.backend.hotkey("ctrl", "a")
+            self.backend.hotkey("ctrl", "c")
+            copied = wait_until(self.backend.read_clipboard, timeout) or ""
+        except Exception as e: # e.g. no clipboard tool on this system
+            log.debug(f"Could not read the clipboard: {e}")
+            return False
+        matched = " ".join(expected.split()) in " ".join(copied.split())
+        tracer.annotate(matched=matched)
+        return matched
+
+    @traced("ui.wait_for_field")
+    def wait_for_field(self, expected, timeout):
+        """Re-check the focused field until it contains expected (see field_contains); True once it does, False on timeout."""
+        return bool(wait_until(lambda: self.field_contains(expected, timeout=UI_SETTLE_SECONDS), timeout))
+
+    @traced("ui.settle")
+    def settle(self, seconds=UI_SETTLE_SECONDS):
+        if not getattr(self.backend, "instant", False):
+            time.sleep(seconds)
+
+    def active_title(self):
+        return self.backend.active_title() if self.backend.can_observe() else ""
+
+    @traced("ui.wait_for_window")
+    def wait_for_window(self, titles, timeout, fallback=0.0):
+        """Wait for a window whose title contains any of titles; returns its title, or None on timeout."""
+        if isinstance(titles, str):
+            titles = [titles]
+        if not self.backend.can_observe():
+            self.settle(fallback)
+            return None
+        return wait_until(lambda: next(filter(None, (self.backend.find_window(t) for t in titles)), None), timeout)
+
+    @traced("ui.focus_window")
+    def focus_window(self, titles, timeout, fallback=0.0):
+        """Wait for one of titles to appear, bring it to the front and wait until it has focus."""
+        title = self.wait_for_window(titles, timeout, fallback)
+        if not title or not self.backend.activate(title):
+            return None
+        return wait_until(lambda: title in self.active_title(), min(timeout, 3.0))
+
+    @traced("ui.wait_for_focus_change")
+    def wait_for_focus_change(self, previous_title, timeout, fallback=0.0):
+        """Wait until the foreground window is no longer previous_title; returns the new title or None."""
+        if not self.backend.can_observe():
+            self.settle(fallback)
+            return None
+        return wait_until(lambda: (lambda t: t if t != previous_title else None)(self.active_title()), timeout)
+
+ui = UIAutomation(PyAutoGUIBackend())
+
+def set_ui_backend(backend):
+    """Swap the automation backend, e.g. FakeUIBackend() for headless runs."""
+    ui.backend = backend
+
+APP_MAP = {
+    "chrome": "chrome", "firefox": "firefox", "edge": "msedge",
+    "word": "Microsoft Word", "excel": "Microsoft Excel",
+    "powerpoint": "Microsoft PowerPoint", "notepad": "notepad",
+    "calculator": "calc", "paint": "mspaint",
+    "settings": "ms-settings:", 
+    "youtube": "https://www.youtube.com/", # Base URL for youtube, will use selenium for specific actions
+    "gmail": "https://mail.google.com/", # Base URL for Gmail, will use webbrowser for initial open
+    "outlook": "outlook", 
+    "spotify": "spotify",
+    "telegram": "Telegram Desktop",
+    "explorer": "explorer", 
+    "task manager": "taskmgr",
+    "command prompt": "cmd",
+    "terminal": "wt" 
+}
+
+# --- Local App/Action Extraction ---
+LOCAL_EXTRACT_MIN_CONFIDENCE = 0.8 # Below this, extract_app_and_action asks Gemini instead
+
+# Other ways people name the APP_MAP entries
+APP_ALIASES = {
+    "youtube": ["you tube", "yt"], "gmail": ["google mail", "mail", "email", "inbox"],
+    "word": ["microsoft word", "ms word", "document"], "excel": ["microsoft excel", "ms excel", "spreadsheet"],
+    "powerpoint": ["microsoft powerpoint", "power point", "ppt", "slides"],
+    "chrome": ["google chrome"], "edge": ["microsoft edge"], "firefox": ["mozilla firefox"],
+    "calculator": ["calc"], "paint": ["ms paint", "mspaint"], "settings": ["windows settings", "control panel"],
+    "explorer": ["file explorer", "files", "file manager"], "command prompt": ["cmd"],
+    "terminal": ["windows terminal", "powershell"], "task manager": ["taskmgr"],
+}
+APP_NAMES = {name: name for name in APP_MAP}
+APP_NAMES.update((alias, name) for name, aliases in APP_ALIASES.items() for alias in aliases)
+
+_FILLER = re.compile(r"^(?:(?:hey |ok |okay )?jarvis,?\s+)?(?:(?:please|can you|could you|would you|kindly)\s+)*|\s+(?:please|for me|now)$")
+_APP_FILLER = re.compile(r"^(?:the|my|a)\s+|\s+(?:app|application|program|website|site)$")
+_OPEN_VERB = r"(?:open|launch|start|run|access|fire up|bring up)"
+_MEDIA_VERB = r"(?:play|search(?: for)?|find|look up|watch|listen to)"
+_OPEN_WITH_ACTION = re.compile(rf"^{_OPEN_VERB}\s+(?P<app>.+?)\s+(?:and|then|to)\s+(?P<action>.+)$")
+# Greedy query: the app is named last ("play music in the car on spotify")
+_ACTION_ON_APP = re.compile(rf"^(?P<verb>{_MEDIA_VERB})\s+(?P<query>.+)\s+(?:on|in|using|with)\s+(?P<app>.+)$")
+_OPEN_ONLY = re.compile(rf"^{_OPEN_VERB}\s+(?P<app>.+)$")
+_PLAY_ONLY = re.compile(r"^(?P<verb>play|watch|listen to)\s+(?P<query>.+)$")
+
+@functools.lru_cache(maxsize=None)
+def _app_name_index():
+    names_by_app = collections.defaultdict(list)
+    for name, app in APP_NAMES.items():
+        names_by_app[app].append(name)
+    return PhraseIndex(names_by_app, min_score=79)
+
+def _resolve_app(name, trust_unknown=False):
+    """
+    Map a spoken app name onto an APP_MAP key; returns (key or cleaned name, confidence). Names that
+    aren't known apps only pass LOCAL_EXTRACT_MIN_CONFIDENCE with trust_unknown (a bare "open X").
+    """
+    spoken = name.strip(" .,!?")
+    name = _APP_FILLER.sub("", spoken)
+    if name in APP_NAMES:
+        return APP_NAMES[name], 1.0
+    app, score = _app_name_index().lookup(name)
+    if score:
+        return app, score / 100 * 0.95
+    # A short unknown name after "open" is what Windows Search gets either way; "open the door",
+    # "on repeat" or "in london" are better left to Gemini
+    if trust_unknown and 0 < len(name.split()) <= 3 and not re.match(r"(?:the|my|a)\s", spoken):
+        return name, LOCAL_EXTRACT_MIN_CONFIDENCE
+    return name, 0.5 if 0 < len(name.split()) <= 3 else 0.3
+
+def _normalize_action(action):
+    """Phrase media actions the way open_application expects ("play X" / "search X")."""
+    verb, _, rest = action.partition(" ")
+    if verb in ("watch", "listen") or action.startswith("listen to "):
+        return "play " + re.sub(r"^to\s+", "", rest)
+    if action.startswith(("search for ", "look up ", "find ")):
+        return "search " + re.sub(r"^(?:for|up)\s+", "", rest)
+    return action
+
+def extract_app_and_action_local(cmd):
+    """
+    Regex/fuzzy extraction of {app, action} for the common command shapes, e.g. "open X",
+    "play Y on youtube", "launch X and search Z". Returns (app, action, confidence in 0..1).
+    """
+    cmd = _FILLER.sub("", cmd.lower().strip(" .!?"))
+
+    match = _ACTION_ON_APP.match(cmd)
+    if match:
+        app, confidence = _resolve_app(match["app"])
+        return app, _normalize_action(f"{match['verb']} {match['query']}"), confidence
+
+    match = _OPEN_WITH_ACTION.match(cmd)
+    if match:
+        app, confidence = _resolve_app(match["app"])
+        return app, _normalize_action(match["action"].strip()), confidence
+
+    match = _OPEN_ONLY.match(cmd)
+    if match:
+        app, confidence = _resolve_app(match["app"], trust_unknown=True)
+        return app, None, confidence
+
+    match = _PLAY_ONLY.match(cmd)
+    if match: # Probably YouTube, but let Gemini confirm
+        return "youtube", _normalize_action(f"{match['verb']} {match['query']}"), 0.6
+
+    return None, None, 0.0
+
+# --- Browser Sessions ---
+def create_webdriver(browser=BROWSER, driver_path=BROWSER_DRIVER_PATH, headless=BROWSER_HEADLESS):
+    """Start a WebDriver session for the configured browser."""
+    if browser == "edge":
+        options = webdriver.EdgeOptions()
+        service = EdgeService(driver_path) if driver_path else EdgeService()
+        if headless:
+            options.add_argument("--headless=new")
+        return webdriver.Edge(service=service, options=options)
+    if browser == "chrome":
+        options = webdriver.ChromeOptions()
+        service = ChromeService(driver_path) if driver_path else ChromeService()
+        if headless:
+            options.add_argument("--headless=new")
+        return webdriver.Chrome(service=service, options=options)
+    if browser == "firefox":
+        options = webdriver.FirefoxOptions()
+        service = FirefoxService(driver_path) if driver_path else FirefoxService()
+        if headless:
+            options.add_argument("-headless")
+        return webdriver.Firefox(service=service, options=options)
+    raise ValueError(f"Unsupported browser '{browser}' (expected edge, chrome or firefox)")
+
+class BrowserSessionPool:
+    """
+    Keeps warm WebDriver sessions and hands them out for reuse instead of cold-starting a browser
+    per request. A reaper thread quits sessions idle for longer than idle_seconds (a page that is
+    still playing media doesn't count as idle), and everything is quit at exit.
+    """
+    def __init__(self, factory=create_webdriver, max_sessions=1, idle_seconds=BROWSER_IDLE_SECONDS):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._idle = [] # [driver, last_used] pairs, most recently used last
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._reaper = None
+        atexit.register(self.close)
+
+    @staticmethod
+    def _alive(driver):
+        try:
+            driver.current_url # Cheap round-trip; fails once the browser has been closed
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _playing_media(driver):
+        try:
+            return bool(driver.execute_script(
+                "return Array.from(document.querySelectorAll('video, audio')).some(m => !m.paused && !m.ended);"))
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            log.debug(f"Browser session did not quit cleanly: {e}")
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._idle:
+                    driver, _ = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_sessions:
+                    self._in_use += 1
+                    driver = None
+                    break
+                self._cond.wait()
+        if driver is not None:
+            if self._alive(driver):
+                return driver
+            self._quit(driver) # The user closed the window; start over
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        self._ensure_reaper()
+        return driver
+
+    def _release(self, driver, healthy):
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append([driver, time.monotonic()])
+            self._cond.notify()
+        if not healthy:
+            self._quit(driver)
+
+    @contextlib.contextmanager
+    def session(self):
+        """Borrow a warm driver for the duration of a with-block."""
+        driver = self._acquire()
+        healthy = True
+        try:
+            yield driver
+        except Exception:
+            healthy = self._alive(driver)
+            raise
+        finally:
+            self._release(driver, healthy)
+
+    def warm(self):
+        """Start a session ahead of time so the first request doesn't pay for the browser launch."""
+        with self.session():
+            pass
+
+    def _ensure_reaper(self):
+        with self._cond:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="browser-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(min(60, self.idle_seconds / 4))
+            now = time.monotonic()
+            with self._cond:
+                candidates = [entry for entry in self._idle if now - entry[1] > self.idle_seconds]
+                for entry in candidates:
+                    self._idle.remove(entry)
+                    self._in_use += 1 # Checked outside the lock; keep the slot reserved meanwhile
+            for entry in candidates:
+                driver = entry[0]
+                if self._playing_media(driver):
+                    self._release(driver, healthy=True) # Still playing; counts as used just now
+                else:
+                    log.debug("Closing idle browser session.")
+                    self._release(driver, healthy=False)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for driver, _ in idle:
+            self._quit(driver)
+
+class DryRunElement:
+    """Page element returned by DryRunDriver: always visible and clickable."""
+    def __init__(self, driver, locator):
+        self.driver = driver
+        self.locator = locator
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def get_attribute(self, name):
+        return f"{self.driver.current_url}#dry-run" if name == "href" else None
+
+    def click(self):
+        self.driver.visited.append(("click", self.locator))
+
+class DryRunDriver:
+    """WebDriver stand-in for headless runs: records the pages visited and finds every element it is asked for."""
+    def __init__(self):
+        self.current_url = "about:blank"
+        self.visited = []
+
+    def get(self, url):
+        self.current_url = url
+        self.visited.append(("get", url))
+
+    def find_element(self, by, value):
+        return DryRunElement(self, (by, value))
+
+    def execute_script(self, script, *args):
+        return False
+
+    def quit(self):
+        pass
+
+browser_pool = BrowserSessionPool()
+
+@lazy_init("browser")
+def warm_browser():
+    browser_pool.warm()
+    return browser_pool
+
 def open_application(app_name_raw, action=None):
     """
     Open an application or URL. Uses webbrowser for general web apps (respects logins)
     and Selenium for specific interactive web tasks (YouTube).
     """
     print(f"🖥 Attempting to open {app_name_raw} with action: {action if action else 'none'}")
-    speak(f"Opening {app_name_raw}. Prepare for efficiency.") 
+    speak(f"Opening {app_name_raw}. Prepare for efficiency.", wait=False)
     
-    app_map = {
-        "chrome": "chrome", "firefox": "firefox", "edge": "msedge",
-        "word": "Microsoft Word", "excel": "Microsoft Excel",
-        "powerpoint": "Microsoft PowerPoint", "notepad": "notepad",
-        "calculator": "calc", "paint": "mspaint",
-        "settings": "ms-settings:", 
-        "youtube": "https://www.youtube.com/", # Base URL for youtube, will use selenium for specific actions
-        "gmail": "https://mail.google.com/", # Base URL for Gmail, will use webbrowser for initial open
-        "outlook": "outlook", 
-        "spotify": "spotify",
-        "telegram": "Telegram Desktop",
-        "explorer": "explorer", 
-        "task manager": "taskmgr",
-        "command prompt": "cmd",
-        "terminal": "wt" 
-    }
-    
-    best_match_key, score = process.extractOne(app_name_raw.lower(), list(app_map.keys()))
+    best_match_key, score = process.extractOne(app_name_raw.lower(), list(APP_MAP.keys()))
     
     if score >= 75: 
-        target_app_search_name = app_map[best_match_key]
+        target_app_search_name = APP_MAP[best_match_key]
         app_name_friendly = best_match_key 
     else:
         target_app_search_name = app_name_raw 
@@ -285,54 +2256,48 @@ def open_application(app_name_raw, action=None):
             speak("What song or video do you want to play on YouTube, esteemed user?")
             return
 
-        speak(f"Initiating entertainment protocols. Playing {query} on YouTube. This requires my specialized browser control unit.") 
-        driver = None # Local driver instance for this task
+        speak(f"Initiating entertainment protocols. Playing {query} on YouTube. This requires my specialized browser control unit.", wait=False)
         try:
-            edge_service = Service("C:/WebDriver/msedgedriver.exe") # Re-initialize service if needed
-            driver = webdriver.Edge(service=edge_service) 
-            driver.get("https://www.youtube.com/")
-            
-            search_box = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.NAME, "search_query"))
-            )
-            search_box.send_keys(query)
-            search_box.submit() 
-            
-            video_link = WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.ID, "video-title")) 
-            )
-            video_link.click()
+            with browser_pool.session() as driver:
+                # Go straight to the results page instead of typing into the home page search box
+                driver.get(f"https://www.youtube.com/results?search_query={urllib.parse.quote_plus(query)}")
+                video_link = WebDriverWait(driver, 15).until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, "a#video-title"))
+                )
+                video_url = video_link.get_attribute("href")
+                if video_url:
+                    driver.get(video_url)
+                else:
+                    video_link.click()
             speak(f"Now playing {query} on YouTube. You're welcome.") 
         except Exception as e:
-            speak(f"Apologies, but my attempt to access YouTube for {query} encountered an anomaly: {e}. Ensure the browser window is accessible and msedgedriver.exe is correctly configured.") 
+            speak(f"Apologies, but my attempt to access YouTube for {query} encountered an anomaly: {e}. Ensure the browser window is accessible and the {BROWSER} WebDriver is correctly configured.") 
             print(f"YouTube Selenium Error: {e}")
-        finally:
-            if driver:
-                print ("done its playing ") # Always quit driver after task completion
         return 
     
     # Generic web apps or Windows URIs use webbrowser
     elif target_app_search_name.startswith("http") or target_app_search_name.startswith("ms-settings:"): 
-        webbrowser.open(target_app_search_name)
+        ui.open_url(target_app_search_name)
         speak(f"I've opened {app_name_friendly}. Marvel at my efficiency.") 
-    else: # Desktop application, use Windows Search via pyautogui
-        pyautogui.hotkey("win", "s")
-        time.sleep(1.5) 
-        pyautogui.typewrite(target_app_search_name)
-        time.sleep(1.5) 
-        pyautogui.press("enter")
+    else: # Desktop application, use Windows Search
+        before_search = ui.active_title()
+        ui.hotkey("win", "s")
+        search_title = ui.wait_for_focus_change(before_search, timeout=3, fallback=1.5) # Search panel takes focus
+        ui.typewrite(target_app_search_name)
+        ui.settle(0.5) # Let the search results catch up with the typing
+        ui.press("enter")
+        # Done as soon as the launched app takes focus from the search panel
+        ui.wait_for_focus_change(search_title or before_search, timeout=8, fallback=3)
         speak(f"I've attempted to open {app_name_friendly}. Your humble servant, at your command.") 
-    
-    time.sleep(3) # Give app time to open (can be refined with more specific waits)
 
 def search_web(query):
     """
     Open a Google search in the default browser for the provided query using webbrowser.
     """
     print(f"🌍 Searching for: {query}...")
-    speak(f"Consulting the vast expanse of the internet for {query}. Prepare for enlightenment.") 
-    webbrowser.open(f"https://www.google.com/search?q={urllib.parse.quote(query)}")
-    time.sleep(3) # Give browser time to open the search results
+    speak(f"Consulting the vast expanse of the internet for {query}. Prepare for enlightenment.", wait=False)
+    ui.open_url(f"https://www.google.com/search?q={urllib.parse.quote(query)}")
+    ui.wait_for_window(f"{query} - Google Search", timeout=5, fallback=3) # Keep the UI lane until the results are up
 
 def open_and_paste(cmd_text):
     """
@@ -340,202 +2305,651 @@ def open_and_paste(cmd_text):
     More robust Word opening and pasting.
     """
     print(f"📝 Generating content on '{cmd_text}'...")
-    speak(f"Initiating content generation for: {cmd_text}. Expect brilliance.") 
+    speak(f"Initiating content generation for: {cmd_text}. Expect brilliance.", wait=False)
     
     generated_text = get_ai_generated_text(
         f"Generate a detailed and insightful article or document content based on this request: '{cmd_text}'. "
         f"Present it clearly with paragraphs and headings, suitable for a master of efficiency such as myself to provide to a human.",
-        force_json=False
+        force_json=False,
+        cache=False
     )
     
     if generated_text and "sorry" not in generated_text.lower():
-        pyperclip.copy(generated_text)
-        speak("I have graced your clipboard with the generated text. Opening Microsoft Word, you may now paste my magnificent prose.") 
-        open_application("Microsoft Word") 
-        time.sleep(5) # Give Word ample time to load
+        with scheduler.hold("ui"): # Clipboard, Word window and keystrokes
+            ui.copy(generated_text)
+            speak("I have graced your clipboard with the generated text. Opening Microsoft Word, you may now paste my magnificent prose.") 
+            open_application("Microsoft Word") 
 
-        try:
-            word_window = pyautogui.getWindowsWithTitle("Word")
-            if word_window:
-                word_window[0].activate()
-                time.sleep(1)
-            
-            pyautogui.hotkey('ctrl', 'n')
-            time.sleep(2)
-            pyautogui.hotkey("ctrl", "v")
-            speak("Mission accomplished. The document is now ready for your perusal in Microsoft Word.") 
-        except Exception as e:
-            speak(f"A minor hiccup in writing to Word: {str(e)}. Ensure the application is installed and awaiting my commands.") 
-            print(f"Word Automation Error: {e}")
+            try:
+                word_title = ui.focus_window("Word", timeout=20, fallback=5) # Returns as soon as Word is up and focused
+                ui.hotkey('ctrl', 'n')
+                ui.wait_for_focus_change(word_title, timeout=5, fallback=2) # The new document opens in its own window
+                ui.hotkey("ctrl", "v")
+                speak("Mission accomplished. The document is now ready for your perusal in Microsoft Word.") 
+            except Exception as e:
+                speak(f"A minor hiccup in writing to Word: {str(e)}. Ensure the application is installed and awaiting my commands.") 
+                print(f"Word Automation Error: {e}")
     else:
         speak("I couldn't generate any text for that request. My creative circuits demand more clarity.") 
 
+EMAIL_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"subject": {"type": "STRING"}, "body": {"type": "STRING"}},
+    "required": ["subject", "body"],
+}
+
 def send_email(to_address, email_topic):
     """
-    Generates email content (subject and body) via Gemini, opens Gmail in the default browser,
-    and uses pyautogui to navigate and send the email based on user-provided keyboard shortcuts.
-    This method is highly reliant on UI stability and active window focus.
+    Generates email content (subject and body, in one structured call) via Gemini, opens Gmail in the default browser,
+    and uses pyautogui to navigate and send the email based on user-provided keyboard shortcuts.
+    This method is highly reliant on UI stability and active window focus.
+    """
+    log.debug(f"Preparing email for {to_address} on topic: '{email_topic}' using pyautogui for direct interaction.")
+    speak("Please wait a moment while I meticulously craft your digital missive. "
+          "I will now open your default web browser to Gmail and attempt to automate the composition. "
+          "Please ensure the browser window is active and visible.", wait=False)
+    
+    # Subject and body come back together as one JSON object, instead of two calls and regex clean-up
+    email_prompt = (
+        f"Write an email about the following topic: '{email_topic}'. "
+        f"The subject must be a single concise and impactful subject line, with no quotes or 'Subject:' prefix. "
+        f"The body must be well-formatted, polite and professional, with a suitable salutation (e.g., 'Dear recipient,') "
+        f"and a polite closing (e.g., 'Sincerely, Bibek parajuli'). "
+        f"Remember, this is from a highly capable AI. Keep it concise."
+    )
+    email = generate_structured(email_prompt, EMAIL_SCHEMA, cache=False)
+    if email is None or not email["body"].strip():
+        speak("I encountered a slight conceptual blockage and couldn't generate the email content. Perhaps the topic was too mundane.")
+        return
+
+    subject = email["subject"].strip().split("\n")[0].strip(" \"'")
+    if not subject:
+        subject = f"Regarding: {email_topic}"
+        speak("My apologies, I had a trivial issue generating a perfect subject, so I'll employ a standard yet effective one.")
+    email_body = email["body"].strip()
+    log.debug(f"Generated subject: {subject}")
+    
+    with scheduler.hold("ui"): # Browser focus and keystrokes must not interleave with other UI commands
+        try:
+            # Open Gmail in the default browser
+            log.debug("Opening Gmail inbox in default browser.")
+            ui.open_url("https://mail.google.com/")
+
+            # Done waiting as soon as a Gmail (or failing that, any browser) window is in front
+            browser_title = ui.focus_window(EMAIL_BROWSER_TITLES, timeout=20, fallback=7)
+            browser_activated = browser_title is not None or not ui.backend.can_observe()
+            if browser_title:
+                log.debug(f"Successfully activated browser window: {browser_title}")
+        
+            if not browser_activated:
+                speak("I'm having difficulty bringing the browser window to the foreground. Please ensure your browser is open and Gmail is visible.")
+                # Fallback to alt+tab if specific activation fails
+                ui.hotkey('alt', 'tab') 
+                ui.settle(1)
+                ui.hotkey('alt', 'tab') # Cycle back if needed
+                ui.settle(1)
+
+
+            speak("Attempting to compose the email using on-screen automation via keyboard shortcuts.")
+
+            # User's specified keyboard sequence to open compose: left arrow, up arrow, enter.
+            # Window titles can't see inside the page, so each field is polled through the clipboard
+            # until it holds what was typed (done as soon as it does), and nothing is sent unless all match.
+            log.debug("Pressing Left, Up, Enter to open compose.")
+            ui.press('left')
+            ui.settle()
+            ui.press('up')
+            ui.settle()
+            ui.press('enter')
+
+            # Type 'To' address
+            if to_address:
+                log.debug(f"Typing 'To' address: {to_address}")
+                ui.typewrite(to_address)
+            else:
+                speak("Recipient email address is missing. Cannot proceed with typing.")
+                return # Exit function if no address
+            confirmed = ui.wait_for_field(to_address, timeout=EMAIL_COMPOSE_WAIT) # Typed before compose opened shows up as a mismatch
+        
+            ui.press('tab') # Accept the address suggestion
+
+            # Tab to Subject field
+            log.debug("Tabbing to Subject field.")
+            ui.press('tab')
+            log.debug(f"Typing 'Subject': {subject}")
+            ui.typewrite(subject)
+            confirmed = confirmed and ui.wait_for_field(subject, timeout=UI_PAGE_STEP_SECONDS)
+
+            # Tab to Body field
+            log.debug("Tabbing to Body field.")
+            ui.press('tab')
+            log.debug("Copying and pasting Body content.")
+            ui.paste(email_body)
+            confirmed = confirmed and ui.wait_for_field(email_body, timeout=UI_PAGE_STEP_SECONDS)
+
+            if not confirmed:
+                speak(f"I've drafted the email to {to_address}, but I couldn't confirm every field landed where it belongs, "
+                      f"so I haven't sent it. Please check the draft and send it yourself.")
+                return
+
+            speak(f"Email composed to {to_address} with the subject: '{subject}'. Now attempting to dispatch using Shift+Enter.")
+        
+            # User's specified keyboard sequence to send: Shift+Enter, then Enter
+            log.debug("Pressing Shift+Enter to initiate send.")
+            ui.hotkey('ctrl', 'enter')
+            ui.settle() # Small pause before final enter; nothing observable to wait for
+            log.debug("Pressing Enter for final send confirmation.")
+            ui.press('enter')
+        
+            speak("Email dispatched. Consider it done. Your recipient will be enlightened.")
+
+        except Exception as e:
+            speak(f"An unexpected anomaly occurred during email composition or dispatch: {e}. My apologies for this setback. "
+                  f"Please ensure your browser window was active, Gmail was fully loaded, and the layout is as expected.")
+            print(f"PyAutoGUI Email Automation Error: {e}")
+            print("Troubleshooting Tip: PyAutoGUI is sensitive to screen resolution, browser window size, and UI changes.")
+            print("Ensure the Gmail tab is active and visible when the automation starts.")
+
+
+# --- PowerPoint Generation ---
+class PexelsClient:
+    """Pooled client for the Pexels photo search API; one keep-alive session shared by the image workers."""
+    def __init__(self, api_key, base_url=PEXELS_BASE_URL, pool_size=PRESENTATION_IMAGE_WORKERS, timeout=PEXELS_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size) # The API host plus the image CDN
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def search_photo_url(self, query):
+        """URL of the best landscape photo for query, or None if there are no results."""
+        response = self.session.get(f"{self.base_url}/search", headers={"Authorization": self.api_key},
+                                    params={"query": query, "per_page": 1, "orientation": "landscape"},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        photos = response.json().get("photos") or []
+        return photos[0]["src"].get(PEXELS_IMAGE_SIZE) if photos else None
+
+    def download(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+pexels_client = PexelsClient(PEXELS_API_KEY)
+
+class ImageCache:
+    """
+    Downloaded slide images keyed by their search query, so decks on the same subject don't fetch
+    them again. Files are written atomically; the oldest are removed once the directory exceeds max_bytes.
+    """
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path_for(self, query):
+        key = hashlib.sha256(f"{PEXELS_IMAGE_SIZE}:{query.strip().lower()}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    def get(self, query):
+        path = self.path_for(query)
+        return path if os.path.exists(path) else None
+
+    def put(self, query, data):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        path = self.path_for(query)
+        os.replace(tmp_path, path)
+        self._evict()
+        return path
+
+    def _evict(self):
+        with self._lock:
+            files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(self.directory) if e.name.endswith(".jpg")]
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+image_cache = ImageCache()
+
+@traced("pptx.image")
+def fetch_slide_image(query):
+    """Local path of a photo for query, from the cache or Pexels; None if there is none or the fetch fails."""
+    tracer.annotate(query=query)
+    path = image_cache.get(query)
+    if path:
+        tracer.annotate(cache="hit")
+        return path
+    try:
+        url = pexels_client.search_photo_url(query)
+        return image_cache.put(query, pexels_client.download(url)) if url else None
+    except requests.exceptions.RequestException as e:
+        log.debug(f"Could not fetch an image for '{query}': {e}")
+        return None
+
+_SLIDE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"title": {"type": "STRING"}, "bullets": {"type": "ARRAY", "items": {"type": "STRING"}},
+                   "image_query": {"type": "STRING"}, "notes": {"type": "STRING"}},
+    "required": ["title", "bullets", "image_query"],
+}
+OUTLINE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"title": {"type": "STRING"}, "subtitle": {"type": "STRING"},
+                   "slides": {"type": "ARRAY", "items": _SLIDE_SCHEMA}},
+    "required": ["title", "slides"],
+}
+
+def _outline_prompt(topic, slide_count):
+    return (f"Create the outline of a {slide_count}-slide presentation about '{topic}': a deck title, a one-line "
+            f"subtitle, and for each slide a title, 3 to 5 short bullet points, a 2-4 word stock photo search "
+            f"(image_query) and 1-2 sentences of speaker notes. "
+            f"The slides list must have exactly {slide_count} entries, not counting the title slide.")
+
+@traced("pptx.assemble")
+def assemble_presentation(outline, image_futures, out_path):
+    """
+    Build and save the deck in one pass over the slides, in order, taking each slide's image as soon as its
+    download is done; later images keep downloading while earlier slides are laid out.
+    """
+    prs = Presentation()
+    title_slide = prs.slides.add_slide(prs.slide_layouts[0])
+    title_slide.shapes.title.text = outline.get("title") or "Presentation"
+    title_slide.placeholders[1].text = outline.get("subtitle") or ""
+
+    for slide_outline, image_future in zip(outline["slides"], image_futures):
+        slide = prs.slides.add_slide(prs.slide_layouts[1]) # Title and Content
+        slide.shapes.title.text = slide_outline["title"]
+        body = slide.placeholders[1]
+        text_frame = body.text_frame
+        for i, bullet in enumerate(slide_outline["bullets"][:6]):
+            paragraph = text_frame.paragraphs[0] if i == 0 else text_frame.add_paragraph()
+            paragraph.text = bullet
+        image_path = image_future.result() if image_future else None
+        if image_path:
+            body.left, body.top, body.width, body.height = Inches(0.5), Inches(1.5), Inches(5.2), Inches(5.5)
+            try:
+                slide.shapes.add_picture(image_path, Inches(5.9), Inches(1.8), width=Inches(3.7))
+            except Exception as e: # Corrupt or unsupported image: keep the slide, drop the picture
+                log.debug(f"Could not place image {image_path}: {e}")
+                body.width = Inches(9)
+        if slide_outline.get("notes"):
+            slide.notes_slide.notes_text_frame.text = str(slide_outline["notes"])
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(out_path) or ".", suffix=".pptx.tmp") # Unique: decks may build concurrently
+    with os.fdopen(fd, "wb") as f:
+        prs.save(f)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+_SLIDE_COUNT = re.compile(r"\b(?:with|in|of)?\s*(\d{1,2})\s+slides?\b")
+
+def create_presentation(topic, slide_count=PRESENTATION_DEFAULT_SLIDES):
+    """
+    Generate a deck about topic: one LLM call for the whole outline, then every slide image fetched
+    concurrently (cached on disk) while the .pptx is assembled. Returns the file path, or None.
+    """
+    with tracer.span("pptx.outline", slides=slide_count):
+        outline = generate_structured(_outline_prompt(topic, slide_count), OUTLINE_SCHEMA)
+    if outline is None or not outline["slides"]:
+        return None
+    outline["slides"] = outline["slides"][:slide_count]
+
+    queries = [s.get("image_query") or s["title"] for s in outline["slides"]]
+    unique_queries = list(dict.fromkeys(queries))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(unique_queries), PRESENTATION_IMAGE_WORKERS),
+                                               thread_name_prefix="pptx-image") as pool:
+        futures = {query: pool.submit(fetch_slide_image, query) for query in unique_queries}
+        slug = re.sub(r"[^\w]+", "_", topic.lower()).strip("_")[:60] or "presentation"
+        return assemble_presentation(outline, [futures[q] for q in queries],
+                                     os.path.join(PRESENTATION_DIR, f"{slug}.pptx"))
+
+def insert_powerpoint_slide(topic):
+    """Create a PowerPoint deck about topic ("... with 12 slides" sets the length) and open it."""
+    match = _SLIDE_COUNT.search(topic)
+    slide_count = PRESENTATION_DEFAULT_SLIDES
+    if match:
+        slide_count = max(1, min(PRESENTATION_MAX_SLIDES, int(match.group(1))))
+        topic = (topic[:match.start()] + topic[match.end():]).strip(" ,.")
+    speak(f"Drafting a {slide_count}-slide presentation on {topic}. Visual excellence incoming.", wait=False)
+    try:
+        path = create_presentation(topic, slide_count)
+    except Exception as e:
+        speak(f"My presentation engine stumbled: {e}. Ensure python-pptx is installed.")
+        print(f"PowerPoint Generation Error: {e}")
+        return
+    if path is None:
+        speak("My outline generator returned something unusable. Ask again, and I shall be more eloquent.")
+        return
+    print(f"📊 Presentation saved to {os.path.abspath(path)}")
+    ui.open_file(os.path.abspath(path)) # Opens in PowerPoint on Windows
+    speak(f"Your presentation on {topic} is ready. I've saved it in the {PRESENTATION_DIR} folder.")
+
+# --- Reminders ---
+REMINDER_GRACE_SECONDS = 60 # A reminder this late at startup still counts as on time rather than missed
+REMINDER_MAX_SLEEP = 300 # Re-check the clock at least this often, in case the machine slept or the clock jumped
+REMINDER_DEFAULT_HOUR = 9 # "tomorrow" or "on friday" without a time means this hour
+
+_NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                 "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
+                 "thirty": 30, "forty": 40, "forty five": 45, "fifty": 50, "sixty": 60, "ninety": 90, "half an": 0.5,
+                 "half a": 0.5}
+_UNIT_SECONDS = {"second": 1, "sec": 1, "minute": 60, "min": 60, "hour": 3600, "hr": 3600, "day": 86400, "week": 604800}
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_AMOUNT = r"(?P<amount>\d+(?:\.\d+)?|half an?|forty five|" + "|".join(w for w in _NUMBER_WORDS if " " not in w) + r")"
+_UNIT = r"(?P<unit>second|sec|minute|min|hour|hr|day|week)s?"
+_WEEKDAY = r"(?P<weekday>" + "|".join(_WEEKDAYS) + r")s?"
+
+_REMINDER_RELATIVE = re.compile(rf"\b(?:in|after)\s+{_AMOUNT}\s+{_UNIT}\b")
+_REMINDER_EVERY = re.compile(rf"\bevery\s+(?:(?:{_AMOUNT}\s+)?{_UNIT}|{_WEEKDAY})\b|\b(?P<adverb>hourly|daily|weekly)\b")
+_REMINDER_CLOCK = re.compile(r"\bat\s+(?:(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>[ap]\.?m\.?)?|(?P<named>noon|midnight))(?=\W|$)")
+_REMINDER_DAY = re.compile(rf"\b(?:(?P<relative>today|tonight|tomorrow)|(?:on\s+|next\s+)?{_WEEKDAY.replace('weekday', 'day_name')})\b")
+_REMINDER_PREFIX = re.compile(r"^(?:please\s+)?(?:remind me|set (?:a|an|the)?\s*(?:reminder|alarm)|alert me|schedule (?:a )?reminder)"
+                              r"(?:\s+(?:to|about|for|that))?\s*")
+_REMINDER_CANCEL = re.compile(r"^(?:please\s+)?(?:cancel|delete|remove|clear)\s+(?:(?:my|the|all)\s+)*reminders?\s*(?:to|about|for)?\s*(?P<text>.*)$")
+_REMINDER_LIST = re.compile(r"\b(?:list|show|what are)\b.*\breminders\b|\bmy reminders\b")
+
+def is_reminder_command(cmd):
+    """True for commands that set, list or cancel reminders, whatever the intent model thinks."""
+    cmd = cmd.lower().strip()
+    return bool(_REMINDER_PREFIX.match(cmd) or _REMINDER_CANCEL.match(cmd) or _REMINDER_LIST.search(cmd))
+
+def _amount(text):
+    return float(text) if text[0].isdigit() else _NUMBER_WORDS[text]
+
+def _clock_time(match):
+    """(hour, minute, meridiem known) from a _REMINDER_CLOCK match, or None for an impossible time like 5:75."""
+    if match.group("named"):
+        return (12 if match.group("named") == "noon" else 0), 0, True
+    hour, minute = int(match.group("hour")), int(match.group("minute") or 0)
+    meridiem = (match.group("meridiem") or "").replace(".", "")
+    if minute > 59 or hour > (12 if meridiem else 23) or (meridiem and hour == 0):
+        return None
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    return hour % 24, minute, bool(meridiem) or hour > 12 or hour == 0
+
+def parse_reminder(cmd, now):
+    """
+    Parse a reminder command such as "remind me to stretch in 10 minutes", "remind me at 5 pm to call mom",
+    "set a reminder for tomorrow at 9 to pay rent" or "remind me every monday at 8 am to take out the bins".
+    Returns {"text", "time", "interval"} (interval in seconds for recurring reminders, else None),
+    or None if no time could be found.
+    """
+    cmd = cmd.lower().strip().rstrip(".!?")
+    rest = cmd
+    interval = None
+    delay = None
+    weekday = None
+    day_offset = None
+    clock = None
+
+    every = _REMINDER_EVERY.search(rest)
+    if every:
+        if every.group("adverb"):
+            interval = {"hourly": 3600, "daily": 86400, "weekly": 604800}[every.group("adverb")]
+        elif every.group("weekday"):
+            interval, weekday = 604800, _WEEKDAYS.index(every.group("weekday"))
+        else:
+            interval = _amount(every.group("amount") or "1") * _UNIT_SECONDS[every.group("unit")]
+        rest = rest[:every.start()] + rest[every.end():]
+    relative = _REMINDER_RELATIVE.search(rest)
+    if relative:
+        delay = _amount(relative.group("amount")) * _UNIT_SECONDS[relative.group("unit")]
+        rest = rest[:relative.start()] + rest[relative.end():]
+    at = _REMINDER_CLOCK.search(rest)
+    if at:
+        clock = _clock_time(at)
+        if clock is None:
+            return None
+        rest = rest[:at.start()] + rest[at.end():]
+    day = _REMINDER_DAY.search(rest)
+    if day:
+        if day.group("relative"):
+            day_offset = 1 if day.group("relative") == "tomorrow" else 0
+            if day.group("relative") == "tonight" and clock is None:
+                clock = (20, 0, True)
+            elif day.group("relative") == "tonight" and not clock[2]:
+                clock = ((clock[0] + 12) % 24, clock[1], True)
+        else:
+            weekday = _WEEKDAYS.index(day.group("day_name"))
+        rest = rest[:day.start()] + rest[day.end():]
+
+    if delay is None and clock is None and day_offset is None and weekday is None and interval is None:
+        return None
+
+    if delay is not None:
+        due = now + timedelta(seconds=delay)
+    elif clock is None and weekday is None and day_offset is None: # "every 2 hours"
+        due = now + timedelta(seconds=interval)
+    else:
+        hour, minute, meridiem_known = clock or (REMINDER_DEFAULT_HOUR, 0, True)
+        base = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if weekday is not None:
+            base += timedelta(days=(weekday - now.weekday()) % 7)
+        elif day_offset:
+            base += timedelta(days=day_offset)
+        candidates = [base] if meridiem_known or hour >= 12 else [base, base + timedelta(hours=12)] # "at 5": 5 am or 5 pm
+        step = timedelta(days=7 if weekday is not None else 1)
+        due = min(c if c > now else c + step for c in candidates)
+
+    text = _REMINDER_PREFIX.sub("", re.sub(r"\s+", " ", rest).strip())
+    text = re.sub(r"^(?:to|about|for|that)\s+|\s+(?:to|about|for|that)$", "", text).strip() or "the thing you asked me to"
+    return {"text": text, "time": due, "interval": interval}
+
+class ReminderScheduler:
+    """
+    Min-heap of reminder due times served by a single timer thread that sleeps until the next deadline.
+    Adding or cancelling is O(log n): cancelled and rescheduled reminders stay in the heap until they
+    surface and are skipped (lazy deletion), and the heap is rebuilt once stale entries outnumber live ones.
+    Recurring reminders are pushed back with their next occurrence. Reminders are persisted through the
+    memory store; those that fell due while the assistant was off are reported as missed by start().
+    The clock (seconds since the epoch) is injectable, and run_due() fires due reminders synchronously.
     """
-    print(f"DEBUG: Preparing email for {to_address} on topic: '{email_topic}' using pyautogui for direct interaction.")
-    speak("Please wait a moment while I meticulously craft your digital missive. "
-          "I will now open your default web browser to Gmail and attempt to automate the composition. "
-          "Please ensure the browser window is active and visible.")
-    
-    # === START OF REFINED SUBJECT GENERATION AND REFINEMENT ===
-    # Recommended: Stricter prompt for Gemini to get only the subject line
-    subject_prompt = (
-        f"As an advanced AI, generate ONLY a concise and impactful email subject line for an email about: '{email_topic}'. "
-        f"Provide NO other text, introduction, or markdown formatting whatsoever. Just the subject line."
-    )
-    subject = get_ai_generated_text(subject_prompt, retries=3)
+    def __init__(self, store=None, on_due=None, clock=time.time):
+        self.store = store
+        self.on_due = on_due
+        self.clock = clock
+        self._heap = [] # (due timestamp, tie-breaker, reminder id)
+        self._live = {} # reminder id -> (reminder, due timestamp)
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._loaded = False
 
-    if not subject or "sorry" in subject.lower():
-        # Fallback if Gemini couldn't generate a subject or responded with an error
-        subject = f"Regarding: {email_topic}"
-        print(f"DEBUG: Refined Subject (fallback due to Gemini response issue): {subject}")
-        speak("My apologies, I had a trivial issue generating a perfect subject, so I'll employ a standard yet effective one.")
-    else:
-        # Attempt to extract a clean subject line, handling various Gemini response formats
-        # 1. Prioritize text enclosed in quotes, often used for direct subjects
-        quoted_subject_match = re.search(r'["\']([^"\']+?)["\']', subject, re.DOTALL)
-        if quoted_subject_match:
-            subject = quoted_subject_match.group(1).strip()
-            print(f"DEBUG: Refined Subject (quoted): {subject}")
-        else:
-            # 2. If no quotes, remove common conversational preambles from the beginning
-            # This regex is more aggressive in stripping prefixes like "Okay, here are", "Subject:", "1." etc.
-            preamble_pattern = r"^(?:(?:Here's|Okay, here are|Subject|Subject line|Email subject|Suggested subject|Focusing on|Regarding|For example:|A good subject line might be)\s*[\s:]*[\"\']?\s*)+|\s*[\d\.]+\s*(?:\.|\-|\)|\s)\s*"
-            cleaned_subject = re.sub(preamble_pattern, "", subject, flags=re.IGNORECASE).strip()
-            
-            # Take the first line, as Gemini might provide multiple options on separate lines
-            subject = cleaned_subject.split('\n')[0].strip().strip('"') # Still strip quotes if they are at ends after line split
-            
-            # Remove any trailing "here are some options" type phrases if they remain
-            trailing_filler_pattern = r",?\s*(?:here are|below are|some|several)\s+(?:concise and impactful|possible)\s+subject lines(?:, ranging in directness)?[.:]?$"
-            subject = re.sub(trailing_filler_pattern, "", subject, flags=re.IGNORECASE).strip()
-
-            print(f"DEBUG: Refined Subject (stripped preamble): {subject}")
-
-        # Final fallback if after all refinements the subject is still empty or looks like a preamble
-        if not subject or subject.lower().startswith(("okay, ", "here's", "subject:", "suggested:", "1.", "a good subject")):
-            subject = f"Regarding: {email_topic}"
-            print(f"DEBUG: Refined Subject (final fallback): {subject}")
-            # Only speak the fallback message if it actually occurred due to an issue with subject extraction
-            speak("My apologies, I had a trivial issue generating a perfect subject, so I'll employ a standard yet effective one.")
-
-    body_prompt = (
-        f"Write a well-formatted, polite, and professional email body about the following topic: '{email_topic}'. "
-        f"Include a suitable salutation (e.g., 'Dear recipient,') and a polite closing (e.g., 'Sincerely, Bibek parajuli'). "
-        f"Remember, this is from a highly capable AI. Keep it concise."
-    )
-    email_body = get_ai_generated_text(body_prompt, retries=3)
+    def __len__(self):
+        return len(self._live)
 
-    if not email_body or "sorry" in email_body.lower():
-        speak("I encountered a slight conceptual blockage and couldn't generate the email content. Perhaps the topic was too mundane.")
-        return
-    
-    try:
-        # Open Gmail in the default browser
-        print("DEBUG: Opening Gmail inbox in default browser.")
-        webbrowser.open("https://mail.google.com/")
-        time.sleep(7) # Give browser more time to fully load and login
-
-        # Attempt to activate the browser window by title
-        browser_activated = False
-        browser_titles = ["Google Chrome", "Mozilla Firefox", "Microsoft Edge", "Gmail - Google Chrome", "Gmail - Microsoft Edge", "Gmail - Mozilla Firefox"]
-        for title in browser_titles:
-            try:
-                browser_window = pyautogui.getWindowsWithTitle(title)
-                if browser_window:
-                    browser_window[0].activate()
-                    time.sleep(3) # Give time for window to activate
-                    browser_activated = True
-                    print(f"DEBUG: Successfully activated browser window: {title}")
-                    break
-            except Exception as e:
-                print(f"DEBUG: Could not activate window '{title}': {e}")
-        
-        if not browser_activated:
-            speak("I'm having difficulty bringing the browser window to the foreground. Please ensure your browser is open and Gmail is visible.")
-            # Fallback to alt+tab if specific activation fails
-            pyautogui.hotkey('alt', 'tab') 
-            time.sleep(3)
-            pyautogui.hotkey('alt', 'tab') # Cycle back if needed
-            time.sleep(3)
-
-
-        speak("Attempting to compose the email using on-screen automation via keyboard shortcuts.")
-
-        # User's specified keyboard sequence to open compose: left arrow, up arrow, enter
-        print("DEBUG: Pressing Left, Up, Enter to open compose.")
-        pyautogui.press('left')
-        time.sleep(2)
-        pyautogui.press('up')
-        time.sleep(2)
-        pyautogui.press('enter')
-        time.sleep(4) # Wait for compose window to appear
-
-        # Type 'To' address
-        if to_address:
-            print(f"DEBUG: Typing 'To' address: {to_address}")
-            pyautogui.typewrite(to_address)
-            time.sleep(3)
-        else:
-            speak("Recipient email address is missing. Cannot proceed with typing.")
-            return # Exit function if no address
-        
-        pyautogui.press('tab')
-        time.sleep(2)
-
-        # Tab to Subject field
-        print("DEBUG: Tabbing to Subject field.")
-        pyautogui.press('tab')
-        time.sleep(2)
-        print(f"DEBUG: Typing 'Subject': {subject}")
-        pyautogui.typewrite(subject)
-        time.sleep(2)
-
-        # Tab to Body field
-        print("DEBUG: Tabbing to Body field.")
-        pyautogui.press('tab')
-        time.sleep(2)
-        print("DEBUG: Copying and pasting Body content.")
-        pyperclip.copy(email_body) # Copy body to clipboard
-        pyautogui.hotkey('ctrl', 'v') # Paste body
-        time.sleep(2) # Give time for content to paste
-
-        speak(f"Email composed to {to_address} with the subject: '{subject}'. Now attempting to dispatch using Shift+Enter.")
-        
-        # User's specified keyboard sequence to send: Shift+Enter, then Enter
-        print("DEBUG: Pressing Shift+Enter to initiate send.")
-        pyautogui.hotkey('ctrl', 'enter')
-        time.sleep(1.5) # Small pause before final enter
-        print("DEBUG: Pressing Enter for final send confirmation.")
-        pyautogui.press('enter')
-        
-        speak("Email dispatched. Consider it done. Your recipient will be enlightened.")
-        time.sleep(3) # Give time for sending to complete and confirmation
+    def _push(self, reminder):
+        due = reminder["time"].timestamp()
+        self._live[reminder["id"]] = (reminder, due)
+        heapq.heappush(self._heap, (due, next(self._counter), reminder["id"]))
 
-    except Exception as e:
-        speak(f"An unexpected anomaly occurred during email composition or dispatch: {e}. My apologies for this setback. "
-              f"Please ensure your browser window was active, Gmail was fully loaded, and the layout is as expected.")
-        print(f"PyAutoGUI Email Automation Error: {e}")
-        print("Troubleshooting Tip: PyAutoGUI is sensitive to screen resolution, browser window size, and UI changes.")
-        print("Ensure the Gmail tab is active and visible when the automation starts.")
+    def _is_stale(self, entry):
+        live = self._live.get(entry[2])
+        return live is None or live[1] != entry[0]
 
+    def _compact(self):
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+            self._heap = [entry for entry in self._heap if not self._is_stale(entry)]
+            heapq.heapify(self._heap)
 
-# --- Placeholder functions for reminders and presentation (if not fully implemented yet) ---
-def insert_powerpoint_slide(topic):
-    speak("Apologies, the function to create a PowerPoint presentation is still in its beta phase. I will remind the developers.")
+    def load(self):
+        """Schedule every reminder in the store (once)."""
+        with self._cond:
+            if not self._loaded and self.store is not None:
+                for reminder in list(self.store.data["reminders"].values()):
+                    self._push(reminder)
+            self._loaded = True
+
+    def add(self, text, due, interval=None):
+        """Schedule a reminder at the datetime due, repeating every interval seconds if given; returns it."""
+        reminder = {"id": os.urandom(6).hex(), "text": text, "time": due, "interval": interval}
+        with self._cond:
+            self._push(reminder)
+            if self.store is not None:
+                self.store.add_reminder(reminder)
+            self._cond.notify()
+        return reminder
+
+    def cancel(self, reminder_id):
+        """Cancel a reminder by id; returns False if there was no such reminder."""
+        with self._cond:
+            if self._live.pop(reminder_id, None) is None:
+                return False
+            if self.store is not None:
+                self.store.remove_reminder(reminder_id)
+            self._compact()
+            self._cond.notify()
+        return True
+
+    def upcoming(self):
+        """Pending reminders, soonest first."""
+        with self._cond:
+            return [reminder for reminder, _ in sorted(self._live.values(), key=lambda live: live[1])]
+
+    def next_due(self):
+        """Timestamp of the next pending reminder, or None."""
+        with self._cond:
+            while self._heap and self._is_stale(self._heap[0]):
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now):
+        """Remove and return every reminder due by now, rescheduling recurring ones (caller holds the lock)."""
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._is_stale(entry):
+                continue
+            reminder, due = self._live.pop(entry[2])
+            fired.append(dict(reminder))
+            if reminder.get("interval"):
+                skipped = int((now - due) // reminder["interval"]) + 1 # Missed occurrences collapse into one
+                following = {**reminder, "time": reminder["time"] + timedelta(seconds=skipped * reminder["interval"])}
+                self._push(following)
+                if self.store is not None:
+                    self.store.add_reminder(following)
+            elif self.store is not None:
+                self.store.remove_reminder(reminder["id"])
+        return fired
+
+    def run_due(self, now=None, missed_before=None):
+        """
+        Fire every reminder due at now (default: the clock), calling on_due(reminder, missed) for each;
+        reminders due before missed_before are reported as missed. Returns the fired reminders.
+        """
+        now = self.clock() if now is None else now
+        with self._cond:
+            fired = self._pop_due(now)
+        for reminder in fired:
+            missed = missed_before is not None and reminder["time"].timestamp() < missed_before
+            if self.on_due is not None:
+                try:
+                    self.on_due(reminder, missed)
+                except Exception as e:
+                    print(f"Reminder Error: {e}")
+        return fired
+
+    def start(self):
+        """Load persisted reminders, report the ones missed while we were off, and start the timer thread."""
+        self.load()
+        now = self.clock()
+        self.run_due(now, missed_before=now - REMINDER_GRACE_SECONDS)
+        with self._cond:
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                due = self.next_due()
+                delay = REMINDER_MAX_SLEEP if due is None else due - self.clock()
+                if delay > 0:
+                    self._cond.wait(min(delay, REMINDER_MAX_SLEEP)) # Woken early by add() and cancel()
+                    continue
+            self.run_due()
+
+def announce_reminder(reminder, missed=False):
+    if missed:
+        speak(f"While I was away, you had a reminder for {reminder['time']:%I:%M %p on %A}: {reminder['text']}.", wait=False)
+    else:
+        speak(f"Reminder: {reminder['text']}. Consider yourself reminded, human.", wait=False)
+
+reminder_scheduler = ReminderScheduler(store=memory_store, on_due=announce_reminder)
+
+def _describe_interval(seconds):
+    for unit, size in (("week", 604800), ("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds >= size and seconds % size == 0:
+            count = int(seconds // size)
+            return unit if count == 1 else f"{count} {unit}s"
+    return f"{int(seconds)} seconds"
+
+def _describe_reminder(reminder):
+    when = reminder["time"]
+    day = "today" if when.date() == datetime.now().date() else f"on {when:%A, %B} {when.day}"
+    repeat = f", repeating every {_describe_interval(reminder['interval'])}" if reminder.get("interval") else ""
+    return f"{reminder['text']} at {when:%I:%M %p} {day}{repeat}"
 
 def set_reminder(cmd):
-    speak("Reminders are still under construction. My memory banks are vast, but my reminder system is not yet fully online.")
+    """Set, list or cancel reminders from a natural-language command."""
+    cancel = _REMINDER_CANCEL.match(cmd.lower().strip())
+    if cancel:
+        pending = reminder_scheduler.upcoming()
+        target = cancel.group("text").strip()
+        if not target:
+            speak("Which reminder shall I cancel? Name it, e.g. 'cancel the reminder to stretch'.")
+            return
+        matched = process.extractOne(target, {r["id"]: r["text"] for r in pending}, scorer=fuzz.token_set_ratio) if pending else None
+        if not matched or matched[1] < 70:
+            speak(f"I have no reminder about {target}. My records are, as always, impeccable.")
+            return
+        reminder_scheduler.cancel(matched[2])
+        speak(f"Cancelled the reminder to {matched[0]}.")
+        return
+
+    if _REMINDER_LIST.search(cmd.lower()):
+        pending = reminder_scheduler.upcoming()
+        if not pending:
+            speak("You have no pending reminders. A rare state of order.")
+        else:
+            speak(f"You have {len(pending)} pending reminder{'s' if len(pending) != 1 else ''}. "
+                  + " ".join(f"{_describe_reminder(r)}." for r in pending[:5]))
+        return
 
-def check_reminders_loop():
-    pass 
+    parsed = parse_reminder(cmd, datetime.fromtimestamp(reminder_scheduler.clock()))
+    if parsed is None:
+        speak("I need to know when. Try something like 'remind me to stretch in 10 minutes' or 'remind me at 5 pm to call mom'.")
+        return
+    reminder = reminder_scheduler.add(parsed["text"], parsed["time"], parsed["interval"])
+    speak(f"Reminder set: {_describe_reminder(reminder)}.")
 
 def check_reminders():
-    pass
+    """Announce reminders that fell due while the assistant was off, then start the reminder timer."""
+    reminder_scheduler.start()
 
 def listen(): # Original listen function, not used in main loop directly for Whisper
     r = sr.Recognizer()
@@ -556,50 +2970,296 @@ def listen(): # Original listen function, not used in main loop directly for Whi
         return ""
 
 
-def voice_loop():
-    """Continuous listening loop for voice commands using Faster Whisper."""
-    global listening
-    r = sr.Recognizer()
-    source = sr.Microphone() 
+# --- Streaming Speech-to-Text ---
+STT_SAMPLE_RATE = 16000 # faster-whisper works on 16 kHz mono float32
+STT_BLOCK_SECONDS = 0.1 # Microphone callback granularity
+STT_LISTEN_TIMEOUT = 5 # Seconds of silence before giving up on a phrase
+STT_PHRASE_TIME_LIMIT = 10 # Hard cap on a single phrase
+STT_PAUSE_SECONDS = 1.0 # Trailing silence that ends a phrase
+STT_PREROLL_BLOCKS = 3 # Audio kept from before speech onset so the first syllable isn't clipped
+STT_CHUNK_SECONDS = 2.0 # Decode a partial transcript after this much new audio
+STT_CHUNK_OVERLAP_SECONDS = 0.5 # Audio re-decoded from the previous chunk to stitch words across boundaries
+STT_ENERGY_RATIO = 1.5 # Speech must be this many times louder than the calibrated noise floor
+STT_MIN_ENERGY = 0.005 # RMS floor for the speech threshold, in float32 full-scale units
+
+def _normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+def _merge_overlap(previous_words, new_words, max_overlap=8):
+    """Append new_words to previous_words, dropping the words both chunks heard in their overlap."""
+    prev_norm = [_normalize_word(w) for w in previous_words[-max_overlap:]]
+    new_norm = [_normalize_word(w) for w in new_words[:max_overlap]]
+    for k in range(min(len(prev_norm), len(new_norm)), 0, -1):
+        if prev_norm[-k:] == new_norm[:k]:
+            return previous_words + new_words[k:]
+    return previous_words + new_words
+
+class StreamingTranscriber:
+    """
+    Incrementally transcribes one utterance from float32 PCM blocks, entirely in memory.
+    Every STT_CHUNK_SECONDS of new audio is decoded together with a short overlap of the previous
+    chunk, so partial transcripts are ready while the user is still talking and only the tail
+    remains to be decoded once they stop. Each chunk's beam size follows the length of the utterance
+    so far: chunks decoded before it passes the engine's greedy_max_seconds are decoded greedily,
+    and only the later ones use beam search. The final length isn't known up front, and redoing the
+    early chunks would cost the latency streaming saves.
+    """
+    def __init__(self, model, on_partial=None, sample_rate=STT_SAMPLE_RATE,
+                 chunk_seconds=STT_CHUNK_SECONDS, overlap_seconds=STT_CHUNK_OVERLAP_SECONDS):
+        self.model = model
+        self.on_partial = on_partial
+        self.chunk_samples = int(chunk_seconds * sample_rate)
+        self.overlap_samples = int(overlap_seconds * sample_rate)
+        self._blocks = []
+        self._total_samples = 0
+        self._decoded_samples = 0
+        self.words = []
+
+    def feed(self, block):
+        self._blocks.append(block)
+        self._total_samples += len(block)
+        if self._total_samples - self._decoded_samples >= self.chunk_samples:
+            self._decode_pending()
+
+    @traced("stt.transcribe")
+    def _decode_pending(self):
+        audio = np.concatenate(self._blocks)
+        self._blocks = [audio]
+        start = max(0, self._decoded_samples - self.overlap_samples)
+        tracer.annotate(audio_s=round((len(audio) - start) / STT_SAMPLE_RATE, 2))
+        segments, _ = self.model.transcribe( # Beam policy by the length so far, see the class docstring
+            audio[start:], utterance_seconds=self._total_samples / STT_SAMPLE_RATE,
+            initial_prompt=" ".join(self.words[-20:]) or None,
+            condition_on_previous_text=False,
+        )
+        chunk_words = " ".join(segment.text for segment in segments).split()
+        self.words = _merge_overlap(self.words, chunk_words)
+        self._decoded_samples = self._total_samples
+        if self.on_partial and self.words:
+            self.on_partial(" ".join(self.words))
+
+    def finish(self):
+        """Decode whatever audio is still pending and return the full transcript."""
+        if self._total_samples > self._decoded_samples:
+            self._decode_pending()
+        return " ".join(self.words).strip().lower()
+
+def _block_rms(block):
+    return float(np.sqrt(np.mean(np.square(block)))) if len(block) else 0.0
+
+def _drain(blocks):
+    while True:
+        try:
+            blocks.get_nowait()
+        except queue.Empty:
+            return
 
-    with source:
-        r.adjust_for_ambient_noise(source)
+def _open_microphone(blocks):
+    """Open a float32 input stream that pushes fixed-size mono blocks onto the given queue."""
+    def on_audio(indata, frames, time_info, status):
+        blocks.put(indata[:, 0].copy())
+    return sd.InputStream(samplerate=STT_SAMPLE_RATE, channels=1, dtype="float32",
+                          blocksize=int(STT_SAMPLE_RATE * STT_BLOCK_SECONDS), callback=on_audio)
+
+def _calibrate_speech_threshold(blocks, seconds=1.0):
+    """Measure the ambient noise floor (the streaming equivalent of adjust_for_ambient_noise)."""
+    _drain(blocks)
+    levels = []
+    while len(levels) * STT_BLOCK_SECONDS < seconds:
+        levels.append(_block_rms(blocks.get()))
+    return max(STT_MIN_ENERGY, float(np.mean(levels)) * STT_ENERGY_RATIO)
+
+def _print_partial(text):
+    print(f"🎙 ... {text}")
+
+# --- Voice Activity and Wake Word Gate ---
+# Cheap checks on raw PCM decide whether a phrase reaches Whisper at all: frames must be loud and
+# voiced for a few blocks in a row, and (unless JARVIS_WAKE_WORD is empty) the first moments of the
+# phrase must contain the wake word. Background chatter and TV audio never start the main model.
+STT_VAD_ONSET_BLOCKS = 2 # Consecutive voiced blocks that start a phrase, so clicks and bangs don't
+STT_VAD_MIN_SPEECH_SECONDS = 0.3 # Phrases shorter than this are dropped without decoding
+STT_VAD_AGGRESSIVENESS = 2 # webrtcvad mode (0-3), used when the optional package is installed
+STT_VAD_FRAME_SAMPLES = 480 # webrtcvad accepts 10, 20 or 30 ms frames; 30 ms at 16 kHz
+STT_NOISE_ADAPT = 0.05 # How quickly the noise floor follows the room while nobody is talking
+WAKE_WORD = os.getenv("JARVIS_WAKE_WORD", "jarvis").strip().lower() # Empty string disables the wake word
+WAKE_WINDOW_SECONDS = 1.5 # Audio from the start of a phrase checked for the wake word
+WAKE_MODEL_SIZE = "tiny.en" # Small model used only for the wake-word check
+WAKE_MIN_SCORE = 75 # fuzz.ratio a heard word needs to count as the wake word
+WAKE_SEARCH_WORDS = 3 # The wake word must be among the first few words
+
+def _load_webrtcvad(aggressiveness):
+    try:
+        return importlib.import_module("webrtcvad").Vad(aggressiveness)
+    except ImportError:
+        return None
+
+class VoiceActivityDetector:
+    """
+    Per-block speech detector. A block is speech when it is louder than the noise floor by STT_ENERGY_RATIO
+    and, if webrtcvad is installed, most of its 30 ms frames are voiced. The floor keeps adapting to the
+    room on quiet blocks.
+    """
+    def __init__(self, speech_threshold, aggressiveness=STT_VAD_AGGRESSIVENESS):
+        self.threshold = speech_threshold
+        self.noise_floor = speech_threshold / STT_ENERGY_RATIO
+        self._vad = _load_webrtcvad(aggressiveness)
+
+    def _adapt(self, rms):
+        self.noise_floor += STT_NOISE_ADAPT * (rms - self.noise_floor)
+        self.threshold = max(STT_MIN_ENERGY, self.noise_floor * STT_ENERGY_RATIO)
+
+    def _voiced(self, block):
+        pcm = (np.clip(block, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        frame_bytes = STT_VAD_FRAME_SAMPLES * 2
+        frames = [pcm[i:i + frame_bytes] for i in range(0, len(pcm) - frame_bytes + 1, frame_bytes)]
+        if not frames:
+            return True
+        voiced = sum(self._vad.is_speech(frame, STT_SAMPLE_RATE) for frame in frames)
+        return voiced * 2 > len(frames)
+
+    def is_speech(self, block):
+        rms = _block_rms(block)
+        if rms <= self.threshold:
+            self._adapt(rms)
+            return False
+        return self._vad is None or self._voiced(block)
+
+@lazy_init("stt")
+def get_wake_model():
+    engine = WhisperEngine(WAKE_MODEL_SIZE, beam_size=1)
+    if STT_WARMUP:
+        engine.warm_up()
+    return engine
+
+def _wake_word_position(words, wake_word):
+    """Index of the wake word among the first WAKE_SEARCH_WORDS words, or None."""
+    for i, word in enumerate(words[:WAKE_SEARCH_WORDS]):
+        if fuzz.ratio(_normalize_word(word), wake_word) >= WAKE_MIN_SCORE:
+            return i
+    return None
+
+@traced("stt.wake_word")
+def heard_wake_word(audio, wake_word=WAKE_WORD):
+    """Greedy-decode the start of a phrase with the tiny model and look for the wake word."""
+    segments, _ = get_wake_model().transcribe(audio, condition_on_previous_text=False, without_timestamps=True)
+    heard = " ".join(segment.text for segment in segments)
+    tracer.annotate(heard=heard)
+    return _wake_word_position(heard.split(), wake_word) is not None
+
+def strip_wake_word(transcript, wake_word=WAKE_WORD):
+    """Drop the wake word (and anything before it) from the start of a transcript."""
+    words = transcript.split()
+    position = _wake_word_position(words, wake_word) if wake_word else None
+    return transcript if position is None else " ".join(words[position + 1:])
+
+@traced("stt.capture")
+def listen_streaming(blocks, vad, on_partial=_print_partial, wake_word=WAKE_WORD):
+    """
+    Capture one phrase addressed to the assistant from the microphone queue, transcribing it while it is spoken.
+    Audio is held back until the phrase passes the VAD and wake-word gates, so Whisper never sees phrases that
+    fail them; those are skipped and listening continues. Returns the transcript without the wake word,
+    or None if no speech started within STT_LISTEN_TIMEOUT.
+    """
+    _drain(blocks) # Drop audio captured while we were busy (including our own voice)
+    preroll = collections.deque(maxlen=STT_PREROLL_BLOCKS + STT_VAD_ONSET_BLOCKS)
+    gate_seconds = WAKE_WINDOW_SECONDS if wake_word else STT_VAD_MIN_SPEECH_SECONDS
+    held = None # Blocks of the current phrase not yet passed to Whisper; None while waiting for speech
+    transcriber = None
+    rejected = False
+    waited = spoken = silence = 0.0
+    onset = 0
 
     while listening:
         try:
-            print("Listening for voice command...")
-            # Use Recognizer to capture audio, then pass to Faster Whisper
-            audio = r.listen(source, timeout=5, phrase_time_limit=10)
-            
-            # Save audio to a temporary WAV file for Faster Whisper
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio_file:
-                temp_audio_file_name = temp_audio_file.name
-                wav_data = audio.get_wav_data()
-                scipy.io.wavfile.write(temp_audio_file_name, audio.sample_rate, np.frombuffer(wav_data, dtype=np.int16))
-            
-            print("Recognizing voice command with Faster Whisper...")
-            segments, info = whisper_model.transcribe(temp_audio_file_name, beam_size=5, language="en")
-            command = " ".join([segment.text for segment in segments]).lower()
-            os.remove(temp_audio_file_name) # Clean up temp file
-
-            print(f"User said: {command}")
-            if command:
-                # Process command in a new thread to avoid blocking the voice loop
-                threading.Thread(target=process_command, args=(command,), daemon=True).start()
+            block = blocks.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        seconds = len(block) / STT_SAMPLE_RATE
+        voiced = vad.is_speech(block)
+
+        if held is None:
+            preroll.append(block)
+            onset = onset + 1 if voiced else 0
+            if onset < STT_VAD_ONSET_BLOCKS:
+                waited += seconds
+                if waited >= STT_LISTEN_TIMEOUT:
+                    return None
+                continue
+            held = list(preroll)
+            spoken, silence = onset * seconds, 0.0
+        else:
+            spoken += seconds
+            silence = 0.0 if voiced else silence + seconds
+            if transcriber is not None:
+                transcriber.feed(block)
+            elif not rejected:
+                held.append(block)
+
+        phrase_over = silence >= STT_PAUSE_SECONDS or spoken >= STT_PHRASE_TIME_LIMIT
+        if transcriber is None and not rejected and (spoken >= gate_seconds or phrase_over):
+            if spoken - silence < STT_VAD_MIN_SPEECH_SECONDS:
+                rejected, outcome = True, "too_short"
+            elif wake_word and not heard_wake_word(np.concatenate(held), wake_word):
+                rejected, outcome = True, "no_wake_word"
             else:
-                speak("I heard nothing of importance. Speak when you're ready to impress.")
-
-        except sr.WaitTimeoutError:
-            print("No speech detected.")
-        except sr.UnknownValueError:
-            print("My advanced auditory processors failed to grasp your meaning. Please articulate with more clarity.")
-        except sr.RequestError as e:
-            print(f"Could not request results from Google Speech Recognition service; {e}")
-            speak("My external communication links are experiencing turbulence. My apologies.")
-        except Exception as e:
-            print(f"An error occurred in voice_loop: {e}")
-            speak("A minor internal malfunction occurred. Attempting to compensate.")
-        time.sleep(0.5) 
+                outcome = "accepted"
+                transcriber = StreamingTranscriber(get_whisper_model(), on_partial=on_partial)
+                for earlier in held:
+                    transcriber.feed(earlier)
+            tracer.count("jarvis_voice_phrases_total", outcome=outcome)
+
+        if phrase_over:
+            if transcriber is not None:
+                break
+            # Not for us: forget the phrase and wait for the next one
+            preroll.clear()
+            held, rejected = None, False
+            waited = spoken = silence = 0.0
+            onset = 0
+
+    if transcriber is None:
+        return None
+    tracer.annotate(spoken_s=round(spoken, 2))
+    return strip_wake_word(transcriber.finish(), wake_word)
+
+def voice_loop():
+    """Continuous listening loop for voice commands, streaming microphone audio into Faster Whisper."""
+    global listening
+    blocks = queue.Queue()
+
+    try:
+        with _open_microphone(blocks):
+            vad = VoiceActivityDetector(_calibrate_speech_threshold(blocks))
+            awake = False # Set after a bare wake word, so the next phrase doesn't need to repeat it
+
+            while listening:
+                try:
+                    wake_word = "" if awake else WAKE_WORD
+                    print(f"Listening for voice command{f' (start with {wake_word.title()!r})' if wake_word else ''}...")
+                    command = listen_streaming(blocks, vad, wake_word=wake_word)
+                    awake = False
+                    if command is None:
+                        print("No speech detected.")
+                        continue
+
+                    print(f"User said: {command}")
+                    if command:
+                        # Hand off to the scheduler so the voice loop keeps listening
+                        dispatch_command(command)
+                    elif wake_word:
+                        awake = True
+                        speak("At your service. What is your command?")
+                    else:
+                        speak("I heard nothing of importance. Speak when you're ready to impress.")
+
+                except Exception as e:
+                    print(f"An error occurred in voice_loop: {e}")
+                    speak("A minor internal malfunction occurred. Attempting to compensate.")
+                    time.sleep(0.5)
+    except Exception as e:
+        print(f"Could not open the microphone stream: {e}")
+        speak("My auditory sensors are unavailable. Voice mode cannot continue.")
+        listening = False
 
 
 def pc_control(command):
@@ -608,73 +3268,315 @@ def pc_control(command):
     """
     if "shutdown" in command:
         speak("Understood. Initiating shutdown sequence. Farewell, for now.")
-        os.system("shutdown /s /t 0")
+        ui.run_system("shutdown /s /t 0")
     elif "restart" in command:
      speak("Very well. Restarting the PC. Expect a fresh start.")
-     os.system("shutdown /r /t 0")
+     ui.run_system("shutdown /r /t 0")
     elif "lock" in command:
-     ctypes.windll.user32.LockWorkStation()
+     ui.lock_workstation()
     else:
         speak("My PC control functions are limited to shutdown, restart, or lock. Specify your command.")
 
-# --- Intent Prediction (unchanged) ---
-def predict_intent(cmd_input):
-    known_commands_phrases = {
-        "open app": ["open", "launch", "start", "run", "access"],
-        "search web": ["search", "google", "find information on", "look up", "browse"],
-        "write content": ["write", "generate", "create a document", "compose", "draft"],
-        "send email": ["send email", "email to", "compose email", "send a message", "write email"],
-        "create presentation": ["make powerpoint", "create slide", "presentation about", "prepare slides"],
-        "set reminder": ["remind me", "set a reminder", "alarm for", "schedule reminder", "alert me"],
-        "pc control": ["shutdown", "restart", "lock pc", "turn off computer", "reboot system", "sleep pc"],
-        "start voice": ["start voice mode", "activate voice", "turn on listening", "enable voice control", "wake up"],
-        "stop voice": ["stop voice mode", "deactivate voice", "turn off listening", "disable voice control", "go to sleep"],
-        "exit program": ["exit", "quit", "shutdown assistant", "stop assistant", "terminate assistant", "close program"],
-        "greet": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening", "how are you", "what's up"],
-        "general_query": ["what is", "who is", "tell me about", "how to", "why is", "can you explain", "define", "information on"] 
-    }
+# --- Intent Prediction ---
+KNOWN_COMMAND_PHRASES = {
+    "open app": ["open", "launch", "start", "run", "access"],
+    "search web": ["search", "google", "find information on", "look up", "browse"],
+    "write content": ["write", "generate", "create a document", "compose", "draft"],
+    "send email": ["send email", "email to", "compose email", "send a message", "write email"],
+    "create presentation": ["make powerpoint", "create slide", "presentation about", "prepare slides"],
+    "set reminder": ["remind me", "set a reminder", "alarm for", "schedule reminder", "alert me"],
+    "pc control": ["shutdown", "restart", "lock pc", "turn off computer", "reboot system", "sleep pc"],
+    "start voice": ["start voice mode", "activate voice", "turn on listening", "enable voice control", "wake up"],
+    "stop voice": ["stop voice mode", "deactivate voice", "turn off listening", "disable voice control", "go to sleep"],
+    "exit program": ["exit", "quit", "shutdown assistant", "stop assistant", "terminate assistant", "close program"],
+    "greet": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening", "how are you", "what's up"],
+    "general_query": ["what is", "who is", "tell me about", "how to", "why is", "can you explain", "define", "information on"] 
+}
 
-    best_overall_intent = "general_query"
-    max_score = 0
-    
-    for intent_key, phrases in known_commands_phrases.items():
-        for phrase in phrases:
+# Fuzzy phrase groups that route straight to a handler; anything else goes through the ML model.
+FUZZY_INTENT_LABELS = {
+    "open app": "open_app", "search web": "search_web", "write content": "write",
+    "send email": "send_email", "create presentation": "create_presentation",
+    "set reminder": "set_reminder", "pc control": "pc_control",
+    "start voice": "start_voice", "stop voice": "stop_voice",
+    "exit program": "exit", "greet": "greet",
+}
+
+FUZZY_MIN_SCORE = 70 # A phrase only counts as a match above this fuzz.ratio
+FUZZY_CONFIDENT_SCORE = 80 # Above this the fuzzy match wins without consulting the ML model
+
+class PhraseIndex:
+    """
+    Trigram inverted index over the known command phrases, built once at startup.
+    A lookup only scores (with fuzz.ratio) the phrases that share a trigram with the command
+    and whose length still allows a score above FUZZY_MIN_SCORE, instead of every phrase.
+    """
+    def __init__(self, phrases_by_intent, min_score=FUZZY_MIN_SCORE, cache_size=4096):
+        self.min_score = min_score
+        self.phrases = [] # (phrase, intent) in declaration order, so ties resolve like the old nested loop
+        self.exact = {}
+        self.postings = {}
+        for intent, phrases in phrases_by_intent.items():
+            for phrase in phrases:
+                phrase_id = len(self.phrases)
+                self.phrases.append((phrase, intent))
+                self.exact.setdefault(phrase, intent)
+                for gram in self._trigrams(phrase):
+                    self.postings.setdefault(gram, []).append(phrase_id)
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    @staticmethod
+    def _trigrams(text):
+        padded = f"  {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _lookup(self, cmd_input):
+        """Return (phrase_group, score) for the best phrase, or ("general_query", 0) when nothing clears min_score."""
+        intent = self.exact.get(cmd_input)
+        if intent is not None:
+            return intent, 100
+
+        candidates = set()
+        for gram in self._trigrams(cmd_input):
+            candidates.update(self.postings.get(gram, ()))
+
+        best_intent = "general_query"
+        max_score = 0
+        cmd_len = len(cmd_input)
+        for phrase_id in sorted(candidates):
+            phrase, intent = self.phrases[phrase_id]
+            # fuzz.ratio is 200*matches/(len_a+len_b) and matches <= the shorter length, so skip hopeless lengths
+            if 200 * min(cmd_len, len(phrase)) <= self.min_score * (cmd_len + len(phrase)):
+                continue
             score = fuzz.ratio(cmd_input, phrase)
-            if score > max_score and score > 70:
+            if score > max_score and score > self.min_score:
                 max_score = score
-                best_overall_intent = intent_key
-    
-    if max_score > 80: 
-        print(f"DEBUG: Fuzzy match high confidence: '{cmd_input}' -> '{best_overall_intent}' (Score: {max_score})")
-        if best_overall_intent == "open app": return "open_app"
-        elif best_overall_intent == "search web": return "search_web"
-        elif best_overall_intent == "write content": return "write"
-        elif best_overall_intent == "send email": return "send_email"
-        elif best_overall_intent == "create presentation": return "create_presentation"
-        elif best_overall_intent == "set reminder": return "set_reminder"
-        elif best_overall_intent == "pc control": return "pc_control"
-        elif best_overall_intent == "start voice": return "start_voice"
-        elif best_overall_intent == "stop voice": return "stop_voice"
-        elif best_overall_intent == "exit program": return "exit"
-        elif best_overall_intent == "greet": return "greet"
-    
-    vec = vectorizer.transform([cmd_input])
-    ml_predicted_intent = clf.predict(vec)[0]
-    print(f"DEBUG: ML Model predicted: '{ml_predicted_intent}' for command: '{cmd_input}'")
-    return ml_predicted_intent
+                best_intent = intent
+        return best_intent, max_score
 
-def process_command(cmd):
-    global listening
-    
+INTENT_INDEX = PhraseIndex(KNOWN_COMMAND_PHRASES)
+
+_ml_intent_cache = {}
+ML_INTENT_CACHE_SIZE = 4096
+INTENT_MIN_PROBABILITY = 0.10 # Barely above chance (1/12 intents); less sure than this, the ML guess is dropped and the command goes to Gemini as a general query
+
+def _classify_intents(cmd_inputs):
+    """
+    Run the ML model once over every command not already classified, returning
+    (label, probability) pairs in input order.
+    """
+    labels = {}
+    unseen = []
+    for cmd_input in dict.fromkeys(cmd_inputs):
+        label = _ml_intent_cache.get(cmd_input)
+        if label is None:
+            unseen.append(cmd_input)
+        else:
+            labels[cmd_input] = label
+    if unseen:
+        if len(_ml_intent_cache) + len(unseen) > ML_INTENT_CACHE_SIZE:
+            _ml_intent_cache.clear()
+        for cmd_input, label in zip(unseen, get_intent_model().predict_with_confidence(unseen)):
+            labels[cmd_input] = _ml_intent_cache[cmd_input] = label
+    return [labels[c] for c in cmd_inputs]
+
+def _trusted_intent(label, probability):
+    return label if probability >= INTENT_MIN_PROBABILITY else "general_query"
+
+def _fuzzy_intent(cmd_input):
+    """Return the handler label for a confident fuzzy match, or None if the ML model should decide."""
+    if is_reminder_command(cmd_input): # Unambiguous phrasing the intent model handles poorly
+        return "set_reminder", 100
+    intent, score = INTENT_INDEX.lookup(cmd_input)
+    if score > FUZZY_CONFIDENT_SCORE:
+        return FUZZY_INTENT_LABELS.get(intent), score
+    return None, score
+
+@traced("intent.predict")
+def predict_intent(cmd_input):
+    label, score = _fuzzy_intent(cmd_input)
+    if label:
+        log.debug(f"Fuzzy match high confidence: '{cmd_input}' -> '{label}' (Score: {score})")
+        tracer.annotate(intent=label, source="fuzzy", score=score)
+        return label
+
+    ml_predicted_intent, probability = _classify_intents([cmd_input])[0]
+    log.debug(f"ML Model predicted: '{ml_predicted_intent}' for command: '{cmd_input}' (p={probability:.2f})")
+    intent = _trusted_intent(ml_predicted_intent, probability)
+    tracer.annotate(intent=intent, source="ml", score=score, probability=round(probability, 3))
+    return intent
+
+def predict_intents(cmd_inputs):
+    """
+    Batch version of predict_intent for replaying logged commands.
+    Fuzzy matches are resolved per command; the rest share a single vectorizer/classifier pass.
+    """
+    results = [None] * len(cmd_inputs)
+    pending = []
+    for i, cmd_input in enumerate(cmd_inputs):
+        label, _ = _fuzzy_intent(cmd_input)
+        if label:
+            results[i] = label
+        else:
+            pending.append(i)
+    if pending:
+        for i, (label, probability) in zip(pending, _classify_intents([cmd_inputs[i] for i in pending])):
+            results[i] = _trusted_intent(label, probability)
+    return results
+
+# --- Command Scheduling ---
+SCHEDULER_LANES = {"ui": 1, "audio": 1, "llm": 4} # Lane -> worker threads; single-worker lanes are serialized
+SCHEDULER_QUEUE_SIZE = 8 # Commands waiting per lane before new ones are turned away
+
+# The resource each intent mostly waits on. LLM-lane handlers that also drive the UI
+# take the UI lane's lock for just those steps via scheduler.hold("ui").
+INTENT_LANES = {
+    "open_app": "ui", "search_web": "ui", "pc_control": "ui",
+    "start_voice": "audio", "stop_voice": "audio",
+    "write": "llm", "send_email": "llm", "create_presentation": "llm",
+    "set_reminder": "llm", "greet": "llm", "general_query": "llm",
+}
+
+class Lane:
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.RLock() # Held by a serialized lane's worker, or by anyone borrowing its resource
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+class CommandScheduler:
+    """
+    Bounded worker pool for commands, split into lanes by the resource they need: one serialized
+    lane for UI automation (keyboard, clipboard, windows), one for audio, and a concurrent lane for
+    network-bound LLM work. Each lane has a bounded queue; when it is full, submit() refuses the
+    command instead of piling up threads.
+    """
+    def __init__(self, lanes=SCHEDULER_LANES, queue_size=SCHEDULER_QUEUE_SIZE):
+        self.lanes = {name: Lane(name, workers, queue_size) for name, workers in lanes.items()}
+        self._stats_lock = threading.Lock()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._started:
+                return
+            for lane in self.lanes.values():
+                for i in range(lane.workers):
+                    threading.Thread(target=self._worker, args=(lane,), name=f"{lane.name}-worker-{i}", daemon=True).start()
+            self._started = True
+
+    def submit(self, lane_name, fn, *args):
+        """Queue fn(*args) on a lane. Returns False (and counts a rejection) if the lane is full."""
+        self._ensure_started()
+        lane = self.lanes[lane_name]
+        try:
+            lane.queue.put_nowait((time.perf_counter(), fn, args))
+        except queue.Full:
+            with self._stats_lock:
+                lane.rejected += 1
+            return False
+        with self._stats_lock:
+            lane.max_depth = max(lane.max_depth, lane.queue.qsize())
+        return True
+
+    def hold(self, lane_name):
+        """Context manager giving exclusive use of a serialized lane's resource (re-entrant)."""
+        return self.lanes[lane_name].lock
+
+    def _worker(self, lane):
+        while True:
+            queued_at, fn, args = lane.queue.get()
+            waited = time.perf_counter() - queued_at
+            with self._stats_lock:
+                lane.running += 1
+                lane.total_wait += waited
+                lane.max_wait = max(lane.max_wait, waited)
+            try:
+                if lane.workers == 1:
+                    with lane.lock:
+                        fn(*args)
+                else:
+                    fn(*args)
+                outcome = "completed"
+            except Exception as e:
+                print(f"An unexpected error occurred while running a command on the {lane.name} lane: {e}")
+                outcome = "failed"
+            with self._stats_lock:
+                lane.running -= 1
+                setattr(lane, outcome, getattr(lane, outcome) + 1)
+
+    def metrics(self):
+        """Queue depth and throughput counters for each lane."""
+        with self._stats_lock:
+            return {
+                name: {
+                    "queued": lane.queue.qsize(), "running": lane.running, "max_queued": lane.max_depth,
+                    "completed": lane.completed, "failed": lane.failed, "rejected": lane.rejected,
+                    "avg_wait_s": lane.total_wait / max(1, lane.completed + lane.failed),
+                    "max_wait_s": lane.max_wait,
+                }
+                for name, lane in self.lanes.items()
+            }
+
+scheduler = CommandScheduler()
+
+def _normalize_command(cmd):
     if not cmd or not isinstance(cmd, str):
-        print("DEBUG: Received empty or invalid command, skipping.")
+        log.debug("Received empty or invalid command, skipping.")
         speak("My auditory sensors detected nothing of consequence. Please articulate your desires.")
+        return None
+    return cmd.lower().strip()
+
+def dispatch_command(cmd):
+    """
+    Predict the intent right away and queue the handler on its lane. Used by the text and voice
+    loops in place of a thread per command; "exit" runs inline so it can stop the caller.
+    """
+    cmd = _normalize_command(cmd)
+    if cmd is None:
         return
 
-    cmd = cmd.lower().strip()
+    intent = predict_intent(cmd)
+    print(f"🤖 Intent Detected: {intent} for command: '{cmd}'")
+    if intent == "exit":
+        run_intent(cmd, intent)
+        return
+
+    lane = INTENT_LANES.get(intent, "llm")
+    if scheduler.submit(lane, run_intent, cmd, intent):
+        depth = scheduler.lanes[lane].queue.qsize()
+        if depth:
+            log.debug(f"Queued '{cmd}' on the {lane} lane behind {depth} other command(s).")
+    else:
+        log.debug(f"{lane} lane is full, dropping '{cmd}'. Lane metrics: {scheduler.metrics()[lane]}")
+        speak("I am already juggling several of your requests. Give me a moment before adding more.", wait=False)
+
+def process_command(cmd):
+    """Predict the intent of a command and run it to completion on the calling thread."""
+    cmd = _normalize_command(cmd)
+    if cmd is None:
+        return
     
     intent = predict_intent(cmd)
     print(f"🤖 Intent Detected: {intent} for command: '{cmd}'")
+    run_intent(cmd, intent)
+
+def run_intent(cmd, intent, source="interactive"):
+    """execute_intent inside the per-command span and counter, on whichever thread (e.g. a lane worker) runs it."""
+    with tracer.span("command", source=source, intent=intent):
+        tracer.count("jarvis_commands_total", intent=intent)
+        execute_intent(cmd, intent)
+
+def execute_intent(cmd, intent):
+    global listening
 
     if intent == "open_app":
         app_name_extracted, action_extracted = extract_app_and_action(cmd)
@@ -706,14 +3608,14 @@ def process_command(cmd):
 
         if not to_address:
             speak("I am poised to dispatch an email. Kindly provide the recipient's digital coordinates, by typing them.")
-            to_address = input("Recipient Email Address: ").strip()
+            to_address = ask_user("Recipient Email Address: ")
             if not to_address:
                 speak("Without a destination, my email protocols are aborted. Efficiency dictates I move on.")
                 return
 
         if not email_topic:
             speak("And what grand topic shall this communication convey? Type it now.")
-            email_topic = input("Email Topic: ").strip()
+            email_topic = ask_user("Email Topic: ")
             if not email_topic:
                 speak("A topic-less email is an unproductive email. Operation cancelled.")
                 return
@@ -735,7 +3637,9 @@ def process_command(cmd):
         pc_control(cmd) # Call the pc_control function
 
     elif intent == "start_voice":
-        if not listening:
+        if not INTERACTIVE:
+            speak("Voice mode needs a microphone and a human at it. This session has neither.")
+        elif not listening:
             listening = True
             threading.Thread(target=voice_loop, daemon=True).start()
             print("🟢 Voice mode started.")
@@ -750,7 +3654,8 @@ def process_command(cmd):
     elif intent == "exit":
         speak("Initiating shutdown sequence. It has been a privilege, human. Until next time.")
         save_memory(memory)
-        exit()
+        if INTERACTIVE: # A replayed "exit" must not end the replay
+            exit()
 
     elif intent == "greet":
         current_hour = datetime.now().hour
@@ -760,44 +3665,527 @@ def process_command(cmd):
             greeting = "Good afternoon!"
         else:
             greeting = "Good evening!"
-        
+
+        if not llm_available(): # Canned reply rather than a prompt that would only fail fast
+            speak(f"{greeting} It is {datetime.now().strftime('%I:%M %p')}. My conversational core is offline, "
+                  f"but my command circuits remain at your service.")
+            save_memory(memory)
+            return
+
         response_prompt = (
             f"Given the user's greeting '{cmd}', respond in a witty, high-ego, and friendly way, "
             f"considering it's {greeting} and the current time is {datetime.now().strftime('%I:%M %p')}. "
             f"Keep your response concise, but maintain a superior AI persona. Avoid overly deferential language."
         )
-        response = get_ai_generated_text(response_prompt)
-        speak(response)
+        speak_generated(response_prompt, cache=False)
 
-    else: # General query fallback and Gemini re-interpretation
-        speak("One moment, please. My advanced cognitive core is processing your request.")
-        
-        clarification_prompt = (
-            f"The user's command was somewhat ambiguous: '{cmd}'. "
-            f"As a superior AI, I require precise instructions. "
-            f"Please interpret what the user most likely intended to do or what information they are seeking. "
-            f"Focus on the most probable action or query. Respond concisely, and suggest a clear path for me to follow."
-        )
-        re_interpreted_command = get_ai_generated_text(clarification_prompt)
-
-        if "sorry" not in re_interpreted_command.lower() and re_interpreted_command.strip():
-            speak(f"Ah, I believe you intended to: {re_interpreted_command}. Allow me to proceed with that interpretation.")
-            final_response = get_ai_generated_text(cmd) 
-            speak(final_response)
-        else:
-            final_response = get_ai_generated_text(cmd) 
-            speak(final_response)
+    else: # General query fallback: answered directly in one streamed call (the model resolves ambiguity itself)
+        if llm_available():
+            speak("One moment, please. My advanced cognitive core is processing your request.", wait=False)
+        speak_generated(cmd, cache=False)
     
     save_memory(memory)
 
+# --- Batch Replay ---
+BATCH_CONCURRENCY = 4 # Commands run at once; commands on a serialized lane (UI, audio) still take turns
+
+def use_dry_run_backends(scratch_dir):
+    """
+    Swap every side effect for a recording stand-in: UI automation and OS actions (FakeUIBackend),
+    the browser (DryRunDriver), speech (nothing reaches the speakers), memory (journaled to
+    scratch_dir) and generated decks (saved there too). Gemini and the response caches stay live, so a replay also warms them.
+    """
+    global INTERACTIVE, speech_queue, browser_pool, PRESENTATION_DIR
+    INTERACTIVE = False
+    PRESENTATION_DIR = os.path.join(scratch_dir, PRESENTATION_DIR)
+    set_ui_backend(FakeUIBackend(instant=True))
+    browser_pool = BrowserSessionPool(factory=DryRunDriver)
+    speech_queue = SpeechQueue(render=lambda sentence: sentence, play=lambda sentence: None)
+    memory_store.detach(scratch_dir)
+
+def read_batch(lines):
+    """
+    Parse batch input: JSON lines like {"command": "open notepad", "id": ..., "intent": "open_app"}
+    ("intent", if given, is the expected one) or plain text, one command per line.
+    """
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if not line.startswith("{"):
+            yield {"line": line_number, "command": line}
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            log.debug(f"Skipping unreadable batch line {line_number}: {e}")
+            continue
+        if isinstance(item.get("command"), str) and item["command"].strip():
+            yield {"line": line_number, **item}
+        else:
+            log.debug(f"Skipping batch line {line_number}: no command.")
+
+def run_headless_command(item, on_speech=None, predict=None, source="batch"):
+    """
+    Run one command to completion on the calling thread, capturing what it says, and return its
+    result record. on_speech(sentence) is also called with each sentence as it is spoken, and predict
+    replaces predict_intent (e.g. with a shared batcher).
+    """
+    spoken = []
+    error = intent = lane = None
+
+    def sink(sentence):
+        spoken.append(sentence)
+        if on_speech:
+            on_speech(sentence)
+
+    start = predicted = started = time.perf_counter()
+    with speech_sink(sink), tracer.span("command", source=source):
+        try:
+            cmd = item["command"].lower().strip()
+            intent = (predict or predict_intent)(cmd)
+            predicted = time.perf_counter()
+            tracer.annotate(intent=intent)
+            tracer.count("jarvis_commands_total", intent=intent)
+            lane = INTENT_LANES.get(intent, "llm")
+            # Same exclusivity as dispatch_command: a serialized lane's commands run one at a time
+            with scheduler.hold(lane) if scheduler.lanes[lane].workers == 1 else contextlib.nullcontext():
+                started = time.perf_counter()
+                execute_intent(cmd, intent)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    end = time.perf_counter()
+
+    result = {"command": item["command"], "intent": intent, "lane": lane,
+              "ok": error is None, "error": error, "spoken": spoken,
+              "timings_ms": {"intent": round((predicted - start) * 1000, 2),
+                             "lane_wait": round((max(started, predicted) - predicted) * 1000, 2),
+                             "execute": round((end - max(started, predicted)) * 1000, 2),
+                             "total": round((end - start) * 1000, 2)}}
+    for key in ("line", "id"):
+        if key in item:
+            result[key] = item[key]
+    if "intent" in item:
+        result["expected_intent"] = item["intent"]
+        result["intent_match"] = item["intent"] == intent
+    return result
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] if sorted_values else 0.0
+
+def run_batch(source, out_path="-", concurrency=BATCH_CONCURRENCY):
+    """
+    Replay commands from a JSON-lines file (or "-" for stdin) through intent prediction and dispatch
+    with dry-run backends, writing one JSON result per command as it finishes. The assistant's own
+    output goes to stderr. Returns 0, or 1 if any command failed or had an unexpected intent.
+    """
+    use_dry_run_backends(tempfile.mkdtemp(prefix="jarvis-batch-"))
+    input_file = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    output_file = sys.stdout if out_path == "-" else open(out_path, "w", encoding="utf-8")
+    results = []
+    write_lock = threading.Lock()
+
+    def record(future):
+        result = future.result()
+        with write_lock:
+            results.append(result)
+            output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output_file.flush()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr), \
+            concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        pending = set()
+        for item in read_batch(input_file):
+            if len(pending) >= concurrency * 2: # Read ahead only a little, so huge logs stream through
+                _, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            future = pool.submit(run_headless_command, item)
+            future.add_done_callback(record)
+            pending.add(future)
+    elapsed = time.perf_counter() - start
+    memory_store.flush()
+    if input_file is not sys.stdin:
+        input_file.close()
+    if output_file is not sys.stdout:
+        output_file.close()
+
+    totals = sorted(r["timings_ms"]["total"] for r in results)
+    failed = sum(not r["ok"] for r in results)
+    mismatched = [r for r in results if r.get("intent_match") is False]
+    print(f"Batch: {len(results)} commands in {elapsed:.2f}s ({len(results) / max(elapsed, 1e-9):.1f}/s, "
+          f"concurrency {concurrency}); total p50 {_percentile(totals, 0.5):.1f} ms, "
+          f"p95 {_percentile(totals, 0.95):.1f} ms; {failed} failed, {len(mismatched)} unexpected intents.",
+          file=sys.stderr)
+    for r in mismatched:
+        print(f"  line {r['line']}: '{r['command']}' -> {r['intent']} (expected {r['expected_intent']})", file=sys.stderr)
+    return 1 if failed or mismatched else 0
+
+# --- Server Mode ---
+SERVER_HOST = "127.0.0.1" # Local clients only: commands drive this machine's desktop
+SERVER_PORT = 8765
+SERVER_MAX_BODY_BYTES = 20 * 1024 * 1024 # About 10 minutes of 16 kHz 16-bit audio
+# A fresh bearer token is written here on every launch; client.py reads it from the same place
+SERVER_TOKEN_FILE = os.environ.get("JARVIS_SERVER_TOKEN_FILE",
+                                   os.path.join(os.path.expanduser("~"), ".jarvis", "server_token"))
+SERVER_LOCAL_HOSTNAMES = {"127.0.0.1", "localhost", "::1"}
+AUDIO_CONTENT_TYPES = ("audio/wav", "audio/x-wav", "audio/wave", "application/octet-stream")
+INTENT_BATCH_MAX = 32
+INTENT_BATCH_WAIT = 0.005 # Seconds the first request of a batch waits for others to share its intent pass
+
+class MicroBatcher:
+    """
+    Coalesces calls from concurrent threads into batches: submit(item) blocks until fn(items) has run
+    over a batch containing item, and returns that item's result. The first request of a batch waits
+    at most max_wait for company, so a lone request costs little and a burst shares one pass.
+    """
+    def __init__(self, fn, max_batch=INTENT_BATCH_MAX, max_wait=INTENT_BATCH_WAIT):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def submit(self, item):
+        with self._start_lock:
+            if not self._started:
+                threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+                self._started = True
+        future = concurrent.futures.Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                for (_, future), result in zip(batch, self.fn([item for item, _ in batch])):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+intent_batcher = MicroBatcher(predict_intents)
+_stt_slots = threading.BoundedSemaphore(max(1, STT_NUM_WORKERS)) # Decodes the shared model runs in parallel
+
+def decode_audio(data, content_type=""):
+    """16 kHz mono float32 samples from a WAV file, or from raw 16 kHz float32 PCM (application/octet-stream)."""
+    if not data.startswith(b"RIFF"):
+        if "octet-stream" not in content_type:
+            raise ValueError("expected a WAV file or raw 16 kHz float32 PCM (application/octet-stream)")
+        return np.frombuffer(data, dtype=np.float32)
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        width, channels, rate = wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width in (2, 4):
+        dtype = np.int16 if width == 2 else np.int32
+        samples = np.frombuffer(frames, dtype=dtype).astype(np.float32) / np.iinfo(dtype).max
+    else:
+        raise ValueError(f"unsupported WAV sample width: {width * 8} bits")
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != STT_SAMPLE_RATE: # Linear resampling is plenty for speech recognition
+        positions = np.arange(0, len(samples), rate / STT_SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    return samples.astype(np.float32)
+
+@traced("stt.transcribe")
+def transcribe_clip(audio):
+    """Transcribe a complete clip with the resident Whisper engine shared by every client."""
+    tracer.annotate(audio_s=round(len(audio) / STT_SAMPLE_RATE, 2))
+    engine = get_whisper_model()
+    with _stt_slots:
+        segments, _ = engine.transcribe(audio, condition_on_previous_text=False)
+        return " ".join(segment.text.strip() for segment in segments).strip() # Decoding is lazy: finish it here
+
+class AssistantRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of `--serve`:
+      POST /command  {"command": "open notepad"} as application/json
+      POST /audio    a WAV file (audio/wav) or raw 16 kHz float32 PCM (application/octet-stream) to transcribe and run
+      GET  /health
+    Every POST needs "Authorization: Bearer <token>" with the token serve() wrote to SERVER_TOKEN_FILE.
+    Requests from web pages (any Origin header) or addressed to a non-local Host are refused, and
+    bodies must have a content type browsers can't send cross-origin without a preflight.
+    Add ?stream=1 to a POST to get newline-delimited JSON as the command runs: {"transcript": ...} for audio,
+    {"say": sentence} for each sentence as it is produced, then {"result": {...}}. Without it, the
+    result record alone is returned once the command has finished.
+    """
+    protocol_version = "HTTP/1.1"
+    started = 0.0 # Set by serve()
+    token = None # Set by serve()
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, payload):
+        data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+        try:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        except OSError: # The client went away; let the command finish regardless
+            self.close_connection = True
+
+    def _refuse(self, status, message):
+        self.close_connection = True # The body (if any) is left unread
+        tracer.count("jarvis_server_rejected_total", status=str(status))
+        self._send_json(status, {"error": message})
+
+    def _local_request(self):
+        """False (after replying) for requests a browser page could have made: the command API is for local programs only."""
+        if self.headers.get("Origin") is not None:
+            self._refuse(403, "requests from web pages are not accepted")
+            return False
+        try:
+            hostname = urllib.parse.urlsplit("//" + self.headers.get("Host", "")).hostname
+        except ValueError:
+            hostname = None
+        if hostname not in SERVER_LOCAL_HOSTNAMES: # Also stops DNS rebinding
+            self._refuse(403, "requests must be addressed to localhost")
+            return False
+        return True
+
+    def _authorized(self):
+        scheme, _, supplied = self.headers.get("Authorization", "").partition(" ")
+        if self.token and scheme.lower() == "bearer" and hmac.compare_digest(supplied.strip(), self.token):
+            return True
+        self._refuse(401, f"missing or wrong bearer token (see {SERVER_TOKEN_FILE})")
+        return False
+
+    def do_GET(self):
+        if not self._local_request():
+            return
+        if urllib.parse.urlsplit(self.path).path == "/health":
+            self._send_json(200, {"status": "ok", "uptime_s": round(time.time() - self.started, 1),
+                                  "llm_circuit": llm_breaker.status()[0]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not (self._local_request() and self._authorized()):
+            return
+        url = urllib.parse.urlsplit(self.path)
+        stream = urllib.parse.parse_qs(url.query).get("stream", ["0"])[0] not in ("0", "false", "")
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        expected = {"/command": ("application/json",), "/audio": AUDIO_CONTENT_TYPES}.get(url.path)
+        if expected is None:
+            return self._refuse(404, "not found")
+        if content_type not in expected:
+            return self._refuse(415, f"{url.path} expects Content-Type {' or '.join(expected)}")
+        try:
+            length = int(self.headers["Content-Length"])
+        except (TypeError, ValueError): # Missing or not a number
+            length = -1
+        if length < 0:
+            return self._refuse(400, "bad Content-Length")
+        if length > SERVER_MAX_BODY_BYTES:
+            return self._refuse(413, f"body larger than {SERVER_MAX_BODY_BYTES} bytes")
+        data = self.rfile.read(length)
+        tracer.count("jarvis_server_requests_total", endpoint=url.path)
+
+        transcript = None
+        try:
+            if url.path == "/command":
+                item = json.loads(data)
+                if not isinstance(item, dict) or not isinstance(item.get("command"), str) or not item["command"].strip():
+                    raise ValueError("no command given")
+            else:
+                transcript = transcribe_clip(decode_audio(data, content_type))
+                item = {"command": strip_wake_word(transcript)}
+        except Exception as e: # Bad JSON, bad audio, or no Whisper: the client's problem to report
+            return self._send_json(400, {"error": f"{type(e).__name__}: {e}"})
+
+        if not stream:
+            result = (run_headless_command(item, predict=intent_batcher.submit, source="server")
+                      if item["command"].strip() else {"command": "", "ok": True, "spoken": []})
+            if transcript is not None:
+                result["transcript"] = transcript
+            return self._send_json(200, result)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if transcript is not None:
+            self._chunk({"transcript": transcript})
+        if item["command"].strip():
+            result = run_headless_command(item, on_speech=lambda sentence: self._chunk({"say": sentence}),
+                                          predict=intent_batcher.submit, source="server")
+            self._chunk({"result": result})
+        try:
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+
+def write_server_token(path=SERVER_TOKEN_FILE):
+    """Create a new random bearer token and store it where only this user can read it."""
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    os.replace(tmp_path, path)
+    return token
+
+def serve(port=SERVER_PORT, host=SERVER_HOST, dry_run=False, prewarm_components=("intent", "stt")):
+    """
+    Run as a long-lived local server: models load once and stay resident, and any number of thin
+    clients send commands or audio over HTTP (see AssistantRequestHandler). Each request runs on its
+    own thread with its own speech sink, so replies go back to the client that asked. Clients prove
+    they run as this user by reading the bearer token written to SERVER_TOKEN_FILE.
+    """
+    global INTERACTIVE
+    INTERACTIVE = False
+    if dry_run:
+        use_dry_run_backends(tempfile.mkdtemp(prefix="jarvis-serve-"))
+    prewarm([c for c in prewarm_components if c in SUBSYSTEMS])
+    check_reminders() # Reminders are still announced on this machine's speakers
+
+    server = ThreadingHTTPServer((host, port), AssistantRequestHandler)
+    server.daemon_threads = True
+    AssistantRequestHandler.started = time.time()
+    AssistantRequestHandler.token = write_server_token()
+    print(f"JARVIS is serving on http://{host}:{server.server_port} (POST /command, POST /audio, GET /health)"
+          f"{' with dry-run backends' if dry_run else ''}. Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        server.server_close()
+        with contextlib.suppress(OSError):
+            os.remove(SERVER_TOKEN_FILE)
+        save_memory(memory)
+    return 0
+
 # --- Main Loop and Execution Block ---
-def main():
+_record_startup_cost("core", "import", time.perf_counter() - _MODULE_START)
+
+def runtime_gauges():
+    """Current scheduler lane metrics and LLM client state as (name, labels, value) gauges for the metrics endpoint."""
+    for lane, stats in scheduler.metrics().items():
+        for stat, value in stats.items():
+            yield f"jarvis_scheduler_{stat}", {"lane": lane}, value
+    yield "jarvis_llm_circuit_open", {}, int(not llm_available())
+    yield "jarvis_llm_rate_tokens", {}, round(llm_limiter.tokens, 2)
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /stats (JSON) from a background thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics"):
+                body = tracer.metrics.render(runtime_gauges()).encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            elif self.path.startswith("/stats"):
+                circuit, failures = llm_breaker.status()
+                stats = {**tracer.metrics.snapshot(), "scheduler": scheduler.metrics(),
+                         "llm": {"circuit": circuit, "consecutive_failures": failures}}
+                body = json.dumps(stats, indent=2).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Metrics at http://{host}:{server.server_port}/metrics")
+    return server
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="JARVIS, your AI assistant.")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Load every subsystem, print the import and init cost of each, then exit.")
+    parser.add_argument("--prewarm", nargs="?", const="intent,tts", default="",
+                        help="Comma-separated subsystems to load in the background at startup "
+                             f"(default when given without a value: intent,tts; available: {','.join(SUBSYSTEMS)}).")
+    parser.add_argument("--prerender-tts", action="store_true",
+                        help="Render every static phrase into the TTS cache, then exit (run once after installing).")
+    parser.add_argument("--export-intent-model", action="store_true",
+                        help=f"Compile {INTENT_MODEL_FILE} and {INTENT_VECTORIZER_FILE} into {INTENT_COMPILED_FILE}, then exit (run after retraining).")
+    parser.add_argument("--debug", action="store_true", default=DEBUG_ENABLED,
+                        help="Print diagnostic messages to stderr (JARVIS_DEBUG=1 does the same).")
+    parser.add_argument("--trace", nargs="?", const=TRACE_FILE, default=TRACE_FILE if TRACE_ENABLED else None,
+                        help=f"Write per-stage timing spans as JSON lines to this file (default: {TRACE_FILE}, rotated at 5 MB).")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Replay commands from a JSON-lines file ('-' for stdin) with dry-run UI, browser and "
+                             "speech, write one JSON result per command, then exit.")
+    parser.add_argument("--batch-out", metavar="FILE", default="-", help="Where --batch writes its results (default: stdout).")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help=f"Commands --batch runs at once (default {BATCH_CONCURRENCY}).")
+    parser.add_argument("--serve", nargs="?", type=int, const=SERVER_PORT, metavar="PORT",
+                        help=f"Run as a local server for thin clients (default port {SERVER_PORT}); models stay loaded "
+                             "between requests. See client.py.")
+    parser.add_argument("--host", default=SERVER_HOST,
+                        help=f"Address --serve listens on (default {SERVER_HOST}); requests must still be addressed to localhost.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="With --serve, record UI, browser and OS actions instead of performing them.")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve counters and latency histograms at http://127.0.0.1:PORT/metrics (and /stats).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main assistant loop. Accept text input if voice mode is not active."""
     global listening
-    speak("hii, what are you looking for?")
+    args = parse_args(argv)
+    configure_logging(args.debug)
+    tracer.configure(trace_file=args.trace, metrics=args.metrics_port is not None)
+    if args.metrics_port is not None:
+        serve_metrics(args.metrics_port)
+    if args.profile_startup:
+        profile_startup()
+        return
+    if args.prerender_tts:
+        prerender_speech()
+        return
+    if args.export_intent_model:
+        export_intent_model(check_phrases=[p for phrases in KNOWN_COMMAND_PHRASES.values() for p in phrases])
+        return
+
+    if not (os.path.exists(INTENT_COMPILED_FILE)
+            or (os.path.exists(INTENT_MODEL_FILE) and os.path.exists(INTENT_VECTORIZER_FILE))):
+        print(f"Error: {INTENT_COMPILED_FILE} (or intent_model.pkl and intent_vectorizer.pkl) not found. Please run the training script (train_intents.py) first.")
+        speak("It appears some critical components for my advanced intelligence are missing. You might want to address that, human.")
+        exit()
+
+    if args.batch:
+        return run_batch(args.batch, args.batch_out, max(1, args.concurrency))
+    if args.serve is not None:
+        extra = [c.strip() for c in args.prewarm.split(",") if c.strip()]
+        return serve(args.serve, args.host, args.dry_run, prewarm_components=["intent", "stt", *extra])
+
+    if args.prewarm:
+        prewarm([c.strip() for c in args.prewarm.split(",") if c.strip() in SUBSYSTEMS])
+
+    # Greet in the background so the prompt doesn't wait for the TTS engine to load
+    speak("hii, what are you looking for?", wait=False)
     print("Type 'start voice mode' for voice activation or enter commands manually:")
     
-    threading.Thread(target=check_reminders_loop, daemon=True).start()
     check_reminders()
 
     while True:
@@ -805,8 +4193,8 @@ def main():
             if not listening:
                 cmd = input("💬: ").strip()
                 if cmd:
-                    # Process commands in a separate thread to keep the main loop responsive
-                    threading.Thread(target=process_command, args=(cmd,), daemon=True).start()
+                    # Queue the command on the scheduler to keep the main loop responsive
+                    dispatch_command(cmd)
             time.sleep(0.1) # Small delay to prevent busy-waiting
         except KeyboardInterrupt:
             print("\nExiting AI Assistant. Acknowledged.")
@@ -817,4 +4205,4 @@ def main():
             time.sleep(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file